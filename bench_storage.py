@@ -0,0 +1,504 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import multiprocessing
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import ROWS, SEATS_PER_ROW
+from utils.helpers import Helper, SERIALIZERS
+from context.models import UserContext
+from context.memory_store import MemoryStore
+from database.booking_partitions import show_date
+from database.booking_repository import BookingRepository, SeatUnavailableError
+from database.shared_seats import SharedSeatMap
+from database.backends import BACKENDS
+from database.conformance import run_checks
+from utils.write_behind import get_writer, shutdown_writer
+
+
+MOVIE_KEYS = ['captain_america', 'thunderbolts', 'mission_impossible', 'superman', 'fantastic_four']
+SHOWTIMES = ['11:00', '14:00', '17:30', '20:00']
+
+
+def make_booking(booking_id, rng, start=datetime(2025, 1, 1)):
+    tickets = rng.randint(1, 4)
+    row = rng.choice(ROWS)
+    first = rng.randint(1, SEATS_PER_ROW - tickets + 1)
+    movie_key = rng.choice(MOVIE_KEYS)
+    timestamp = start + timedelta(minutes=booking_id)
+    return {
+        'reference': f"BK{booking_id:07d}",
+        'user_id': f"user_{rng.randint(1, max(1, booking_id // 5))}",
+        'user_name': 'Bench User',
+        'movie_key': movie_key,
+        'movie_title': movie_key.replace('_', ' ').title(),
+        'time': rng.choice(SHOWTIMES),
+        'tickets': tickets,
+        'seats': [[row, first + i] for i in range(tickets)],
+        'total': 12.5 * tickets,
+        'booking_id': booking_id,
+        'timestamp': timestamp.isoformat()
+    }
+
+
+def make_bookings(count, seed=42, start=datetime(2025, 1, 1)):
+    rng = random.Random(seed)
+    return [make_booking(i, rng, start) for i in range(1, count + 1)]
+
+
+# Midnight today, so generated bookings land on days that are still resident
+def upcoming():
+    return datetime.combine(datetime.now().date(), datetime.min.time())
+
+
+def timed(fn, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_serializers(args):
+    bookings = make_bookings(args.count)
+    print(f"Snapshot formats, {args.count:,} bookings (best of {args.repeat})\n")
+    print(f"{'format':<10}{'save (s)':>12}{'load (s)':>12}{'size (MB)':>12}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, serializer in SERIALIZERS.items():
+            path = os.path.join(tmp, f"bookings.{name}")
+            save_time, _ = timed(lambda: Helper.save_json(path, bookings, serializer=serializer), args.repeat)
+            load_time, loaded = timed(lambda: Helper.load_json(path, []), args.repeat)
+            assert len(loaded) == args.count
+            size_mb = os.path.getsize(path) / (1024 * 1024)
+            print(f"{name:<10}{save_time:>12.3f}{load_time:>12.3f}{size_mb:>12.2f}")
+
+
+def measure_resident(build, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = build(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(sessions) == count
+    return (after - before) / count
+
+
+def make_session(i):
+    context = UserContext(f"user_{i}", name=f"User {i}", last_mentioned_movie='superman')
+    context.booking_state.update({'stage': 'seats', 'movie': 'superman', 'time': '14:00', 'tickets': 2})
+    return context
+
+
+def bench_context_memory(args):
+    # Both sides are decoded from the same shard bytes, as the store would read them from disk
+    serializer = Helper.get_serializer('compact')
+    shards = [serializer.dumps(make_session(i).to_dict()) for i in range(args.count)]
+    dict_bytes = measure_resident(lambda n: [serializer.loads(shards[i]) for i in range(n)], args.count)
+    slot_bytes = measure_resident(lambda n: [UserContext.from_dict(serializer.loads(shards[i]))
+                                             for i in range(n)], args.count)
+
+    print(f"Resident session memory, {args.count:,} sessions\n")
+    print(f"{'representation':<22}{'bytes/session':>16}")
+    print(f"{'nested dicts':<22}{dict_bytes:>16.0f}")
+    print(f"{'UserContext (slots)':<22}{slot_bytes:>16.0f}")
+    print(f"\nSaving: {100 * (1 - slot_bytes / dict_bytes):.1f}%")
+
+
+def context_worker(context_dir, worker, users, updates):
+    store = MemoryStore(context_dir)
+    for i in range(1, updates + 1):
+        # Each worker owns some users outright and also writes its own field on one shared user
+        for u in range(users):
+            user_id = f"worker{worker}_user{u}"
+            context = store.load_context(user_id)
+            context['counter'] = i
+            store.save_context(user_id, context)
+        shared = store.load_context('shared_user')
+        shared[f"worker{worker}"] = i
+        store.save_context('shared_user', shared)
+        # Push every round to disk so the workers really race on the shared shard
+        store.writer.flush()
+    shutdown_writer()
+
+
+def stress_contexts(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        context_dir = os.path.join(tmp, 'contexts')
+        MemoryStore(context_dir)
+        start = time.perf_counter()
+        procs = [multiprocessing.Process(target=context_worker, args=(context_dir, w, args.users, args.updates))
+                 for w in range(args.workers)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - start
+
+        store = MemoryStore(context_dir)
+        lost = 0
+        for w in range(args.workers):
+            for u in range(args.users):
+                if store.load_context(f"worker{w}_user{u}").get('counter') != args.updates:
+                    lost += 1
+            if store.load_context('shared_user').get(f"worker{w}") != args.updates:
+                lost += 1
+
+        print(f"Context store stress: {args.workers} processes x {args.users} users x {args.updates} updates")
+        print(f"Elapsed: {elapsed:.2f}s, exit codes: {[p.exitcode for p in procs]}")
+        print(f"Lost updates: {lost}")
+        if lost or any(p.exitcode for p in procs):
+            sys.exit(1)
+
+
+def per_op_us(fn, keys):
+    start = time.perf_counter()
+    for key in keys:
+        fn(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def bench_booking_indexes(args):
+    rng = random.Random(7)
+    print(f"{'bookings':>10}{'query':>14}{'scan (us)':>14}{'index (us)':>14}{'speedup':>10}")
+
+    for count in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            bookings_file = os.path.join(tmp, 'bookings.json')
+            Helper.save_json(bookings_file, make_bookings(count, start=upcoming()))
+            start = time.perf_counter()
+            repo = BookingRepository(os.path.join(tmp, 'bookings'), os.path.join(tmp, 'bookings.journal'),
+                                     os.path.join(tmp, 'bookings.index'), bookings_file)
+            bookings = repo.get_all()
+            load_time = time.perf_counter() - start
+
+            samples = [rng.choice(bookings) for _ in range(args.queries)]
+            queries = {
+                'user': ([b['user_id'] for b in samples],
+                         lambda u: [b for b in bookings if b.get('user_id') == u], repo.get_by_user),
+                'reference': ([b['reference'] for b in samples],
+                              lambda r: next((b for b in bookings if b.get('reference') == r), None),
+                              repo.get_by_reference),
+                'movie': ([b['movie_key'] for b in samples],
+                          lambda m: [b for b in bookings if b['movie_key'] == m], repo.get_by_movie),
+                'date': ([show_date(b) for b in samples],
+                         lambda d: [b for b in bookings if show_date(b).startswith(d)], repo.get_by_date),
+            }
+
+            print(f"{count:>10,}  load + index build: {load_time:.2f}s")
+            for name, (keys, scan, indexed) in queries.items():
+                scan_keys = keys[:max(1, args.queries // 10)]
+                scan_us = per_op_us(scan, scan_keys)
+                index_us = per_op_us(indexed, keys)
+                print(f"{count:>10,}{name:>14}{scan_us:>14,.1f}{index_us:>14,.2f}{scan_us / index_us:>9,.0f}x")
+
+
+def bench_booking_startup(args):
+    print(f"{'bookings':>10}{'full load (s)':>16}{'index load (s)':>16}{'speedup':>10}")
+
+    for count in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name) for name in ('bookings', 'bookings.journal', 'bookings.index', 'bookings.json')]
+            Helper.save_json(paths[3], make_bookings(count, start=upcoming()))
+
+            # Without an index file every record is parsed and indexed
+            full_time, repo = timed(lambda: BookingRepository(paths[0], paths[1], os.path.join(tmp, 'missing.index'), paths[3]))
+            repo.close()
+            BookingRepository(*paths).save()
+            index_time, repo = timed(lambda: BookingRepository(*paths))
+            assert not repo._records_loaded
+            repo.close()
+            print(f"{count:>10,}{full_time:>16.3f}{index_time:>16.4f}{full_time / index_time:>9,.0f}x")
+
+
+def bench_booking_history(args):
+    print(f"{'days':>8}{'bookings':>12}{'startup (ms)':>15}{'resident':>10}{'one day (ms)':>15}{'one user (ms)':>15}")
+    rng = random.Random(11)
+    today = upcoming()
+
+    for days in args.days:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name) for name in ('bookings', 'bookings.journal', 'bookings.index', 'bookings.json')]
+            bookings = []
+            for day in range(days, -1, -1):
+                start = today - timedelta(days=day)
+                for _ in range(args.per_day):
+                    booking = make_booking(len(bookings) + 1, rng, start)
+                    booking['timestamp'] = start.isoformat()
+                    bookings.append(booking)
+            Helper.save_json(paths[3], bookings)
+
+            # The first start splits the file into days and archives the past ones
+            BookingRepository(*paths).close()
+            startup, repo = timed(lambda: BookingRepository(*paths))
+            resident = len(repo.get_by_date(today.date().isoformat()))
+            past_day = (today - timedelta(days=days // 2)).date().isoformat()
+            day_time, _ = timed(lambda: repo.get_by_date(past_day))
+            user_time, _ = timed(lambda: repo.get_by_user(bookings[len(bookings) // 2]['user_id']))
+            repo.close()
+            print(f"{days:>8,}{len(bookings):>12,}{startup * 1000:>15.1f}{resident:>10,}"
+                  f"{day_time * 1000:>15.2f}{user_time * 1000:>15.2f}")
+
+
+def seat_worker(tmp, worker, shm_name, attempts, start_event, results):
+    seat_map = SharedSeatMap(shm_name, os.path.join(tmp, 'seats.lock')) if shm_name else None
+    # Every worker books through one store, as the bot's processes do. A shared seat map
+    # mirrors that store and is only as current as its journal, so it can't be shared
+    # between stores.
+    base = os.path.join(tmp, 'bookings')
+    repo = BookingRepository(base, base + '.journal', base + '.index', base + '.legacy', seat_map=seat_map)
+    rng = random.Random(worker)
+    won, conflicts = [], 0
+    start_event.wait()
+    start = time.perf_counter()
+    for i in range(attempts):
+        row = rng.choice(ROWS)
+        first = rng.randint(1, SEATS_PER_ROW - 1)
+        seats = [[row, first + n] for n in range(rng.randint(1, 2))]
+        try:
+            repo.add({'reference': f"W{worker}-{i}", 'user_id': f"worker{worker}", 'movie_key': 'superman',
+                      'time': '20:00', 'tickets': len(seats), 'seats': seats, 'total': 12.5 * len(seats)})
+            won.extend(tuple(seat) for seat in seats)
+        except SeatUnavailableError:
+            conflicts += 1
+    results.put((worker, won, conflicts, time.perf_counter() - start))
+    repo.close()
+    shutdown_writer()
+
+
+def bench_seat_contention(args):
+    print(f"{args.workers} processes x {args.attempts} booking attempts on one showtime")
+    print(f"{'seat map':>10}{'booked':>8}{'conflicts':>11}{'oversold':>10}{'attempts/s':>12}")
+
+    for mode in ('local', 'shared'):
+        with tempfile.TemporaryDirectory() as tmp:
+            shm_name = f"savoy_bench_{os.getpid()}" if mode == 'shared' else None
+            seat_map = SharedSeatMap(shm_name, os.path.join(tmp, 'seats.lock')) if shm_name else None
+            start_event = multiprocessing.Event()
+            results = multiprocessing.Queue()
+            procs = [multiprocessing.Process(target=seat_worker,
+                                             args=(tmp, w, shm_name, args.attempts, start_event, results))
+                     for w in range(args.workers)]
+            for proc in procs:
+                proc.start()
+            start_event.set()
+            outcomes = [results.get() for _ in procs]
+            for proc in procs:
+                proc.join()
+            if seat_map:
+                seat_map.unlink()
+                seat_map.close()
+
+            # Every seat should be sold at most once across all workers
+            sold = [seat for _, won, _, _ in outcomes for seat in won]
+            oversold = len(sold) - len(set(sold))
+            conflicts = sum(c for _, _, c, _ in outcomes)
+            rate = args.workers * args.attempts / max(elapsed for _, _, _, elapsed in outcomes)
+            print(f"{mode:>10}{len(sold):>8}{conflicts:>11}{oversold:>10}{rate:>12,.0f}")
+            if mode == 'shared' and oversold:
+                sys.exit(1)
+
+
+def group_orders(count, first_day):
+    # One seat per booking, filling each showtime before moving to the next
+    orders = []
+    for i in range(count):
+        show = i // (len(ROWS) * SEATS_PER_ROW)
+        seat = i % (len(ROWS) * SEATS_PER_ROW)
+        orders.append({
+            'reference': f"BK{i:07d}",
+            'user_id': 'box_office',
+            'user_name': 'Box Office',
+            'movie_key': MOVIE_KEYS[show % len(MOVIE_KEYS)],
+            'movie_title': 'Bench',
+            'time': SHOWTIMES[show // len(MOVIE_KEYS) % len(SHOWTIMES)],
+            'show_date': (first_day + timedelta(days=show // (len(MOVIE_KEYS) * len(SHOWTIMES)))).date().isoformat(),
+            'tickets': 1,
+            'seats': [[ROWS[seat // SEATS_PER_ROW], seat % SEATS_PER_ROW + 1]],
+            'total': 12.5,
+        })
+    return orders
+
+
+def bench_bulk_booking(args):
+    print(f"{'batch':>8}{'one by one (ms)':>18}{'batch (ms)':>13}{'speedup':>10}{'journal writes':>17}")
+
+    for size in args.sizes:
+        times = {}
+        writes = {}
+        for mode in ('single', 'batch'):
+            with tempfile.TemporaryDirectory() as tmp:
+                repo = BookingRepository(os.path.join(tmp, 'bookings'), os.path.join(tmp, 'bookings.journal'),
+                                         os.path.join(tmp, 'bookings.index'), os.path.join(tmp, 'bookings.json'))
+                orders = group_orders(size, upcoming())
+                start = time.perf_counter()
+                if mode == 'single':
+                    for order in orders:
+                        repo.add(order)
+                else:
+                    repo.add_many(orders)
+                times[mode] = (time.perf_counter() - start) * 1000
+                writes[mode] = repo.journal.total_records
+                repo.save()
+                repo.close()
+        print(f"{size:>8,}{times['single']:>18,.1f}{times['batch']:>13,.1f}"
+              f"{times['single'] / times['batch']:>9,.0f}x{writes['single']:>9} vs {writes['batch']}")
+
+
+def bench_cache_coherency(args):
+    print(f"{'bookings':>10}{'idle refresh (us)':>19}{'catch up (ms)':>15}{'full reload (ms)':>18}{'speedup':>10}")
+
+    for count in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name) for name in ('bookings', 'bookings.journal', 'bookings.index', 'bookings.json')]
+            Helper.save_json(paths[3], make_bookings(count, start=upcoming()))
+            BookingRepository(*paths).save()
+            # Two repositories on the same files, as two bot processes would have
+            writer = BookingRepository(*paths)
+            reader = BookingRepository(*paths)
+            reader.get_all()
+
+            idle_us = per_op_us(lambda _: reader.refresh(), range(args.queries))
+            # Well past the generated bookings, so none of these seats are taken
+            orders = group_orders(args.delta, upcoming() + timedelta(days=3650))
+            for order in orders:
+                writer.add(order)
+            catch_up, _ = timed(reader.refresh, repeat=1)
+            assert reader.get_by_reference(orders[-1]['reference']) is not None
+            reload_time, _ = timed(lambda: (reader.load(), reader.get_all()), repeat=1)
+            writer.save()
+            writer.close()
+            reader.close()
+            print(f"{count:>10,}{idle_us:>19.1f}{catch_up * 1000:>15.2f}{reload_time * 1000:>18.1f}"
+                  f"{reload_time / catch_up:>9,.0f}x")
+
+
+def latencies(fn, items):
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def backend_workload(backend, count, seed):
+    # The same catalogue, booking and context traffic as the bot, one operation at a time
+    rng = random.Random(seed)
+    timings = {}
+    movies = backend.movies()
+    keys = list(movies.get_all())
+    timings['movie get'] = latencies(lambda i: movies.get(keys[i % len(keys)]), range(count))
+    timings['movie search'] = latencies(lambda query: movies.search(query), ['the', 'comedy', 'nolan'] * (count // 30 or 1))
+
+    repo = backend.bookings()
+    orders = group_orders(count, upcoming() + timedelta(days=1))
+    for order in orders:
+        # Let the backend give out references, as it does for the bot
+        del order['reference']
+    timings['booking add'] = latencies(repo.add, orders)
+    references = [order['reference'] for order in orders]
+    rng.shuffle(references)
+    timings['by reference'] = latencies(repo.get_by_reference, references)
+    timings['taken seats'] = latencies(lambda o: repo.get_taken_seats(o['movie_key'], o['time'], o['show_date']), orders)
+    timings['cancel'] = latencies(repo.cancel, references[:count // 2])
+    repo.save()
+    repo.close()
+    movies.close()
+
+    store = backend.contexts()
+    timings['context save'] = latencies(lambda i: store.save_context(f"user_{i}", make_session(i)), range(count))
+    get_writer().flush()
+    store.evict(reserve=store.max_resident)
+    timings['context load'] = latencies(lambda i: store.load_context(f"user_{i}"), range(count))
+    return timings
+
+
+def bench_backends(args):
+    names = args.backends or list(BACKENDS)
+    print(f"{'backend':<10}{'operation':<16}{'ops/sec':>12}{'p99 (us)':>12}")
+
+    for name in names:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Only compare backends that behave the same
+            failures = run_checks(BACKENDS[name], os.path.join(tmp, 'checks'))
+            if failures:
+                print(f"{name:<10}skipped, failed {', '.join(failures)}")
+                continue
+            os.makedirs(os.path.join(tmp, 'bench'))
+            timings = backend_workload(BACKENDS[name].scratch(os.path.join(tmp, 'bench')), args.count, args.seed)
+            get_writer().flush()
+        for operation, samples in timings.items():
+            samples.sort()
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            print(f"{name:<10}{operation:<16}{len(samples) / sum(samples):>12,.0f}{p99 * 1e6:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage benchmarks for SavoyBot")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('serializers', help="compare snapshot formats for save/load")
+    p.add_argument('--count', type=int, default=100_000)
+    p.add_argument('--repeat', type=int, default=3)
+    p.set_defaults(func=bench_serializers)
+
+    p = sub.add_parser('context-memory', help="bytes per resident session, dicts vs slotted objects")
+    p.add_argument('--count', type=int, default=20_000)
+    p.set_defaults(func=bench_context_memory)
+
+    p = sub.add_parser('context-stress', help="several processes updating one context directory")
+    p.add_argument('--workers', type=int, default=6)
+    p.add_argument('--users', type=int, default=5)
+    p.add_argument('--updates', type=int, default=50)
+    p.set_defaults(func=stress_contexts)
+
+    p = sub.add_parser('booking-indexes', help="indexed lookups vs linear scans")
+    p.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    p.add_argument('--queries', type=int, default=200)
+    p.set_defaults(func=bench_booking_indexes)
+
+    p = sub.add_parser('booking-startup', help="cold start from bookings.json vs from the seat index")
+    p.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    p.set_defaults(func=bench_booking_startup)
+
+    p = sub.add_parser('booking-history', help="startup and lookups as archived history grows")
+    p.add_argument('--days', type=int, nargs='+', default=[30, 365, 1000])
+    p.add_argument('--per-day', type=int, default=200)
+    p.set_defaults(func=bench_booking_history)
+
+    p = sub.add_parser('seat-contention', help="many processes booking seats for the same showtime")
+    p.add_argument('--workers', type=int, default=8)
+    p.add_argument('--attempts', type=int, default=100)
+    p.set_defaults(func=bench_seat_contention)
+
+    p = sub.add_parser('bulk-booking', help="a group sale booked one at a time vs as one batch")
+    p.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+    p.set_defaults(func=bench_bulk_booking)
+
+    p = sub.add_parser('cache-coherency', help="catching up with another process's bookings vs reloading")
+    p.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    p.add_argument('--delta', type=int, default=20)
+    p.add_argument('--queries', type=int, default=10_000)
+    p.set_defaults(func=bench_cache_coherency)
+
+    p = sub.add_parser('backends', help="the same workload against every storage backend")
+    p.add_argument('backends', nargs='*', help="backends to run (default: all registered)")
+    p.add_argument('--count', type=int, default=2000)
+    p.add_argument('--seed', type=int, default=42)
+    p.set_defaults(func=bench_backends)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,17 @@ DATA_DIR = os.path.join(BASE_DIR, 'data')
 MODELS_DIR = os.path.join(BASE_DIR, 'models')
 
 MOVIES_FILE = os.path.join(DATA_DIR, 'movies.json')
+MOVIES_JOURNAL_FILE = os.path.join(DATA_DIR, 'movies.journal')
 CONTEXT_FILE = os.path.join(DATA_DIR, 'context.json')
+CONTEXT_DIR = os.path.join(DATA_DIR, 'contexts')
+TRANSCRIPT_DIR = os.path.join(DATA_DIR, 'transcripts')
 BOOKINGS_FILE = os.path.join(DATA_DIR, 'bookings.json')
+BOOKINGS_DIR = os.path.join(DATA_DIR, 'bookings')
+BOOKINGS_JOURNAL_FILE = os.path.join(DATA_DIR, 'bookings.journal')
+BOOKINGS_INDEX_FILE = os.path.join(DATA_DIR, 'bookings.index')
+SQLITE_FILE = os.path.join(DATA_DIR, 'savoy.db')
+SEAT_LOCK_FILE = os.path.join(DATA_DIR, 'seats.lock')
+WAITLIST_FILE = os.path.join(DATA_DIR, 'waitlist.json')
 INTENT_MODEL_FILE = os.path.join(MODELS_DIR, 'intent_model.pkl')
 
 SEATS_PER_ROW = 10
@@ -15,6 +24,57 @@ TICKET_PRICE = 12.50
 MAX_TICKETS = 10
 MIN_TICKETS = 1
 
+# Where movies, bookings and user contexts live: 'json' (snapshot files + journal), 'sqlite'
+# (SQLITE_FILE for movies and bookings) or 'memory' (this process only, nothing saved).
+# See database/backends.py; python bench_storage.py backends compares them.
+STORAGE_BACKEND = 'json'
+
+# Snapshot encoding used when saving data files: 'pretty', 'compact' or 'gzip' (loading detects the format)
+STORAGE_FORMAT = 'compact'
+
+# Write-behind persistence: 'sync' writes (and fsyncs) before returning, 'deferred' hands off to the writer thread.
+# For bookings 'sync' means every journal record is fsynced before the booking is confirmed.
+BOOKING_WRITE_POLICY = 'sync'
+CONTEXT_WRITE_POLICY = 'deferred'
+WRITE_FLUSH_INTERVAL_MS = 200
+WRITE_QUEUE_SIZE = 1000
+
+# Fold the booking journal into the per-day booking files after this many records
+BOOKING_COMPACT_EVERY = 500
+
+# Write the waitlist out in full and trim its journal after this many records
+WAITLIST_COMPACT_EVERY = 500
+
+# Booking IDs each process reserves at a time from the shared counter; unused ones are skipped when it stops
+BOOKING_ID_BLOCK = 100
+
+# Share the live seat map between bot processes through shared memory, so a seat can only be
+# reserved once across all of them. SEAT_MEMORY_SLOTS is how many dated showtimes it can hold at once.
+# The map is checked against the stored bookings whenever a process loads or compacts them, which
+# frees seats a crashed process reserved without saving its booking.
+SHARED_SEATS = True
+SEAT_MEMORY_SLOTS = 4096
+
+# How long seats chosen in the booking flow are held for the user before they are released
+SEAT_HOLD_SECONDS = 300
+
+# Showtimes with this many seats or fewer left are listed as almost sold out
+ALMOST_SOLD_OUT_SEATS = 10
+
+# Bookings can be cancelled for a full refund up to this many hours before the showing
+REFUND_CUTOFF_HOURS = 2
+
+# Days of past shows kept as plain, in-memory partitions before they are compressed into read-only archives
+BOOKING_ARCHIVE_AFTER_DAYS = 1
+
+# Sessions idle longer than this are inactive and their contexts may be evicted from memory
+SESSION_TIMEOUT_SECONDS = 1800
+MAX_RESIDENT_CONTEXTS = 1000
+
+# Conversation transcripts: live log size before rotation, and recent turns kept in memory
+TRANSCRIPT_MAX_BYTES = 1_000_000
+HISTORY_BUFFER_SIZE = 50
+
 INTENT_CONFIDENCE_THRESHOLD = 0.6
 SIMILARITY_THRESHOLD = 0.25
 
@@ -1,7 +1,9 @@
 from .context_manager import ContextManager
 from .state_tracker import StateTracker
 from .memory_store import MemoryStore
+from .transcript_log import TranscriptLog
+from .models import UserContext, BookingState
 
-__all__ = ['ContextManager', 'StateTracker', 'MemoryStore']
+__all__ = ['ContextManager', 'StateTracker', 'MemoryStore', 'TranscriptLog', 'UserContext', 'BookingState']
 
 # print("Context package loaded successfully!")
\ No newline at end of file
@@ -1,9 +1,12 @@
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from contextlib import contextmanager
 from datetime import datetime
 from .state_tracker import StateTracker
-from .memory_store import MemoryStore
+# A module reference, as the database package imports this package's stores in turn
+from database import backends
+from .transcript_log import TranscriptLog
 
 # ContextManager is a class that handles the state of the conversation between the user and the chatbot.
 class ContextManager:
@@ -12,8 +15,13 @@ class ContextManager:
     def __init__(self, user_id='default_user'):
         self.user_id = user_id
         self.state_tracker = StateTracker()
-        self.memory_store = MemoryStore()
+        self.memory_store = backends.open_backend().contexts()
         self.context = self.memory_store.load_context(user_id)
+        self.transcript = TranscriptLog(user_id)
+        self._turn_depth = 0
+        self._dirty = False
+        self.writes_saved = 0
+        self._migrate_history()
     # Methods
     def get(self, key, default=None):
         return self.context.get(key, default)
@@ -38,26 +46,58 @@ class ContextManager:
         self.context['awaiting_confirmation'] = False
         self.save()
     
-    # Add a message to the conversation history
+    # Move history stored inside an older context document into the transcript log
+    def _migrate_history(self):
+        history = self.context.pop('conversation_history', None)
+        if history is None:
+            return
+        if not self.transcript.recent:
+            self.transcript.extend(history)
+        self.memory_store.save_context(self.user_id, self.context)
+    
+    # Add a message to the conversation transcript
     def add_to_history(self, user_message, bot_response):
-        if 'conversation_history' not in self.context:
-            self.context['conversation_history'] = []
-        
-        self.context['conversation_history'].append({
+        self.transcript.append({
             'timestamp': datetime.now().isoformat(),
             'user': user_message,
             'bot': bot_response
         })
-        
-        if len(self.context['conversation_history']) > 50:
-            self.context['conversation_history'] = self.context['conversation_history'][-50:]
-        
         self.save()
     
+    # Return the most recent turns from the in-memory ring buffer
+    def get_history(self, limit=None):
+        return self.transcript.get_recent(limit)
+    
+    # Inside a turn just mark the context dirty, otherwise write it straight away
     def save(self):
-        self.context['last_active'] = datetime.now().isoformat()
+        self.context.touch()
+        if self._turn_depth:
+            if self._dirty:
+                self.writes_saved += 1
+            self._dirty = True
+            return
         self.memory_store.save_context(self.user_id, self.context)
     
+    # Group every change made during one bot turn into a single write
+    @contextmanager
+    def turn(self):
+        if self._turn_depth == 0:
+            # Pick up the shared store's copy in case another bot changed it or it was evicted
+            self.context = self.memory_store.load_context(self.user_id)
+        self._turn_depth += 1
+        try:
+            yield self
+        finally:
+            self._turn_depth -= 1
+            if self._turn_depth == 0:
+                self.flush()
+    
+    # Write the context if anything changed since the last write
+    def flush(self):
+        if self._dirty:
+            self._dirty = False
+            self.memory_store.save_context(self.user_id, self.context)
+    
     def clear(self):
         self.context = self.memory_store.create_new_context(self.user_id)
         self.save()
@@ -2,59 +2,303 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from datetime import datetime
-from config import CONTEXT_FILE
+import json
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+from config import (CONTEXT_FILE, CONTEXT_DIR, CONTEXT_WRITE_POLICY,
+                    MAX_RESIDENT_CONTEXTS, SESSION_TIMEOUT_SECONDS)
 from utils.helpers import Helper
+from utils.write_behind import get_writer
+from utils.file_lock import FileLock
+from .models import UserContext
 
-# MemoryStore loads and saves conversation contexts for all users
+SHARD_SUFFIX = '.json'
+LOCK_SUFFIX = '.lock'
+
+_shared_stores = {}
+_shared_stores_lock = threading.Lock()
+
+# MemoryStore loads and saves conversation contexts, one shard file per user.
+# Only recently used contexts stay in memory; the rest are reloaded from disk on demand.
+# Saves write only the fields that changed, merged into the shard under a per-user
+# file lock, so several processes can share the directory without losing updates.
 class MemoryStore:
     
-    # Load all contexts from disk when the store is created
-    def __init__(self):
-        self.contexts = Helper.load_json(CONTEXT_FILE, {})
+    # Point the store at its shard directory, migrating the old single file once
+    def __init__(self, context_dir=CONTEXT_DIR, legacy_file=CONTEXT_FILE,
+                 max_resident=MAX_RESIDENT_CONTEXTS, idle_seconds=SESSION_TIMEOUT_SECONDS):
+        self.context_dir = context_dir
+        self.legacy_file = legacy_file
+        self._init_state(max_resident, idle_seconds)
+        self._migrate_legacy_file()
+    
+    # Set up what every context store has whatever keeps saved contexts: the resident
+    # contexts and their limits, the fingerprints saves diff against, the counters and
+    # the writer. Stores that keep contexts elsewhere call this instead of __init__.
+    def _init_state(self, max_resident, idle_seconds):
+        self.max_resident = max_resident
+        self.idle_seconds = idle_seconds
+        self.contexts = OrderedDict()
+        self._fingerprints = {}
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'misses': 0, 'idle_evictions': 0, 'capacity_evictions': 0}
+        self.writer = get_writer()
+    
+    # Return the process-wide store for a shard directory, creating it on first use.
+    # Every ContextManager in the process shares it, so they all see the same contexts.
+    @classmethod
+    def shared(cls, context_dir=CONTEXT_DIR, legacy_file=CONTEXT_FILE):
+        key = os.path.abspath(context_dir)
+        with _shared_stores_lock:
+            if key not in _shared_stores:
+                _shared_stores[key] = cls(context_dir, legacy_file)
+            return _shared_stores[key]
+    
+    # Split the old monolithic context.json into per-user shards
+    def _migrate_legacy_file(self):
+        if os.path.isdir(self.context_dir):
+            return
+        
+        parent_dir = os.path.dirname(os.path.abspath(self.context_dir))
+        os.makedirs(parent_dir, exist_ok=True)
+        with FileLock(self.context_dir + LOCK_SUFFIX):
+            # Another process may have finished the migration while we waited for the lock
+            if os.path.isdir(self.context_dir):
+                return
+            
+            legacy = Helper.load_json(self.legacy_file, {})
+            if not legacy:
+                os.makedirs(self.context_dir, exist_ok=True)
+                return
+            
+            # Write into a scratch directory and rename it so a crash never leaves half a migration
+            staging_dir = self.context_dir + '.migrating'
+            os.makedirs(staging_dir, exist_ok=True)
+            for user_id, context in legacy.items():
+                Helper.save_json(os.path.join(staging_dir, self._shard_name(user_id)), context)
+            os.rename(staging_dir, self.context_dir)
+    
+    # Turn a user ID into a safe file name for its shard
+    @staticmethod
+    def _shard_name(user_id):
+        return quote(str(user_id), safe='') + SHARD_SUFFIX
+    
+    # Full path of the shard file holding a user's context
+    def _shard_path(self, user_id):
+        return os.path.join(self.context_dir, self._shard_name(user_id))
+    
+    # Read one user's shard, with any of our changes that haven't reached disk yet applied
+    def _read_shard(self, user_id):
+        shard_path = self._shard_path(user_id)
+        data = Helper.load_json(shard_path, {})
+        pending = self.writer.get_pending(shard_path)
+        if pending is not None:
+            self._apply_changes(data, pending)
+        return UserContext.from_dict(data) if data else None
+    
+    # Hash each top-level field of a snapshot so later saves can tell which fields changed
+    @staticmethod
+    def _fingerprint(snapshot):
+        return {key: hash(json.dumps(value, sort_keys=True, default=str)) for key, value in snapshot.items()}
     
-    # Return a context for a user, creating a new one if missing
+    # Work out the fields set or removed since the last load or save of this user
+    def _diff(self, user_id, snapshot):
+        fingerprint = self._fingerprint(snapshot)
+        previous = self._fingerprints.get(user_id, {})
+        self._fingerprints[user_id] = fingerprint
+        return {
+            'set': {key: snapshot[key] for key, value in fingerprint.items() if previous.get(key) != value},
+            'unset': [key for key in previous if key not in fingerprint]
+        }
+    
+    # Merge two batches of changes for the same user; the newer one wins per field
+    @staticmethod
+    def _combine_changes(older, newer):
+        merged = dict(older['set'])
+        for key in newer['unset']:
+            merged.pop(key, None)
+        merged.update(newer['set'])
+        unset = (set(older['unset']) - set(newer['set'])) | set(newer['unset'])
+        return {'set': merged, 'unset': sorted(unset)}
+    
+    # Apply a batch of field changes to a shard dictionary in place
+    @staticmethod
+    def _apply_changes(data, changes):
+        for key in changes['unset']:
+            data.pop(key, None)
+        data.update(changes['set'])
+    
+    # Read-modify-write one shard while holding that user's lock; other users aren't blocked
+    @staticmethod
+    def _merge_write(shard_path, changes):
+        with FileLock(shard_path + LOCK_SUFFIX):
+            data = Helper.load_json(shard_path, {})
+            MemoryStore._apply_changes(data, changes)
+            Helper.save_json(shard_path, data)
+    
+    # Return a context for a user, reloading it from disk or creating a new one if needed
     def load_context(self, user_id):
-        if user_id not in self.contexts:
-            self.contexts[user_id] = self.create_new_context(user_id)
-        return self.contexts[user_id]
+        with self._lock:
+            if user_id in self.contexts:
+                self.stats['hits'] += 1
+                self.contexts.move_to_end(user_id)
+                return self.contexts[user_id]
+            
+            self.stats['misses'] += 1
+            context = self._read_shard(user_id)
+            if context:
+                self._fingerprints[user_id] = self._fingerprint(context.to_dict())
+            else:
+                context = self.create_new_context(user_id)
+            self._make_resident(user_id, context)
+            return context
     
-    # Persist a single user's context to disk
+    # Persist a single user's context to its own shard through the write-behind writer
     def save_context(self, user_id, context):
+        with self._lock:
+            self._make_resident(user_id, context)
+            changes = self._diff(user_id, context.to_dict())
+        if not changes['set'] and not changes['unset']:
+            return
+        durable = CONTEXT_WRITE_POLICY == 'sync'
+        self.writer.submit(self._shard_path(user_id), changes, durable=durable,
+                           write=self._merge_write, combine=self._combine_changes)
+    
+    # Make room by evicting idle or excess contexts, then add this one as most recently used
+    def _make_resident(self, user_id, context):
+        self.contexts.pop(user_id, None)
+        self.evict(reserve=1)
         self.contexts[user_id] = context
-        Helper.save_json(CONTEXT_FILE, self.contexts)
     
-    # Create a brand new default context structure for a user
+    # Drop contexts from the least recently used end while they are idle or over the limit.
+    # Their shards are already on disk (or queued in the writer), so nothing is lost.
+    def evict(self, reserve=0):
+        now = time.time()
+        with self._lock:
+            while self.contexts:
+                user_id, context = next(iter(self.contexts.items()))
+                if len(self.contexts) + reserve > self.max_resident:
+                    self.stats['capacity_evictions'] += 1
+                elif self._is_idle(context, now):
+                    self.stats['idle_evictions'] += 1
+                else:
+                    break
+                self.contexts.popitem(last=False)
+                self._fingerprints.pop(user_id, None)
+    
+    # Apply the session timeout rule to a context's last_active timestamp
+    def _is_idle(self, context, now):
+        if context.last_active is None:
+            return True
+        return now - context.last_active >= self.idle_seconds
+    
+    # Return eviction counters along with the current and maximum resident counts
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['resident'] = len(self.contexts)
+        stats['max_resident'] = self.max_resident
+        return stats
+    
+    # Create a brand new default context for a user
     def create_new_context(self, user_id):
-        return {
-            'user_id': user_id,
-            'name': None,
-            'preferences': {},
-            'conversation_history': [],
-            'booking_state': {
-                'stage': None,
-                'movie': None,
-                'time': None,
-                'tickets': None,
-                'seats': []
-            },
-            'last_mentioned_movie': None,
-            'awaiting_confirmation': False,
-            'session_start': datetime.now().isoformat(),
-            'last_active': datetime.now().isoformat()
-        }
+        return UserContext(user_id)
     
     # Remove a user's context completely
     def delete_context(self, user_id):
-        if user_id in self.contexts:
-            del self.contexts[user_id]
-            Helper.save_json(CONTEXT_FILE, self.contexts)
+        shard_path = self._shard_path(user_id)
+        with self._lock:
+            self.contexts.pop(user_id, None)
+            self._fingerprints.pop(user_id, None)
+            self.writer.discard(shard_path)
+            with FileLock(shard_path + LOCK_SUFFIX):
+                if os.path.exists(shard_path):
+                    os.remove(shard_path)
     
-    # Return the full mapping of user IDs to contexts
+    # Return the full mapping of user IDs to contexts. Shards that aren't resident are
+    # read for the result only, so this doesn't pull every user back into memory.
     def get_all_contexts(self):
-        return self.contexts
+        with self._lock:
+            contexts = dict(self.contexts)
+        for filename in os.listdir(self.context_dir):
+            if not filename.endswith(SHARD_SUFFIX):
+                continue
+            user_id = unquote(filename[:-len(SHARD_SUFFIX)])
+            if user_id not in contexts:
+                context = self._read_shard(user_id)
+                if context:
+                    contexts[user_id] = context
+        return contexts
+    
+    # Yield (user_id, context) for every stored user, reading one shard at a time so all
+    # users can be walked without holding them in memory together
+    def iter_contexts(self):
+        with os.scandir(self.context_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(SHARD_SUFFIX):
+                    continue
+                user_id = unquote(entry.name[:-len(SHARD_SUFFIX)])
+                with self._lock:
+                    context = self.contexts.get(user_id)
+                if context is None:
+                    context = self._read_shard(user_id)
+                if context:
+                    yield user_id, context
+
+# MemoryStore that keeps saved contexts in this process instead of shard files. Saved
+# contexts are stored as their dictionaries, so loading one after it was evicted gives
+# back a fresh copy just as reading a shard would; residency and eviction work the same.
+class InMemoryContextStore(MemoryStore):
+    
+    # Start empty; the writer is kept only because callers may still flush it
+    def __init__(self, max_resident=MAX_RESIDENT_CONTEXTS, idle_seconds=SESSION_TIMEOUT_SECONDS):
+        self._init_state(max_resident, idle_seconds)
+        self._saved = {}
+    
+    # Copy of a user's saved context, or None if they have never been saved
+    def _read_shard(self, user_id):
+        data = self._saved.get(user_id)
+        return UserContext.from_dict(json.loads(data)) if data else None
+    
+    # Keep the saved form of the context; it is encoded so later edits don't leak into it
+    def save_context(self, user_id, context):
+        with self._lock:
+            self._make_resident(user_id, context)
+            self._saved[user_id] = json.dumps(context.to_dict(), default=str)
+    
+    # Remove a user's context completely
+    def delete_context(self, user_id):
+        with self._lock:
+            self.contexts.pop(user_id, None)
+            self._fingerprints.pop(user_id, None)
+            self._saved.pop(user_id, None)
+    
+    # Every saved context, plus resident ones not saved yet
+    def get_all_contexts(self):
+        with self._lock:
+            contexts = dict(self.contexts)
+            saved = [user_id for user_id in self._saved if user_id not in contexts]
+        for user_id in saved:
+            context = self._read_shard(user_id)
+            if context:
+                contexts[user_id] = context
+        return contexts
+    
+    # Yield (user_id, context) for every saved user, one copy at a time
+    def iter_contexts(self):
+        with self._lock:
+            user_ids = list(self._saved)
+        for user_id in user_ids:
+            with self._lock:
+                context = self.contexts.get(user_id)
+            if context is None:
+                context = self._read_shard(user_id)
+            if context:
+                yield user_id, context
 
 if __name__ == "__main__":
     pass
     # print("MemoryStore module loaded successfully!")
-    
\ No newline at end of file
+    
@@ -0,0 +1,180 @@
+import time
+from datetime import datetime
+
+# Convert between the epoch seconds kept in memory and the ISO strings stored on disk
+def _to_iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp is not None else None
+
+def _from_iso(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+# BookingState holds the progress of one booking. It uses __slots__ to keep each
+# instance small, and supports dict-style access so existing callers keep working.
+class BookingState:
+    __slots__ = ('stage', 'movie', 'time', 'tickets', 'seats', 'hold')
+    
+    def __init__(self, stage=None, movie=None, time=None, tickets=None, seats=None, hold=None):
+        self.stage = stage
+        self.movie = movie
+        self.time = time
+        self.tickets = tickets
+        self.seats = seats if seats is not None else []
+        # [token, expires_at] of the hold on the chosen seats while the user confirms
+        self.hold = hold
+    
+    # Build a state from its on-disk dictionary, ignoring unknown keys
+    @classmethod
+    def from_dict(cls, data):
+        data = data or {}
+        return cls(*(data.get(field) for field in cls.__slots__))
+    
+    # Return the on-disk dictionary form
+    def to_dict(self):
+        return {
+            'stage': self.stage,
+            'movie': self.movie,
+            'time': self.time,
+            'tickets': self.tickets,
+            'seats': [list(seat) for seat in self.seats],
+            'hold': self.hold
+        }
+    
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+    
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+    
+    def __contains__(self, key):
+        return key in self.__slots__
+    
+    def update(self, updates):
+        for key, value in updates.items():
+            self[key] = value
+    
+    def __repr__(self):
+        return f"BookingState({self.to_dict()})"
+
+# UserContext is everything the bot remembers about one user. Known fields live in
+# slots, timestamps are epoch floats, and anything else set by callers goes in extras.
+class UserContext:
+    __slots__ = ('user_id', 'name', 'preferences', 'booking_state', 'last_mentioned_movie',
+                 'awaiting_confirmation', 'session_start', 'last_active', 'extras')
+    
+    FIELDS = ('user_id', 'name', 'preferences', 'booking_state', 'last_mentioned_movie',
+              'awaiting_confirmation', 'session_start', 'last_active')
+    TIMESTAMP_FIELDS = ('session_start', 'last_active')
+    
+    def __init__(self, user_id, name=None, preferences=None, booking_state=None,
+                 last_mentioned_movie=None, awaiting_confirmation=False,
+                 session_start=None, last_active=None, extras=None):
+        now = time.time()
+        self.user_id = user_id
+        self.name = name
+        self.preferences = preferences if preferences is not None else {}
+        self.booking_state = booking_state if booking_state is not None else BookingState()
+        self.last_mentioned_movie = last_mentioned_movie
+        self.awaiting_confirmation = awaiting_confirmation
+        self.session_start = session_start if session_start is not None else now
+        self.last_active = last_active if last_active is not None else now
+        self.extras = extras
+    
+    # Build a context from its on-disk dictionary
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        context = cls(
+            user_id=data.pop('user_id', None),
+            name=data.pop('name', None),
+            preferences=data.pop('preferences', None),
+            booking_state=BookingState.from_dict(data.pop('booking_state', None)),
+            last_mentioned_movie=data.pop('last_mentioned_movie', None),
+            awaiting_confirmation=bool(data.pop('awaiting_confirmation', False)),
+            session_start=_from_iso(data.pop('session_start', None)),
+            last_active=_from_iso(data.pop('last_active', None))
+        )
+        context.extras = data or None
+        return context
+    
+    # Return the on-disk dictionary form, with ISO timestamps as before
+    def to_dict(self):
+        data = {
+            'user_id': self.user_id,
+            'name': self.name,
+            'preferences': dict(self.preferences),
+            'booking_state': self.booking_state.to_dict(),
+            'last_mentioned_movie': self.last_mentioned_movie,
+            'awaiting_confirmation': self.awaiting_confirmation,
+            'session_start': _to_iso(self.session_start),
+            'last_active': _to_iso(self.last_active)
+        }
+        if self.extras:
+            data.update(self.extras)
+        return data
+    
+    # Record activity now
+    def touch(self):
+        self.last_active = time.time()
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def __getitem__(self, key):
+        if key in self.TIMESTAMP_FIELDS:
+            return _to_iso(getattr(self, key))
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if self.extras and key in self.extras:
+            return self.extras[key]
+        raise KeyError(key)
+    
+    def __setitem__(self, key, value):
+        if key in self.TIMESTAMP_FIELDS:
+            setattr(self, key, _from_iso(value))
+        elif key == 'booking_state' and not isinstance(value, BookingState):
+            self.booking_state = BookingState.from_dict(value)
+        elif key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extras is None:
+                self.extras = {}
+            self.extras[key] = value
+    
+    def __contains__(self, key):
+        return key in self.FIELDS or bool(self.extras and key in self.extras)
+    
+    def update(self, updates):
+        for key, value in updates.items():
+            self[key] = value
+    
+    # Remove an extra key and return its value (known fields can't be removed)
+    def pop(self, key, default=None):
+        if self.extras and key in self.extras:
+            return self.extras.pop(key)
+        return default
+    
+    def __repr__(self):
+        return f"UserContext({self.user_id!r})"
+
+if __name__ == "__main__":
+    pass
+    # print("Models module loaded successfully!")
@@ -1,30 +1,22 @@
+from .models import BookingState
+
 # StateTracker keeps track of the current booking progress in the context
 class StateTracker:
-    # Return the current booking state, creating a fresh one if needed
+    # Return the current booking state
     def get_state(self, context):
-        if 'booking_state' not in context:
-            context['booking_state'] = self.create_empty_state()
-        return context['booking_state']
+        return context.booking_state
     
     # Apply updates to the booking state stored in the context
     def update_state(self, context, updates):
-        if 'booking_state' not in context:
-            context['booking_state'] = self.create_empty_state()
-        context['booking_state'].update(updates)
+        context.booking_state.update(updates)
     
     # Reset the booking state back to an empty template
     def reset_state(self, context):
-        context['booking_state'] = self.create_empty_state()
+        context.booking_state = self.create_empty_state()
     
-    # Build a new empty booking state dictionary
+    # Build a new empty booking state
     def create_empty_state(self):
-        return {
-            'stage': None,
-            'movie': None,
-            'time': None,
-            'tickets': None,
-            'seats': []
-        }
+        return BookingState()
     
     # Get the current stage name from the booking state
     def get_stage(self, context):
@@ -0,0 +1,75 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import glob
+import gzip
+import json
+from collections import deque
+from datetime import datetime
+from urllib.parse import quote
+from config import TRANSCRIPT_DIR, TRANSCRIPT_MAX_BYTES, HISTORY_BUFFER_SIZE
+
+# TranscriptLog is an append-only JSON-lines log of one user's conversation,
+# with a small ring buffer of the most recent turns kept in memory
+class TranscriptLog:
+    
+    # Open a user's transcript and fill the ring buffer from the end of the live file
+    def __init__(self, user_id, transcript_dir=TRANSCRIPT_DIR,
+                 max_bytes=TRANSCRIPT_MAX_BYTES, buffer_size=HISTORY_BUFFER_SIZE):
+        os.makedirs(transcript_dir, exist_ok=True)
+        self.user_id = user_id
+        self.max_bytes = max_bytes
+        self.base_path = os.path.join(transcript_dir, quote(str(user_id), safe=''))
+        self.path = self.base_path + '.jsonl'
+        self.recent = deque(self._read_lines(self.path), maxlen=buffer_size)
+    
+    # Append one turn to the log and the ring buffer
+    def append(self, entry):
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            self.rotate()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+        self.recent.append(entry)
+    
+    # Add several turns at once, e.g. when moving old history out of a context
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+    
+    # Compress the live file into a timestamped archive and start a fresh one
+    def rotate(self):
+        if not os.path.exists(self.path):
+            return
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        with open(self.path, 'rb') as src, gzip.open(f"{self.base_path}.{stamp}.jsonl.gz", 'wb') as dst:
+            dst.write(src.read())
+        os.remove(self.path)
+    
+    # Return the buffered recent turns, oldest first
+    def get_recent(self, limit=None):
+        entries = list(self.recent)
+        return entries[-limit:] if limit else entries
+    
+    # Yield every turn ever logged for the user, archives first, one line at a time
+    def read_all(self):
+        for archive in sorted(glob.glob(glob.escape(self.base_path) + '.*.jsonl.gz')):
+            yield from self._read_lines(archive)
+        yield from self._read_lines(self.path)
+    
+    # Yield decoded entries from a plain or gzipped log file, skipping a torn final line
+    @staticmethod
+    def _read_lines(path):
+        if not os.path.exists(path):
+            return
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+if __name__ == "__main__":
+    pass
+    # print("TranscriptLog module loaded successfully!")
@@ -36,11 +36,36 @@ class MovieBot:
         self.last_question_was_name = (name is None)
         return self.nlg.welcome_message(name)
     
+    # Handle one user message, saving the context once at the end of the turn
     def respond(self, user_input):
+        with self.context.turn():
+            return self._respond(user_input)
+    
+    # Add any seats the waiting list has offered this user since their last message
+    def _with_waitlist_offers(self, response):
+        if response is None:
+            return response
+        offers = []
+        # Offers for a movie taken off the catalogue since are dropped
+        for offer in self.db.take_waitlist_offers(self.user_id):
+            movie = self.db.get_movie(offer['movie_key'])
+            if movie is not None:
+                offers.append(dict(offer, title=movie['title']))
+        if not offers:
+            return response
+        return response + "\n\n" + self.nlg.waitlist_offer_message(offers)
+    
+    # Record a turn in the history with the response as the user sees it, offers included
+    def _record_turn(self, user_input, response):
+        response = self._with_waitlist_offers(response)
+        self.context.add_to_history(user_input, response)
+        return response
+    
+    def _respond(self, user_input):
         self.session.update_activity()
         
         if not user_input or not user_input.strip():
-            return "I didn't catch that. Could you say that again?"
+            return self._with_waitlist_offers("I didn't catch that. Could you say that again?")
         
         text_lower = user_input.lower().strip()
         
@@ -54,8 +79,7 @@ class MovieBot:
                 self.context.set('name', name)
                 self.last_question_was_name = False
                 response = self.nlg.welcome_message(name)
-                self.context.add_to_history(user_input, response)
-                return response
+                return self._record_turn(user_input, response)
             
             words = user_input.split()
             if len(words) <= 2 and not any(word in text_lower for word in ['what', 'show', 'help', 'movie', 'book']):
@@ -63,8 +87,7 @@ class MovieBot:
                 self.context.set('name', name)
                 self.last_question_was_name = False
                 response = self.nlg.welcome_message(name)
-                self.context.add_to_history(user_input, response)
-                return response
+                return self._record_turn(user_input, response)
             
             self.last_question_was_name = False
         
@@ -73,13 +96,11 @@ class MovieBot:
         
         if stage:
             response = self._handle_booking_stage(user_input, stage)
-            self.context.add_to_history(user_input, response)
-            return response
+            return self._record_turn(user_input, response)
         
         if self.context.get('awaiting_confirmation'):
             response = self._handle_awaiting_confirmation(user_input)
-            self.context.add_to_history(user_input, response)
-            return response
+            return self._record_turn(user_input, response)
         
         intent, confidence = self.intent_matcher.get_intent_with_context(
             user_input,
@@ -90,8 +111,12 @@ class MovieBot:
 
         
         response = self._route_intent(intent, user_input)
-        self.context.add_to_history(user_input, response)
-        return response
+        return self._record_turn(user_input, response)
+    
+    # Write out anything this bot still has buffered before the process exits
+    def close(self):
+        self.context.flush()
+        self.db.close()
     
     def _handle_name_input(self, text):
         if len(text.split()) <= 2 and not any(word in text.lower() for word in ['book', 'movie', 'show', 'help']):
@@ -120,6 +145,8 @@ class MovieBot:
             return self._handle_seat_selection(user_input)
         elif stage == 'confirm':
             return self._handle_confirmation(user_input)
+        elif stage == 'waitlist':
+            return self._handle_waitlist_choice(user_input)
         
         return self.nlg.error_message()
     
@@ -146,11 +173,34 @@ class MovieBot:
         movie_key = booking_state['movie']
         showtime = booking_state['time']
         
+        free = self.db.count_free_seats(movie_key, showtime)
+        if free < num:
+            self.context.update_booking_state({'tickets': num, 'stage': 'waitlist'})
+            return self.nlg.sold_out_response(showtime, free, num)
+        
         seat_map = self.transaction.show_seat_map(movie_key, showtime)
         
         self.context.update_booking_state({'tickets': num, 'stage': 'seats'})
         return self.nlg.tickets_selected_response(num, seat_map)
     
+    # Join the waiting list for a showtime that can't seat the party, or pick another time
+    def _handle_waitlist_choice(self, user_input):
+        text_lower = user_input.lower()
+        booking_state = self.context.get_booking_state()
+        movie = self.db.get_movie(booking_state['movie'])
+        
+        if any(word in text_lower for word in ['yes', 'yeah', 'yep', 'sure', 'ok', 'join']):
+            joined = self.transaction.join_waitlist(
+                self.user_id, booking_state['movie'], booking_state['time'], booking_state['tickets']
+            )
+            self.context.reset_booking()
+            return self.nlg.waitlist_joined_response(movie, booking_state['time'], joined)
+        elif any(word in text_lower for word in ['no', 'nope', 'nah']):
+            self.context.update_booking_state({'stage': 'time', 'time': None, 'tickets': None})
+            return f"No problem. Which other showtime would you like? Available: {', '.join(movie['times'])}"
+        
+        return "Would you like to join the waiting list? (yes/no)"
+    
     def _handle_seat_selection(self, seat_input):
         booking_state = self.context.get_booking_state()
         movie_key = booking_state['movie']
@@ -161,13 +211,19 @@ class MovieBot:
             seat_input, movie_key, showtime, num_tickets
         )
         
+        if error:
+            return self.nlg.validation_error(error)
+        
+        # Hold the seats while the user confirms so nobody else can pick them
+        hold, error = self.transaction.hold_seats(movie_key, showtime, seats)
+        
         if error:
             return self.nlg.validation_error(error)
         
         movie = self.db.get_movie(movie_key)
         total = self.transaction.calculate_total(movie, num_tickets)
         
-        self.context.update_booking_state({'seats': seats, 'stage': 'confirm'})
+        self.context.update_booking_state({'seats': seats, 'hold': hold, 'stage': 'confirm'})
         
         return self.nlg.booking_summary(movie, showtime, num_tickets, seats, total)
     
@@ -193,10 +249,17 @@ class MovieBot:
         movie = self.db.get_movie(movie_key)
         total = self.transaction.calculate_total(movie, num_tickets)
         
-        ref = self.transaction.confirm_booking(
-            self.user_id, user_name, movie_key, showtime, num_tickets, seats, total
+        ref, error = self.transaction.confirm_booking(
+            self.user_id, user_name, movie_key, showtime, num_tickets, seats, total,
+            booking_state['hold']
         )
         
+        if error:
+            # The hold ran out and the seats went to another session, so pick again from a fresh map
+            self.context.update_booking_state({'seats': [], 'hold': None, 'stage': 'seats'})
+            seat_map = self.transaction.show_seat_map(movie_key, showtime)
+            return self.nlg.validation_error(error) + "\n\n" + self.nlg.tickets_selected_response(num_tickets, seat_map)
+        
         response = self.nlg.confirmation_message(
             ref, user_name, movie, showtime, seats, num_tickets, total
         )
@@ -225,6 +288,10 @@ class MovieBot:
         
         stages = ['time', 'tickets', 'seats', 'confirm']
         
+        # The waiting list question comes right after the ticket count, like the seat map
+        if stage == 'waitlist':
+            stage = 'seats'
+        
         if not stage or stage not in stages:
             return "Nothing to go back to."
         
@@ -235,12 +302,16 @@ class MovieBot:
         
         previous_stage = stages[current_idx - 1]
         
+        # Any step back means choosing seats again, so let go of the ones held
+        self._release_hold(booking_state)
+        
         if previous_stage == 'time':
             self.context.update_booking_state({
                 'stage': 'time',
                 'time': None,
                 'tickets': None,
-                'seats': []
+                'seats': [],
+                'hold': None
             })
             movie = self.db.get_movie(booking_state['movie'])
             return f"Going back...\n\nWhich showtime? Available: {', '.join(movie['times'])}"
@@ -249,14 +320,16 @@ class MovieBot:
             self.context.update_booking_state({
                 'stage': 'tickets',
                 'tickets': None,
-                'seats': []
+                'seats': [],
+                'hold': None
             })
             return "Going back...\n\nHow many tickets? (1-10)"
         
         elif previous_stage == 'seats':
             self.context.update_booking_state({
                 'stage': 'seats',
-                'seats': []
+                'seats': [],
+                'hold': None
             })
             seat_map = self.transaction.show_seat_map(
                 booking_state['movie'],
@@ -268,9 +341,17 @@ class MovieBot:
     
     def _handle_cancel(self):
         """Cancel booking"""
+        self._release_hold(self.context.get_booking_state())
         self.context.reset_booking()
         return self.nlg.cancellation_message()
     
+    # Release the seats held for the booking in progress, if any
+    def _release_hold(self, booking_state):
+        if booking_state.get('hold'):
+            self.transaction.release_hold(
+                booking_state['movie'], booking_state['time'], booking_state['seats'], booking_state['hold']
+            )
+    
     def _route_intent(self, intent, user_input):
         name = self.context.get('name')
         
@@ -311,6 +392,9 @@ class MovieBot:
         elif intent == 'view_bookings':
             return self._show_bookings()
         
+        elif intent == 'refund_booking':
+            return self._handle_refund_request(user_input)
+        
         elif intent == 'help':
             booking_state = self.context.get_booking_state()
             return self.nlg.help_message(
@@ -356,7 +440,8 @@ class MovieBot:
     
     def _show_all_movies(self):
         movies = self.db.get_all_movies()
-        return self.nlg.movie_list_response(movies)
+        availability = {key: self.db.get_availability(key) for key in movies}
+        return self.nlg.movie_list_response(movies, availability)
     
     def _show_movie_info(self, movie_key):
         movie = self.db.get_movie(movie_key)
@@ -402,13 +487,27 @@ class MovieBot:
             'seats': []
         })
         
-        return self.nlg.booking_start_response(movie)
+        return self.nlg.booking_start_response(movie, self.db.get_availability(movie_key))
     
     def _show_bookings(self):
         bookings = self.db.get_user_bookings(self.user_id)
         name = self.context.get('name', 'Guest')
         return self.nlg.bookings_list_response(bookings, name)
     
+    # Cancel a stored booking by the reference in the message and refund it
+    def _handle_refund_request(self, user_input):
+        reference = self.text_processor.extract_reference(user_input)
+        
+        if not reference:
+            return "Which booking would you like to cancel? Tell me its reference, e.g. 'cancel BK7QX2M00041'. Type 'my bookings' to see them."
+        
+        booking, error = self.transaction.cancel_booking(self.user_id, reference)
+        
+        if error:
+            return self.nlg.validation_error(error)
+        
+        return self.nlg.refund_message(booking)
+    
     def _handle_price_query(self, user_input):
         movie_key = self._find_movie(user_input)
         
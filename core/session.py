@@ -1,5 +1,10 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from datetime import datetime
 import random
+from config import SESSION_TIMEOUT_SECONDS
 
 # Session represents one conversation with a user and tracks its basic stats
 class Session:
@@ -30,7 +35,7 @@ class Session:
     # Check if the session is still considered active
     def is_active(self):
         inactive_seconds = (datetime.now() - self.last_active).total_seconds()
-        return inactive_seconds < 1800  
+        return inactive_seconds < SESSION_TIMEOUT_SECONDS
 
     # Return a summary of current session statistics
     def get_stats(self):
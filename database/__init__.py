@@ -1,7 +1,12 @@
 from .db_manager import DatabaseManager
 from .movie_repository import MovieRepository
-from .booking_repository import BookingRepository
+from .booking_repository import BookingRepository, SeatUnavailableError, BatchBookingError
+from .shared_seats import SharedSeatMap
+from .sqlite_store import SqliteMovieRepository, SqliteBookingRepository
+from .backends import StorageBackend, BACKENDS, register_backend, open_backend
 
-__all__ = ['DatabaseManager', 'MovieRepository', 'BookingRepository']
+__all__ = ['DatabaseManager', 'MovieRepository', 'BookingRepository', 'SeatUnavailableError',
+           'BatchBookingError', 'SharedSeatMap', 'SqliteMovieRepository', 'SqliteBookingRepository',
+           'StorageBackend', 'BACKENDS', 'register_backend', 'open_backend']
 
 # print("Database package loaded successfully!")
\ No newline at end of file
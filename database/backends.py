@@ -0,0 +1,201 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from abc import ABC, abstractmethod
+from config import (STORAGE_BACKEND, DATA_DIR, SQLITE_FILE, MOVIES_FILE, MOVIES_JOURNAL_FILE,
+                    BOOKINGS_FILE, BOOKINGS_DIR, BOOKINGS_JOURNAL_FILE, BOOKINGS_INDEX_FILE,
+                    CONTEXT_FILE, CONTEXT_DIR, WAITLIST_FILE, SEAT_LOCK_FILE)
+from context.memory_store import MemoryStore, InMemoryContextStore
+from .movie_repository import MovieRepository
+from .booking_repository import BookingRepository
+from .in_memory import InMemoryMovieRepository, InMemoryBookingRepository
+from .shared_seats import SharedSeatMap, default_name
+from .sqlite_store import connect, import_json, SqliteMovieRepository, SqliteBookingRepository
+from .waitlist import Waitlist
+
+_open_backends = {}
+_open_backends_lock = threading.Lock()
+
+# The file of a data directory that a config path names, e.g. bookings.journal
+def _in_dir(data_dir, config_path):
+    return os.path.join(data_dir, os.path.basename(config_path))
+
+# StorageBackend is where the movie catalogue, the bookings and the user contexts live.
+# DatabaseManager, ContextManager and the transfer tool open their stores through one,
+# so the storage can be changed without touching them. Every backend's stores offer the
+# same methods as MovieRepository, BookingRepository and MemoryStore, and behave the same
+# way; database/conformance.py checks that. multiprocess is False for a backend whose
+# data other processes can't open, so a seat map shared between processes is no use.
+class StorageBackend(ABC):
+    name = None
+    multiprocess = True
+    
+    # A new, empty backend keeping its data under directory, for checks and benchmarks
+    @classmethod
+    @abstractmethod
+    def scratch(cls, directory):
+        pass
+    
+    # Open the movie catalogue, a MovieRepository
+    @abstractmethod
+    def movies(self):
+        pass
+    
+    # Open the bookings, a BookingRepository using seat_map (or one of its own if None)
+    @abstractmethod
+    def bookings(self, seat_map=None):
+        pass
+    
+    # The store of user contexts, a MemoryStore shared by everything in the process
+    @abstractmethod
+    def contexts(self):
+        pass
+    
+    # The waiting list that goes with the bookings, shared by everything using this backend
+    @abstractmethod
+    def waitlist(self):
+        pass
+    
+    # A seat map shared with the other processes using this data, or None if there are none
+    def seat_map(self, shared_seats):
+        return None
+
+# Everything in this process only; each store is opened once and handed out again on
+# every call, so all its users see the same data. Nothing survives the process.
+class MemoryBackend(StorageBackend):
+    name = 'memory'
+    multiprocess = False
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._movies = self._bookings = self._contexts = self._waitlist = None
+    
+    @classmethod
+    def scratch(cls, directory):
+        return cls()
+    
+    def movies(self):
+        with self._lock:
+            if self._movies is None:
+                self._movies = InMemoryMovieRepository()
+            return self._movies
+    
+    def bookings(self, seat_map=None):
+        with self._lock:
+            if self._bookings is None:
+                self._bookings = InMemoryBookingRepository(seat_map)
+            return self._bookings
+    
+    def contexts(self):
+        with self._lock:
+            if self._contexts is None:
+                self._contexts = InMemoryContextStore()
+            return self._contexts
+    
+    def waitlist(self):
+        with self._lock:
+            if self._waitlist is None:
+                self._waitlist = Waitlist(None)
+            return self._waitlist
+
+# JSON snapshot files and journals in a data directory, named as in config
+class JsonBackend(StorageBackend):
+    name = 'json'
+    
+    def __init__(self, data_dir=DATA_DIR):
+        self.data_dir = data_dir
+        self.movies_file = _in_dir(data_dir, MOVIES_FILE)
+        self._lock = threading.Lock()
+        self._waitlist = None
+        os.makedirs(data_dir, exist_ok=True)
+    
+    @classmethod
+    def scratch(cls, directory):
+        return cls(directory)
+    
+    def movies(self):
+        return MovieRepository(self.movies_file, _in_dir(self.data_dir, MOVIES_JOURNAL_FILE))
+    
+    def bookings(self, seat_map=None):
+        return BookingRepository(_in_dir(self.data_dir, BOOKINGS_DIR), _in_dir(self.data_dir, BOOKINGS_JOURNAL_FILE),
+                                 _in_dir(self.data_dir, BOOKINGS_INDEX_FILE), _in_dir(self.data_dir, BOOKINGS_FILE),
+                                 seat_map=seat_map)
+    
+    def contexts(self):
+        return MemoryStore.shared(_in_dir(self.data_dir, CONTEXT_DIR), _in_dir(self.data_dir, CONTEXT_FILE))
+    
+    # One waitlist for every manager on this backend; other processes share it through the file
+    def waitlist(self):
+        with self._lock:
+            if self._waitlist is None:
+                self._waitlist = Waitlist(_in_dir(self.data_dir, WAITLIST_FILE))
+            return self._waitlist
+    
+    # Processes using the same data directory share one seat map segment
+    def seat_map(self, shared_seats):
+        if not shared_seats:
+            return None
+        return SharedSeatMap(default_name(self.data_dir), lock_path=_in_dir(self.data_dir, SEAT_LOCK_FILE))
+
+# Movies and bookings in a SQLite database, each store on its own connection. Contexts
+# and the waitlist stay JSON files beside it. A new database is first filled from the
+# JSON store in json_dir, if one is given.
+class SqliteBackend(JsonBackend):
+    name = 'sqlite'
+    
+    def __init__(self, db_file=SQLITE_FILE, json_dir=DATA_DIR):
+        super().__init__(os.path.dirname(os.path.abspath(db_file)))
+        self.db_file = db_file
+        self.json_dir = json_dir
+        self._import_lock = threading.Lock()
+    
+    @classmethod
+    def scratch(cls, directory):
+        return cls(_in_dir(directory, SQLITE_FILE), json_dir=None)
+    
+    # Connect to the database, bringing over the JSON data the first time
+    def _connect(self):
+        with self._import_lock:
+            if self.json_dir and not os.path.exists(self.db_file):
+                source = JsonBackend(self.json_dir)
+                repo = source.bookings()
+                import_json(self.db_file, source.movies_file, repo.get_all(), repo.get_cancellations())
+                repo.close()
+        return connect(self.db_file)
+    
+    def movies(self):
+        return SqliteMovieRepository(self._connect(), _in_dir(self.data_dir, MOVIES_JOURNAL_FILE))
+    
+    def bookings(self, seat_map=None):
+        return SqliteBookingRepository(self._connect(), seat_map=seat_map)
+    
+    # The JSON store in the same directory has a segment of its own
+    def seat_map(self, shared_seats):
+        if not shared_seats:
+            return None
+        return SharedSeatMap(default_name(self.db_file), lock_path=_in_dir(self.data_dir, SEAT_LOCK_FILE))
+
+# Registered backends by name; STORAGE_BACKEND in config picks the one used
+BACKENDS = {
+    'memory': MemoryBackend,
+    'json': JsonBackend,
+    'sqlite': SqliteBackend,
+}
+
+# Add a backend class under a name so it can be configured and is checked and benchmarked
+def register_backend(name, backend_class):
+    BACKENDS[name] = backend_class
+
+# Return the process-wide backend of a kind with its default location, creating it on
+# first use, so every store opened through it in the process shares the same one
+def open_backend(name=STORAGE_BACKEND):
+    with _open_backends_lock:
+        if name not in _open_backends:
+            _open_backends[name] = BACKENDS[name]()
+        return _open_backends[name]
+
+if __name__ == "__main__":
+    pass
+    # print("Storage backends module loaded successfully!")
@@ -0,0 +1,237 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import struct
+import threading
+import zlib
+from config import BOOKINGS_JOURNAL_FILE
+from utils.file_lock import FileLock
+
+# Logical offsets of the previous segment's start, the current file's start, and the end
+GENERATION = struct.Struct('<QQQ')
+
+# BookingJournal is an append-only write-ahead log of changes. Each line is
+# "<crc32> <json>\n" so a record torn by a crash can be spotted and cut off on replay.
+# Several processes can share one journal. Appends, trims and reads of new records
+# happen under a file lock, and a small "<journal>.gen" sidecar holds the generation:
+# the logical end of the journal, counting every byte ever appended. Each reader keeps
+# the position it has read up to, so comparing the two tells it cheaply whether anyone
+# else has written, and read_new() returns just those records. A trim moves the
+# dropped records to "<journal>.prev", so a reader one trim behind can still catch up.
+class BookingJournal:
+    
+    # Open the journal next to the bookings snapshot; sync=True fsyncs every append
+    def __init__(self, path=BOOKINGS_JOURNAL_FILE, sync=True):
+        self.path = path
+        self.prev_path = path + '.prev'
+        self.generation_path = path + '.gen'
+        self.sync = sync
+        self.lock = FileLock(path + '.lock')
+        self.position = 0
+        self.records = 0
+        self.torn_records = 0
+        self._dropped_records = 0
+        self._file = None
+        self._file_base = None
+        self._generation_file = None
+        self._lock = threading.Lock()
+    
+    # Encode one record as a checksummed line
+    @staticmethod
+    def _encode(record):
+        payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        return b'%08x ' % zlib.crc32(payload) + payload + b'\n'
+    
+    # Decode one line, returning None if it is incomplete or corrupt
+    @staticmethod
+    def _decode(line):
+        if not line.endswith(b'\n') or len(line) < 10 or line[8:9] != b' ':
+            return None
+        payload = line[9:-1]
+        try:
+            if int(line[:8], 16) != zlib.crc32(payload):
+                return None
+            return json.loads(payload)
+        except ValueError:
+            return None
+    
+    # Read (previous segment start, current file start, end). Without a sidecar the
+    # journal has never been trimmed, so it starts at 0 and ends at its size.
+    def _read_generation(self):
+        if self._generation_file is None:
+            try:
+                self._generation_file = open(self.generation_path, 'rb', buffering=0)
+            except FileNotFoundError:
+                size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+                return 0, 0, size
+        self._generation_file.seek(0)
+        data = self._generation_file.read(GENERATION.size)
+        if len(data) < GENERATION.size:
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            return 0, 0, size
+        return GENERATION.unpack(data)
+    
+    # Record a new generation; only called with the file lock held
+    def _write_generation(self, prev_base, base, end):
+        with open(self.generation_path, 'r+b' if os.path.exists(self.generation_path) else 'wb') as f:
+            f.write(GENERATION.pack(prev_base, base, end))
+    
+    # Cheap check, without the lock, for records this reader hasn't seen yet
+    def changed(self):
+        with self._lock:
+            return self._read_generation()[2] != self.position
+    
+    # Append one record and make it durable before returning. Call with the file lock
+    # held and after read_new(), so this reader's position moves past its own record.
+    # The record goes at the logical end, not the end of the file: bytes past it are a
+    # record torn by a crash, and writing after them would let replay cut this one off.
+    def append(self, record):
+        line = self._encode(record)
+        with self._lock:
+            prev_base, base, end = self._read_generation()
+            # Another process may have trimmed the journal into a new file since we opened it
+            if self._file is None or self._file_base != base:
+                self._close_file()
+                self._file = open(self.path, 'r+b' if os.path.exists(self.path) else 'w+b')
+                self._file_base = base
+            self._file.seek(end - base)
+            if os.fstat(self._file.fileno()).st_size > end - base:
+                self._file.truncate()
+            self._file.write(line)
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+            self._write_generation(prev_base, base, end + len(line))
+            self.position = end + len(line)
+            self.records += 1
+    
+    # Read intact records from a segment file starting at a byte offset
+    def _read_segment(self, path, offset):
+        records = []
+        good_offset = offset
+        if not os.path.exists(path):
+            return records, good_offset
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                record = self._decode(line)
+                if record is None:
+                    self.torn_records += 1
+                    break
+                records.append(record)
+                good_offset += len(line)
+        return records, good_offset
+    
+    # Read every intact record from logical position start on, with the file lock held.
+    # A torn or corrupt tail left by a crash is cut off so new appends start on a clean line.
+    def replay(self, start=0):
+        with self._lock:
+            prev_base, base, _ = self._read_generation()
+            size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            records, good_offset = self._read_segment(self.path, min(max(start - base, 0), size))
+            if good_offset < size:
+                self._close_file()
+                with open(self.path, 'r+b') as f:
+                    f.truncate(good_offset)
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._write_generation(prev_base, base, base + good_offset)
+            self.position = base + good_offset
+            self.records = len(records)
+            self._dropped_records = 0
+        return records
+    
+    # Records other processes appended since this reader last read, with the file lock
+    # held. Returns None if some were trimmed away before we got to them.
+    def read_new(self):
+        with self._lock:
+            prev_base, base, end = self._read_generation()
+            if self.position == end:
+                return []
+            if self.position < prev_base:
+                return None
+            records = []
+            if self.position < base:
+                records, _ = self._read_segment(self.prev_path, self.position - prev_base)
+            new, good_offset = self._read_segment(self.path, max(self.position - base, 0))
+            records.extend(new)
+            self.position = base + good_offset
+            self.records += len(new)
+        return records
+    
+    # Intact records in the current file up to logical position end (the end of the
+    # journal by default). Unlike replay(), this reader's position doesn't move.
+    def read_until(self, end=None):
+        with self._lock:
+            _, base, journal_end = self._read_generation()
+            end = journal_end if end is None else end
+            if end <= base or not os.path.exists(self.path):
+                return []
+            with open(self.path, 'rb') as f:
+                data = f.read(end - base)
+        records = []
+        for line in data.splitlines(keepends=True):
+            record = self._decode(line)
+            if record is None:
+                break
+            records.append(record)
+        return records
+    
+    # Number of records appended since load, including ones already trimmed
+    @property
+    def total_records(self):
+        return self._dropped_records + self.records
+    
+    # Return the current end of the journal, for a snapshot to cover. Positions are
+    # logical, so they stay valid across trims by any process.
+    def mark(self):
+        with self._lock:
+            return self._read_generation()[2], self.total_records
+    
+    # Current file start; a trim by any process moves it forward
+    def base(self):
+        with self._lock:
+            return self._read_generation()[1]
+    
+    # Drop the records a snapshot now covers, with the file lock held, keeping anything
+    # appended after the mark. The dropped records become the previous segment.
+    def trim(self, offset):
+        with self._lock:
+            _, base, end = self._read_generation()
+            drop_bytes = offset - base
+            if drop_bytes <= 0 or not os.path.exists(self.path):
+                return
+            self._close_file()
+            with open(self.path, 'rb') as f:
+                dropped = f.read(drop_bytes)
+                remainder = f.read()
+            for path, data in ((self.prev_path, dropped), (self.path, remainder)):
+                temp_path = path + '.tmp'
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, path)
+            self._write_generation(base, offset, end)
+            kept = remainder.count(b'\n')
+            self._dropped_records += max(self.records - kept, 0)
+            self.records = kept
+    
+    # Close the append handle; it is reopened on the next append
+    def close(self):
+        with self._lock:
+            self._close_file()
+            if self._generation_file is not None:
+                self._generation_file.close()
+                self._generation_file = None
+    
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+if __name__ == "__main__":
+    pass
+    # print("BookingJournal module loaded successfully!")
@@ -0,0 +1,195 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import stat
+from config import BOOKINGS_DIR, BOOKINGS_FILE
+from utils.helpers import Helper, GzipJsonSerializer
+from utils.file_lock import FileLock
+
+PARTITION_SUFFIX = '.json'
+ARCHIVE_SUFFIX = '.json.gz'
+CATALOG_NAME = 'catalog.json'
+CANCELLATIONS_NAME = 'cancellations.jsonl'
+ARCHIVE_SERIALIZER = GzipJsonSerializer(level=9)
+
+# The day a booking's show takes place. Older bookings were always for a same-day show,
+# so the date they were made stands in when the field is missing.
+def show_date(booking):
+    return booking.get('show_date') or booking['timestamp'][:10]
+
+# Summary of an archived day kept in the catalog so history lookups know which
+# archives to open without reading them. The value lists are held as sets in memory.
+def summarize(bookings):
+    return {
+        'count': len(bookings),
+        'max_id': max((b['booking_id'] for b in bookings), default=0),
+        'users': {b.get('user_id') for b in bookings if b.get('user_id')},
+        'movies': {b['movie_key'] for b in bookings},
+        'references': {b['reference'] for b in bookings if b.get('reference')},
+        'sales': movie_sales(bookings)
+    }
+
+# Seats sold and revenue per movie, as {movie_key: [seats, revenue]}
+def movie_sales(bookings):
+    sales = {}
+    for b in bookings:
+        totals = sales.setdefault(b['movie_key'], [0, 0.0])
+        totals[0] += len(b['seats'])
+        totals[1] += b['total']
+    return sales
+
+SUMMARY_SETS = ('users', 'movies', 'references')
+
+# BookingPartitions stores bookings as one file per show date in a directory.
+# Active days are plain JSON ("2025-12-01.json") and are rewritten as bookings come in.
+# Past days are archived once as read-only gzip files ("2025-12-01.json.gz") and listed
+# in catalog.json. Cancelled bookings, with their refunds, are kept for good in the
+# append-only cancellations.jsonl.
+class BookingPartitions:
+    
+    # Point at the partition directory, splitting the old single bookings file once
+    def __init__(self, partition_dir=BOOKINGS_DIR, legacy_file=BOOKINGS_FILE):
+        self.partition_dir = partition_dir
+        self.legacy_file = legacy_file
+        self.catalog_file = os.path.join(partition_dir, CATALOG_NAME)
+        self.cancellations_file = os.path.join(partition_dir, CANCELLATIONS_NAME)
+        self._migrate_legacy_file()
+    
+    # Split bookings.json into per-day partitions the first time the directory is used
+    def _migrate_legacy_file(self):
+        if os.path.isdir(self.partition_dir):
+            return
+        
+        parent_dir = os.path.dirname(os.path.abspath(self.partition_dir))
+        os.makedirs(parent_dir, exist_ok=True)
+        with FileLock(self.partition_dir + '.lock'):
+            # Another process may have finished the migration while we waited for the lock
+            if os.path.isdir(self.partition_dir):
+                return
+            
+            by_date = {}
+            for booking in Helper.load_json(self.legacy_file, []):
+                by_date.setdefault(show_date(booking), []).append(booking)
+            
+            # Write into a scratch directory and rename it so a crash never leaves half a migration
+            staging_dir = self.partition_dir + '.migrating'
+            os.makedirs(staging_dir, exist_ok=True)
+            for date, bookings in by_date.items():
+                Helper.save_json(os.path.join(staging_dir, date + PARTITION_SUFFIX), bookings)
+            os.rename(staging_dir, self.partition_dir)
+    
+    # Path of a day's plain or archived partition file
+    def path(self, date, archived=False):
+        return os.path.join(self.partition_dir, date + (ARCHIVE_SUFFIX if archived else PARTITION_SUFFIX))
+    
+    # List the days on disk as (active dates, archived dates), both sorted
+    def dates(self):
+        active, archived = set(), set()
+        for name in os.listdir(self.partition_dir):
+            if name.endswith(ARCHIVE_SUFFIX):
+                archived.add(name[:-len(ARCHIVE_SUFFIX)])
+            elif name.endswith(PARTITION_SUFFIX) and name != CATALOG_NAME and not name.startswith('.'):
+                active.add(name[:-len(PARTITION_SUFFIX)])
+        # A plain file next to an archive means archiving was interrupted; the plain file wins
+        return sorted(active), sorted(archived - active)
+    
+    # Size and modification time of each active partition, used to check the seat index is current
+    def stamps(self, dates):
+        result = {}
+        for date in dates:
+            try:
+                st = os.stat(self.path(date))
+            except FileNotFoundError:
+                continue
+            result[date] = [st.st_size, st.st_mtime_ns]
+        return result
+    
+    # Read one day's bookings, preferring the archive and falling back to the plain file
+    def read(self, date):
+        bookings = Helper.load_json(self.path(date, archived=True), [])
+        return bookings or Helper.load_json(self.path(date), [])
+    
+    # Replace an active day's bookings
+    def write(self, date, bookings):
+        Helper.save_json(self.path(date), bookings)
+    
+    # Remove an active day's file once it has no bookings left
+    def remove(self, date):
+        try:
+            os.remove(self.path(date))
+        except FileNotFoundError:
+            pass
+    
+    # Compress a finished day into its read-only archive, then drop the plain file
+    def archive(self, date, bookings):
+        archive_path = self.path(date, archived=True)
+        if os.path.exists(archive_path):
+            os.chmod(archive_path, stat.S_IRUSR | stat.S_IWUSR)
+        Helper.save_json(archive_path, bookings, serializer=ARCHIVE_SERIALIZER)
+        os.chmod(archive_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        try:
+            os.remove(self.path(date))
+        except FileNotFoundError:
+            pass
+    
+    # Load the catalog of archived days, adding entries for any archive it doesn't list yet
+    def load_catalog(self):
+        catalog = Helper.load_json(self.catalog_file, {})
+        for entry in catalog.values():
+            for name in SUMMARY_SETS:
+                entry[name] = set(entry[name])
+        _, archived = self.dates()
+        # Days archived before sales were recorded are summarized again, once
+        missing = [date for date in archived if 'sales' not in catalog.get(date, {})]
+        for date in missing:
+            catalog[date] = summarize(self.read(date))
+        for date in set(catalog) - set(archived):
+            del catalog[date]
+        if missing:
+            self.save_catalog(catalog)
+        return catalog
+    
+    # Write the catalog of archived days
+    def save_catalog(self, catalog):
+        Helper.save_json(self.catalog_file, {
+            day: {name: sorted(value) if name in SUMMARY_SETS else value for name, value in entry.items()}
+            for day, entry in catalog.items()
+        })
+    
+    # Append cancellation records to the cancellations log and make them durable
+    def record_cancellations(self, records):
+        if not records:
+            return
+        with open(self.cancellations_file, 'ab+') as f:
+            # Start on a new line if a crash left the last one unfinished
+            f.seek(0, os.SEEK_END)
+            lead = b''
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                lead = b'' if f.read(1) == b'\n' else b'\n'
+            f.write(lead + b''.join(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+                                    for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+    
+    # Read the cancellations log in the order the cancellations were made. A line torn by
+    # a crash is skipped, and a record written again after an interrupted compaction counts once.
+    def read_cancellations(self):
+        records = {}
+        try:
+            with open(self.cancellations_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    records.setdefault(record['booking_id'], record)
+        except FileNotFoundError:
+            pass
+        return list(records.values())
+
+if __name__ == "__main__":
+    pass
+    # print("BookingPartitions module loaded successfully!")
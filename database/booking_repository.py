@@ -2,89 +2,811 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from datetime import datetime
-from config import BOOKINGS_FILE
+from bisect import bisect_left, insort
+from datetime import datetime, date, timedelta
+from config import (BOOKINGS_FILE, BOOKINGS_DIR, BOOKINGS_JOURNAL_FILE, BOOKINGS_INDEX_FILE,
+                    BOOKING_WRITE_POLICY, BOOKING_COMPACT_EVERY, BOOKING_ARCHIVE_AFTER_DAYS,
+                    ROWS, SEATS_PER_ROW)
 from utils.helpers import Helper
+from utils.write_behind import get_writer
+from .booking_journal import BookingJournal
+from .booking_partitions import BookingPartitions, show_date, summarize
+from .id_allocator import IdAllocator
+from .seat_holds import SeatHolds
+from .seat_inventory import SeatInventory, seats_mask
+from .shared_seats import LocalSeatMap
 
+# Bump when the layout of the bookings.index snapshot changes
+INDEX_VERSION = 4
+
+# Catalog entry that lists the values of each indexed booking field
+CATALOG_FIELDS = {'user_id': 'users', 'movie_key': 'movies', 'reference': 'references'}
+
+# Raised when a booking asks for a seat that is already sold for that showtime
+class SeatUnavailableError(Exception):
+    pass
+
+# Raised when a batch of bookings can't be made; failures maps the index of each
+# booking that failed to the reason, and none of the batch was saved
+class BatchBookingError(Exception):
+    
+    # Keep the per-booking reasons alongside a summary message
+    def __init__(self, failures):
+        super().__init__(f"{len(failures)} booking(s) in the batch failed")
+        self.failures = failures
+
+# Journal record for a cancelled booking. It carries the showtime, seats and total so
+# another process can give the seats back without having the booking's record loaded,
+# and is kept for good as the record of the cancellation and its refund.
+def cancel_record(booking):
+    return {'op': 'cancel', 'booking_id': booking['booking_id'], 'reference': booking.get('reference'),
+            'user_id': booking.get('user_id'),
+            'refund': booking['refund'], 'cancelled_at': booking['cancelled_at'],
+            'movie_key': booking['movie_key'], 'time': booking['time'], 'show_date': show_date(booking),
+            'seats': booking['seats'], 'total': booking['total']}
+
+# Show dates before this one are archived and no longer held in memory
+def archive_cutoff():
+    return (date.today() - timedelta(days=BOOKING_ARCHIVE_AFTER_DAYS)).isoformat()
+
+# BookingRepository keeps the bookings for current and upcoming shows in memory, one
+# partition file per day, with new changes appended to a journal that is folded into
+# the partitions every so often. Finished days go to compressed archives. Indexes by
+# user, reference, movie and show date and the per-showtime seat inventory move with
+# every booking added or cancelled. Processes sharing the files make each change under
+# change_lock and catch up from the journal (see refresh) instead of reloading.
 class BookingRepository:
     
     # Create a new booking repository and load existing bookings
-    def __init__(self):
-        self.bookings = []
-        self.taken_seats_cache = {}
+    def __init__(self, partition_dir=BOOKINGS_DIR, journal_file=BOOKINGS_JOURNAL_FILE,
+                 index_file=BOOKINGS_INDEX_FILE, legacy_file=BOOKINGS_FILE, seat_map=None):
+        self.partitions = BookingPartitions(partition_dir, legacy_file)
+        self.index_file = index_file
+        self.journal = BookingJournal(journal_file, sync=BOOKING_WRITE_POLICY == 'sync')
+        self._init_state(seat_map, self.journal.lock, IdAllocator(journal_file + '.ids'), journal_file)
         self.load()
     
-    # Load bookings from disk and rebuild the taken seats cache
+    # Set up what every booking store has whatever keeps its data: the seat map and holds,
+    # the indexes and counters, the lock changes are made under and where IDs come from.
+    # A shared seat map is claimed for store, the path the bookings are kept at.
+    # Subclasses that store bookings elsewhere call this instead of __init__, and override
+    # the methods that use the partitions and journal: loading, catching up, persisting,
+    # reading archived days, compacting and closing.
+    def _init_state(self, seat_map, change_lock, ids, store=None):
+        self.seat_map = seat_map if seat_map is not None else LocalSeatMap()
+        if store:
+            self.seat_map.claim(store)
+        self.holds = SeatHolds(self.seat_map)
+        self.seat_listeners = []
+        self.bookings = {}
+        self.seat_inventory = {}
+        self.writer = get_writer()
+        self.change_lock = change_lock
+        self.ids = ids
+        self._compacted_through = 0
+    
+    # Load bookings from storage, then archive days that finished while we were stopped
     def load(self):
-        self.bookings = Helper.load_json(BOOKINGS_FILE, [])
-        self._rebuild_taken_seats_cache()
+        with self.change_lock:
+            self._read_store()
+        if any(day < self._cutoff for day, _, _ in self.seat_inventory):
+            self.compact(durable=True)
+    
+    # Read bookings from the index snapshot if it is still valid, otherwise read every
+    # resident record and rebuild all indexes. Called with change_lock held.
+    def _read_store(self):
+        self._records_loaded = False
+        self._unloaded_tail = {}
+        self._unloaded_cancels = set()
+        self._forget_catalog()
+        self._cutoff = archive_cutoff()
+        if not self._load_from_index():
+            self.bookings = self._load_bookings()
+            self._records_loaded = True
+            self._high_id = self._high_water()
+            self._rebuild_indexes()
+        # The counter may be new, or older than the bookings stored
+        self.ids.seed(self._high_id)
+        self.seat_map.reconcile(self.seat_inventory, reuse_before=self._cutoff)
+    
+    # Catch up with bookings other processes have made or cancelled since we last looked.
+    # When nothing has changed this costs one read of the journal's generation.
+    def refresh(self):
+        if self._changed():
+            with self.change_lock:
+                self._apply_changes()
+    
+    # Whether the journal has records this repository hasn't read
+    def _changed(self):
+        return self.journal.changed()
+    
+    # Journal records written by others since we last read, or None if they were trimmed
+    # away before we got to them
+    def _read_changes(self):
+        return self.journal.read_new()
+    
+    # Apply the changes other processes have made, with change_lock held. Falls back to
+    # reading the store again only if the records needed have already been trimmed.
+    def _apply_changes(self):
+        records = self._read_changes()
+        if records is None:
+            if not self.seat_map.shared:
+                self.seat_map.clear()
+            self._read_store()
+            return
+        for record in records:
+            self._apply_change(record)
+    
+    # Apply one change made by another process to the indexes, inventory and counters.
+    # A shared seat map already has it; a map kept in this process is updated here.
+    def _apply_change(self, record):
+        if record.get('op') in ('add', 'add_batch'):
+            for booking in record.get('bookings') or [record['booking']]:
+                booking_id = booking['booking_id']
+                self._high_id = max(self._high_id, booking_id)
+                if (show_date(booking) < self._cutoff or booking_id in self.bookings
+                        or booking_id in self._unloaded_tail):
+                    continue
+                if not self.seat_map.shared:
+                    key = self.show_key(booking['movie_key'], booking['time'], show_date(booking))
+                    self.seat_map.merge({key: SeatInventory(seats_mask(booking['seats']))})
+                self._remember(booking)
+        elif record.get('op') == 'cancel':
+            key = self.show_key(record['movie_key'], record['time'], record['show_date'])
+            if key[0] < self._cutoff:
+                return
+            booking = self.bookings.pop(record['booking_id'], None)
+            if booking is not None:
+                self._unindex_booking(booking)
+            elif self._unloaded_tail.pop(record['booking_id'], None) is None:
+                if self._records_loaded:
+                    return
+                # Still in a partition we haven't parsed; drop it when we do
+                self._unloaded_cancels.add(record['booking_id'])
+            if not self.seat_map.shared:
+                self.seat_map.release(key, record['seats'])
+            self._release_seats(key, record)
+            self._seats_released(key, record['seats'], record['booking_id'])
+        elif record.get('op') == 'archived':
+            self._forget_catalog()
+    
+    # Read the active partitions and replay the journal on top of them, returning the
+    # bookings keyed by ID
+    def _load_bookings(self):
+        active, archived = self.partitions.dates()
+        bookings = self._read_partitions(active)
+        archived = set(archived)
+        for record in self.journal.replay():
+            self._apply_record(bookings, record, archived)
+        self._compacted_through = 0
+        return bookings
+    
+    # Read active partitions into a dictionary of bookings keyed by ID
+    def _read_partitions(self, days):
+        bookings = {}
+        for day in days:
+            for booking in self.partitions.read(day):
+                bookings[booking['booking_id']] = booking
+        return bookings
+    
+    # Apply one journal record to the bookings (keyed by ID) during replay
+    def _apply_record(self, bookings, record, archived):
+        if record.get('op') in ('add', 'add_batch'):
+            for booking in record.get('bookings') or [record['booking']]:
+                # The partitions may already hold it if we crashed between compaction and trimming,
+                # and an archived day already has every booking made for it
+                if booking['booking_id'] not in bookings and show_date(booking) not in archived:
+                    bookings[booking['booking_id']] = booking
+        elif record.get('op') == 'cancel':
+            # Replayed in order, so a booking re-added above is taken out again here
+            bookings.pop(record['booking_id'], None)
+    
+    # Highest booking ID used so far, including archived days
+    def _high_water(self):
+        archived_ids = [entry['max_id'] for entry in self._get_catalog().values()]
+        return max(list(self.bookings) + archived_ids, default=0)
     
-    # Save the current list of bookings back to disk
+    # Restore the seat inventory from the index snapshot and replay only the journal
+    # records written after the position it covers. Returns False if the snapshot is
+    # missing, from another version or layout, or doesn't match the active partitions on disk.
+    def _load_from_index(self):
+        index = Helper.load_json(self.index_file, {})
+        active, archived = self.partitions.dates()
+        if (index.get('version') != INDEX_VERSION or index.get('layout') != [ROWS, SEATS_PER_ROW]
+                or index.get('partitions') != self.partitions.stamps(active)):
+            return False
+        
+        # Records before the snapshot's offset are still there if we crashed before trimming
+        records = self.journal.replay(start=index['offset'])
+        # A cancellation may be for a booking inside the snapshot, and whether the snapshot
+        # already left it out can only be told from the records, so read them all instead
+        if any(record.get('op') == 'cancel' for record in records):
+            return False
+        
+        self.seat_inventory = {(day, movie_key, showtime): SeatInventory(bits, revenue)
+                               for day, movie_key, showtime, bits, revenue in index['inventory']}
+        self._count_movie_sales()
+        archived = set(archived)
+        tail = {}
+        for record in records:
+            self._apply_record(tail, record, archived)
+        self._compacted_through = 0
+        
+        for booking in tail.values():
+            self._take_seats(booking)
+        self._unloaded_tail = tail
+        self._high_id = max([index['high_water']] + list(tail))
+        return True
+    
+    # Make sure the resident booking records are parsed and up to date. They are parsed
+    # the first time they are needed, under change_lock once we have caught up, so the
+    # partitions on disk hold nothing newer than what we have applied.
+    def _ensure_loaded(self):
+        if self._records_loaded:
+            # Catching up may have meant reading the store again, leaving records to parse
+            self.refresh()
+        if self._records_loaded:
+            return
+        with self.change_lock:
+            self._apply_changes()
+            if self._records_loaded:
+                return
+            active, _ = self.partitions.dates()
+            self.bookings = self._read_partitions(active)
+            self.bookings.update(self._unloaded_tail)
+            for booking_id in self._unloaded_cancels:
+                self.bookings.pop(booking_id, None)
+            self._unloaded_tail = {}
+            self._unloaded_cancels = set()
+            self._records_loaded = True
+            self._rebuild_record_indexes()
+    
+    # Catalog of archived days, read on first use
+    def _get_catalog(self):
+        if self._catalog is None:
+            self._catalog = self.partitions.load_catalog()
+        return self._catalog
+    
+    # Write a full snapshot now and clear the journal it covers
     def save(self):
-        Helper.save_json(BOOKINGS_FILE, self.bookings)
-    
-    # Rebuild the in-memory map of taken seats for each movie and showtime
-    def _rebuild_taken_seats_cache(self):
-        self.taken_seats_cache = {}
-        for booking in self.bookings:
-            movie_key = booking['movie_key']
-            showtime = booking['time']
-            seats = [tuple(s) for s in booking['seats']]
-            
-            if movie_key not in self.taken_seats_cache:
-                self.taken_seats_cache[movie_key] = {}
-            if showtime not in self.taken_seats_cache[movie_key]:
-                self.taken_seats_cache[movie_key][showtime] = []
+        self.compact(durable=True)
+    
+    # Fold the journal into the partition files and archive days that are over. The files
+    # and the seat index are written by the write-behind writer, then the journal records
+    # they cover are trimmed. The snapshot is taken once we have caught up with every
+    # process, so it covers the whole journal up to its mark.
+    def compact(self, durable=False):
+        self._ensure_loaded()
+        with self.change_lock:
+            self._apply_changes()
+            offset, count = self.journal.mark()
+            self._compacted_through = count
             
-            self.taken_seats_cache[movie_key][showtime].extend(seats)
+            self._cutoff = archive_cutoff()
+            archive = {day: list(bookings.values()) for day, bookings in self._by_date.items() if day < self._cutoff}
+            catalog = None
+            if archive:
+                catalog = self._get_catalog()
+                for day, bookings in archive.items():
+                    catalog[day] = summarize(bookings)
+                catalog = dict(catalog)
+                self._archived_sales = None
+                self._archived_references = None
+            self._drop_archived()
+            # Nobody is between reserving seats and saving a booking now, so clear any
+            # seats a crashed process reserved without saving
+            self.seat_map.reconcile(self.seat_inventory, reuse_before=self._cutoff)
+            snapshot = {
+                'offset': offset,
+                'partitions': {day: list(bookings.values()) for day, bookings in self._by_date.items()},
+                'archive': archive,
+                'catalog': catalog,
+                'inventory': [[day, movie_key, showtime, inv.bits, inv.revenue]
+                              for (day, movie_key, showtime), inv in self.seat_inventory.items()],
+                'high_water': self._high_id
+            }
+        self.writer.submit(self.partitions.partition_dir, snapshot, durable=durable,
+                           write=self._write_snapshot, combine=self._combine_snapshots)
     
-    # Add a new booking and update the cache, returning its ID
-    def add(self, booking_data):
-        booking_data['booking_id'] = len(self.bookings) + 1
-        booking_data['timestamp'] = datetime.now().isoformat()
-        
-        self.bookings.append(booking_data)
-        self.save()
+    # Forget bookings and seat inventories for days before the archive cutoff
+    def _drop_archived(self):
+        self.bookings = {booking_id: b for booking_id, b in self.bookings.items() if show_date(b) >= self._cutoff}
+        self.seat_inventory = {key: inv for key, inv in self.seat_inventory.items() if key[0] >= self._cutoff}
+        self._count_movie_sales()
+        self._rebuild_record_indexes()
+    
+    # Merge two snapshots waiting to be written: the newer one wins, but days archived
+    # by the older one still have to reach disk
+    @staticmethod
+    def _combine_snapshots(old, new):
+        new['archive'] = {**old['archive'], **new['archive']}
+        if new['catalog'] is None:
+            new['catalog'] = old['catalog']
+        return new
+    
+    # Writer callback: archive finished days, save the active partitions atomically, record
+    # the seat index that matches them, then trim the journal up to its mark. Skipped if
+    # another process has already written a snapshot covering more of the journal.
+    def _write_snapshot(self, key, data):
+        with self.change_lock:
+            if self.journal.base() > data['offset']:
+                return
+            for day, bookings in data['archive'].items():
+                self.partitions.archive(day, bookings)
+            if data['catalog'] is not None:
+                self.partitions.save_catalog(data['catalog'])
+            for day, bookings in data['partitions'].items():
+                self.partitions.write(day, bookings)
+            # A day whose last booking was cancelled has nothing left to keep
+            active, _ = self.partitions.dates()
+            for day in set(active) - set(data['partitions']):
+                self.partitions.remove(day)
+            # The partitions no longer hold cancelled bookings, so keep the cancellations
+            # the trim drops in the cancellations log
+            self.partitions.record_cancellations([record for record in self.journal.read_until(data['offset'])
+                                                  if record.get('op') == 'cancel'])
+            Helper.save_json(self.index_file, {
+                'version': INDEX_VERSION,
+                'layout': [ROWS, SEATS_PER_ROW],
+                'partitions': self.partitions.stamps(data['partitions']),
+                'offset': data['offset'],
+                'high_water': data['high_water'],
+                'inventory': data['inventory']
+            })
+            self.journal.trim(data['offset'])
+    
+    # Compact once enough journal records have built up since the last compaction
+    def _maybe_compact(self):
+        if self.journal.total_records - self._compacted_through >= BOOKING_COMPACT_EVERY:
+            self.compact()
+    
+    # Make one new booking durable before it becomes visible
+    def _persist_add(self, booking):
+        self.journal.append({'op': 'add', 'booking': booking})
+    
+    # Make a batch of bookings durable together; one journal record means a crash keeps
+    # all of them or none
+    def _persist_batch(self, bookings):
+        self.journal.append({'op': 'add_batch', 'bookings': bookings})
+    
+    # Make a cancellation durable before the booking disappears
+    def _persist_cancel(self, booking):
+        self.journal.append(cancel_record(booking))
+    
+    # Release file handles held by the repository
+    def close(self):
+        self.journal.close()
+        self.seat_map.close()
+    
+    # Rebuild the lookup indexes and seat inventory from the resident booking list
+    def _rebuild_indexes(self):
+        self.seat_inventory = {}
+        self._movie_sales = {}
+        for booking in self.bookings.values():
+            self._take_seats(booking)
+        self._rebuild_record_indexes()
+    
+    # Rebuild the user, reference, movie and show date indexes
+    def _rebuild_record_indexes(self):
+        self._by_user = {}
+        self._by_reference = {}
+        self._by_movie = {}
+        self._by_date = {}
+        self._dates = []
+        for booking in self.bookings.values():
+            self._index_booking(booking)
+    
+    # Add one booking to every record index
+    def _index_booking(self, booking):
+        booking_id = booking['booking_id']
+        self._by_user.setdefault(booking.get('user_id'), {})[booking_id] = booking
+        self._by_movie.setdefault(booking['movie_key'], {})[booking_id] = booking
+        day = show_date(booking)
+        if day not in self._by_date:
+            self._by_date[day] = {}
+            insort(self._dates, day)
+        self._by_date[day][booking_id] = booking
+        if booking.get('reference'):
+            self._by_reference[booking['reference']] = booking
+    
+    # Take one booking out of every record index, dropping entries left empty
+    def _unindex_booking(self, booking):
+        booking_id = booking['booking_id']
+        for index, value in ((self._by_user, booking.get('user_id')),
+                             (self._by_movie, booking['movie_key']),
+                             (self._by_date, show_date(booking))):
+            entries = index[value]
+            del entries[booking_id]
+            if not entries:
+                del index[value]
+                if index is self._by_date:
+                    del self._dates[bisect_left(self._dates, value)]
+        if self._by_reference.get(booking.get('reference')) is booking:
+            del self._by_reference[booking['reference']]
+    
+    # Mark a booking's seats as taken in the inventory and add it to the movie's sales.
+    # Seats count once however many bookings claim them, as the inventory does.
+    def _take_seats(self, booking):
+        inventory = self.get_seat_inventory(booking['movie_key'], booking['time'], show_date(booking))
+        sold = inventory.taken_count()
+        inventory.take(booking['seats'], booking['total'])
+        sales = self._movie_sales.setdefault(booking['movie_key'], [0, 0.0])
+        sales[0] += inventory.taken_count() - sold
+        sales[1] += booking['total']
+    
+    # Free a booking's seats in the inventory and take it off the movie's sales
+    def _release_seats(self, key, booking):
+        inventory = self.seat_inventory[key]
+        sold = inventory.taken_count()
+        inventory.release(booking['seats'], booking['total'])
+        sales = self._movie_sales[booking['movie_key']]
+        sales[0] -= sold - inventory.taken_count()
+        sales[1] -= booking['total']
+    
+    # Total the per-movie sales from the seat inventories
+    def _count_movie_sales(self):
+        self._movie_sales = {}
+        for (_, movie_key, _), inventory in self.seat_inventory.items():
+            sales = self._movie_sales.setdefault(movie_key, [0, 0.0])
+            sales[0] += inventory.taken_count()
+            sales[1] += inventory.revenue
+    
+    # Key of a showtime in the seat inventory and seat map; the show is today unless a date is given
+    @staticmethod
+    def show_key(movie_key, showtime, show_date=None):
+        return (show_date or date.today().isoformat(), movie_key, showtime)
+    
+    # Hold seats for a booking in progress. Returns (token, expires_at), or None if any
+    # seat is sold or held by someone else.
+    def hold_seats(self, movie_key, showtime, seats, show_date=None):
+        self.refresh()
+        return self.holds.place(self.show_key(movie_key, showtime, show_date), seats, reuse_before=self._cutoff)
+    
+    # Let go of a hold early, e.g. because the user cancelled or went back
+    def release_hold(self, movie_key, showtime, seats, token, show_date=None):
+        self.holds.release(self.show_key(movie_key, showtime, show_date), seats, token)
+    
+    # Add a new booking and update the indexes, returning its ID. The show is today unless
+    # the booking says otherwise, and a booking without a reference is given one. Seats
+    # held under hold_token count as free for this booking. Raises SeatUnavailableError if
+    # any seat is already taken or held by someone else.
+    def add(self, booking_data, hold_token=0):
+        booking_data.setdefault('show_date', date.today().isoformat())
+        if booking_data['show_date'] < self._cutoff:
+            raise ValueError(f"Bookings for {booking_data['show_date']} are archived and can't be changed")
+        key = self.show_key(booking_data['movie_key'], booking_data['time'], booking_data['show_date'])
+        self.holds.expire_due()
+        with self.change_lock:
+            # Catch up first, so the seats reflect every process
+            self._apply_changes()
+            if not self.seat_map.reserve(key, booking_data['seats'], hold_token, reuse_before=self._cutoff):
+                raise SeatUnavailableError(f"Seats already booked for {booking_data['movie_key']} at {booking_data['time']}")
+            self.holds.consume(hold_token)
+            booking_data['booking_id'] = self.ids.next_id()
+            if not booking_data.get('reference'):
+                booking_data['reference'] = Helper.generate_reference(booking_data['booking_id'])
+            booking_data['timestamp'] = datetime.now().isoformat()
+            
+            try:
+                self._persist_add(booking_data)
+            except Exception:
+                self.seat_map.release(key, booking_data['seats'])
+                raise
+            self._remember(booking_data)
+        self._maybe_compact()
         
-        movie_key = booking_data['movie_key']
-        showtime = booking_data['time']
-        seats = [tuple(s) for s in booking_data['seats']]
+        return booking_data['booking_id']
+    
+    # Add a batch of bookings as one unit, returning their IDs in order. All seats are
+    # checked and reserved in one pass and the batch is saved with a single write; bookings
+    # without a reference are given one. If any booking can't be made, BatchBookingError
+    # lists why and nothing is kept.
+    def add_many(self, bookings):
+        failures = {}
+        requests = []
+        today = date.today().isoformat()
+        for i, booking_data in enumerate(bookings):
+            day = booking_data.get('show_date') or today
+            if day < self._cutoff:
+                failures[i] = f"Bookings for {day} are archived and can't be changed"
+            requests.append((self.show_key(booking_data['movie_key'], booking_data['time'], day),
+                             booking_data['seats']))
+        if failures:
+            raise BatchBookingError(failures)
         
-        if movie_key not in self.taken_seats_cache:
-            self.taken_seats_cache[movie_key] = {}
-        if showtime not in self.taken_seats_cache[movie_key]:
-            self.taken_seats_cache[movie_key][showtime] = []
+        self.holds.expire_due()
+        with self.change_lock:
+            self._apply_changes()
+            failed = self.seat_map.reserve_many(requests, reuse_before=self._cutoff)
+            if failed:
+                raise BatchBookingError({i: f"Seats already booked for {bookings[i]['movie_key']} at {bookings[i]['time']}"
+                                         for i in failed})
+            
+            timestamp = datetime.now().isoformat()
+            for i, booking_id in enumerate(self.ids.next_ids(len(bookings))):
+                booking_data = bookings[i]
+                booking_data['show_date'] = requests[i][0][0]
+                booking_data['booking_id'] = booking_id
+                if not booking_data.get('reference'):
+                    booking_data['reference'] = Helper.generate_reference(booking_id)
+                # Imported bookings keep the time they were originally made
+                booking_data.setdefault('timestamp', timestamp)
+            try:
+                self._persist_batch(bookings)
+            except Exception:
+                for key, seats in requests:
+                    self.seat_map.release(key, seats)
+                raise
+            for booking_data in bookings:
+                self._remember(booking_data)
+        self._maybe_compact()
         
-        self.taken_seats_cache[movie_key][showtime].extend(seats)
+        return [booking_data['booking_id'] for booking_data in bookings]
+    
+    # Add bookings for shows before the archive cutoff, e.g. history brought over from
+    # another system, straight into the archived days, returning their IDs in order. IDs,
+    # references and timestamps are given as by add_many. If any booking isn't for an
+    # archived day, or wants a seat already sold for its show (in the archive or earlier
+    # in the list), BatchBookingError lists why and nothing is kept.
+    def import_archived(self, bookings):
+        # Archive any day still resident first, so the archives hold every booking made
+        if any(day < archive_cutoff() for day, _, _ in self.seat_inventory):
+            self.compact(durable=True)
+        # A snapshot still waiting to be written would put back an older catalog
+        self.writer.flush()
+        with self.change_lock:
+            self._apply_changes()
+            failures = {}
+            taken = {}
+            by_day = {}
+            for i, booking_data in enumerate(bookings):
+                day = booking_data.get('show_date') or date.today().isoformat()
+                if day >= self._cutoff:
+                    failures[i] = f"Bookings for {day} aren't archived yet; add them as new bookings"
+                    continue
+                if day not in by_day:
+                    by_day[day] = []
+                    for booking in self._read_archived(day):
+                        key = self.show_key(booking['movie_key'], booking['time'], day)
+                        taken[key] = taken.get(key, 0) | seats_mask(booking['seats'])
+                key = self.show_key(booking_data['movie_key'], booking_data['time'], day)
+                mask = seats_mask(booking_data['seats'])
+                if taken.get(key, 0) & mask:
+                    failures[i] = f"Seats already booked for {booking_data['movie_key']} at {booking_data['time']} on {day}"
+                taken[key] = taken.get(key, 0) | mask
+                by_day[day].append(booking_data)
+            if failures:
+                raise BatchBookingError(failures)
+            
+            timestamp = datetime.now().isoformat()
+            for booking_data, booking_id in zip(bookings, self.ids.next_ids(len(bookings))):
+                booking_data['booking_id'] = booking_id
+                if not booking_data.get('reference'):
+                    booking_data['reference'] = Helper.generate_reference(booking_id)
+                booking_data.setdefault('timestamp', timestamp)
+                self._high_id = max(self._high_id, booking_id)
+            self._persist_archived(by_day)
+            self._forget_catalog()
+        return [booking_data['booking_id'] for booking_data in bookings]
+    
+    # Add imported bookings to the archives of their days and the catalog, then tell other
+    # processes to read the catalog again
+    def _persist_archived(self, by_day):
+        catalog = self.partitions.load_catalog()
+        for day, bookings in by_day.items():
+            bookings = self._read_archived(day) + bookings
+            self.partitions.archive(day, bookings)
+            catalog[day] = summarize(bookings)
+        self.partitions.save_catalog(catalog)
+        self.journal.append({'op': 'archived', 'days': sorted(by_day)})
+    
+    # Drop what was worked out from the catalog, so it is read again when next needed
+    def _forget_catalog(self):
+        self._catalog = None
+        self._archived_sales = None
+        self._archived_references = None
+    
+    # Take a newly saved booking's seats and add it to the indexes, or to the unloaded
+    # tail if the records haven't been read yet
+    def _remember(self, booking_data):
+        self._high_id = max(self._high_id, booking_data['booking_id'])
+        self._take_seats(booking_data)
+        if self._records_loaded:
+            self.bookings[booking_data['booking_id']] = booking_data
+            self._index_booking(booking_data)
+        else:
+            self._unloaded_tail[booking_data['booking_id']] = booking_data
+    
+    # Cancel a booking for a current or upcoming show by its reference and give back its
+    # seats, recording the amount refunded. Returns the cancelled booking, or None if no
+    # booking has that reference. Raises ValueError for bookings on archived days.
+    def cancel(self, reference, refund=0.0):
+        self._ensure_loaded()
+        with self.change_lock:
+            self._apply_changes()
+            booking = self._by_reference.get(reference)
+            if booking is not None:
+                cancelled = dict(booking, refund=refund, cancelled_at=datetime.now().isoformat())
+                self._persist_cancel(cancelled)
+                key = self.show_key(booking['movie_key'], booking['time'], show_date(booking))
+                self.seat_map.release(key, booking['seats'])
+                self._release_seats(key, booking)
+                self._unindex_booking(booking)
+                del self.bookings[booking['booking_id']]
+        if booking is None:
+            if self._history_by('reference', reference):
+                raise ValueError(f"Booking {reference} is for a past show and can't be changed")
+            return None
+        self._maybe_compact()
+        self._seats_released(key, booking['seats'], booking['booking_id'])
         
-        return booking_data['booking_id']
+        return cancelled
+    
+    # Every cancellation made, with its refund, in the order they were made: those in the
+    # cancellations log, then those still only in the journal
+    def get_cancellations(self):
+        with self.change_lock:
+            cancellations = self.partitions.read_cancellations()
+            recent = [record for record in self.journal.read_until() if record.get('op') == 'cancel']
+        logged = {record['booking_id'] for record in cancellations}
+        return cancellations + [record for record in recent if record['booking_id'] not in logged]
+    
+    # Tell every seat listener that cancelling a booking freed seats for a showtime
+    def _seats_released(self, key, seats, booking_id):
+        for listener in self.seat_listeners:
+            listener(key, seats, booking_id)
+    
+    # Read one archived day, including one whose archive is still waiting to be written
+    def _read_archived(self, day):
+        pending = self.writer.get_pending(self.partitions.partition_dir)
+        if pending is not None and day in pending['archive']:
+            return pending['archive'][day]
+        return self.partitions.read(day)
+    
+    # Archived bookings whose field has the given value, opening only the days listed for it
+    def _history_by(self, field, value):
+        name = CATALOG_FIELDS[field]
+        catalog = self._get_catalog()
+        result = []
+        for day in sorted(catalog):
+            if value in catalog[day][name]:
+                result.extend(b for b in self._read_archived(day) if b.get(field) == value)
+        return result
+    
+    # Archived bookings for show dates between two dates (or date prefixes), both inclusive
+    def _history_between(self, start_date, end_date):
+        result = []
+        for day in sorted(self._get_catalog()):
+            if start_date <= day <= end_date + '\uffff':
+                result.extend(self._read_archived(day))
+        return result
+    
+    # Resident show dates between two dates (or date prefixes), both inclusive, in order,
+    # found by bisecting the sorted list of show dates
+    def _resident_dates(self, start_date, end_date):
+        return self._dates[bisect_left(self._dates, start_date):bisect_left(self._dates, end_date + '\uffff')]
+    
+    # Resident bookings for show dates between two dates (or date prefixes), both inclusive
+    def _resident_between(self, start_date, end_date):
+        result = []
+        for day in self._resident_dates(start_date, end_date):
+            result.extend(self._by_date[day].values())
+        return result
     
-    # Return all bookings for a specific user
+    # Return all bookings for a specific user, oldest shows first
     def get_by_user(self, user_id):
-        return [b for b in self.bookings if b.get('user_id') == user_id]
+        self._ensure_loaded()
+        return self._history_by('user_id', user_id) + list(self._by_user.get(user_id, {}).values())
     
-    # Find a single booking by its reference code
+    # Find a single booking by its reference code. Only the archived day holding it, if
+    # any, is opened.
     def get_by_reference(self, reference):
-        for booking in self.bookings:
-            if booking.get('reference') == reference:
-                return booking
-        return None
+        self._ensure_loaded()
+        booking = self._by_reference.get(reference)
+        if booking is None:
+            day = self._archived_reference_day(reference)
+            if day is not None:
+                booking = next((b for b in self._read_archived(day) if b.get('reference') == reference), None)
+        return booking
     
-    # Get a list of seats already taken for a movie and showtime
-    def get_taken_seats(self, movie_key, showtime):
-        return self.taken_seats_cache.get(movie_key, {}).get(showtime, [])
+    # Whether a current or archived booking has this reference, without reading any bookings
+    def reference_exists(self, reference):
+        self._ensure_loaded()
+        return reference in self._by_reference or self._archived_reference_day(reference) is not None
     
-    # Return all stored bookings
+    # Show date of the archived booking with a reference, or None. The catalog's reference
+    # lists are turned into one dictionary the first time it is needed.
+    def _archived_reference_day(self, reference):
+        if self._archived_references is None:
+            self._archived_references = {ref: day for day, entry in self._get_catalog().items()
+                                         for ref in entry['references']}
+        return self._archived_references.get(reference)
+    
+    # Return this process's seat inventory for a showtime (today's show unless a date is
+    # given), creating an empty one if needed
+    def get_seat_inventory(self, movie_key, showtime, show_date=None):
+        key = self.show_key(movie_key, showtime, show_date)
+        if key not in self.seat_inventory:
+            self.seat_inventory[key] = SeatInventory()
+        return self.seat_inventory[key]
+    
+    # Get a read-only snapshot of the seats taken and held for a movie and showtime,
+    # including other processes' when the seat map is shared. Seats held under
+    # hold_token are left out of the held mask.
+    def get_taken_seats(self, movie_key, showtime, show_date=None, hold_token=0):
+        self.refresh()
+        self.holds.expire_due()
+        return self.seat_map.snapshot(self.show_key(movie_key, showtime, show_date), hold_token)
+    
+    # Seats sold, seats left and revenue for one showtime (today's unless a date is given),
+    # as counted by this process
+    def showtime_stats(self, movie_key, showtime, show_date=None):
+        self.refresh()
+        inventory = self.seat_inventory.get(self.show_key(movie_key, showtime, show_date), SeatInventory())
+        return {'sold': inventory.taken_count(), 'remaining': inventory.free_count(), 'revenue': inventory.revenue}
+    
+    # Seats sold and revenue for a movie over every show date, archived days included
+    def movie_stats(self, movie_key):
+        self.refresh()
+        sold, revenue = self._movie_sales.get(movie_key, (0, 0.0))
+        archived_sold, archived_revenue = self._archived_movie_sales(movie_key)
+        return {'sold': sold + archived_sold, 'revenue': revenue + archived_revenue}
+    
+    # Seats sold and revenue for a movie on archived days, from the catalog totals
+    def _archived_movie_sales(self, movie_key):
+        if self._archived_sales is None:
+            totals = {}
+            for entry in self._get_catalog().values():
+                for key, (seats, revenue) in entry['sales'].items():
+                    sales = totals.setdefault(key, [0, 0.0])
+                    sales[0] += seats
+                    sales[1] += revenue
+            self._archived_sales = totals
+        return self._archived_sales.get(movie_key, (0, 0.0))
+    
+    # Return all stored bookings, archived days included
     def get_all(self):
-        return self.bookings
+        self._ensure_loaded()
+        return self._history_between('', '\uffff') + list(self.bookings.values())
+    
+    # Stream bookings for show dates between two dates (both inclusive), oldest shows
+    # first, optionally for one movie. Archived days are read one at a time, and only
+    # those the catalog lists for the movie.
+    def iter_bookings(self, start_date='', end_date='\uffff', movie_key=None):
+        self._ensure_loaded()
+        yield from self._iter_history(start_date, end_date, movie_key)
+        for day in self._resident_dates(start_date, end_date):
+            for booking in list(self._by_date.get(day, {}).values()):
+                if movie_key is None or booking['movie_key'] == movie_key:
+                    yield booking
+    
+    # Stream archived bookings for iter_bookings
+    def _iter_history(self, start_date, end_date, movie_key):
+        catalog = self._get_catalog()
+        for day in sorted(catalog):
+            if not start_date <= day <= end_date + '\uffff':
+                continue
+            if movie_key is not None and movie_key not in catalog[day]['movies']:
+                continue
+            for booking in self._read_archived(day):
+                if movie_key is None or booking['movie_key'] == movie_key:
+                    yield booking
     
     # Get bookings filtered by movie key
     def get_by_movie(self, movie_key):
-        return [b for b in self.bookings if b['movie_key'] == movie_key]
+        self._ensure_loaded()
+        return self._history_by('movie_key', movie_key) + list(self._by_movie.get(movie_key, {}).values())
     
-    # Get bookings created on a specific date
+    # Get bookings for shows on a specific date (any ISO prefix works, e.g. '2025-11' for a
+    # month). This is the show date, not the day the booking was made; older bookings
+    # without a show date were for a show the same day, so for them the two agree.
     def get_by_date(self, date_str):
-        return [b for b in self.bookings if b['timestamp'].startswith(date_str)]
+        return self.get_by_date_range(date_str, date_str)
+    
+    # Get bookings for shows between two dates, both inclusive, by show date as above
+    def get_by_date_range(self, start_date, end_date):
+        self._ensure_loaded()
+        return self._history_between(start_date, end_date) + self._resident_between(start_date, end_date)
 
 if __name__ == "__main__":
     print("BookingRepository module loaded successfully!")
@@ -0,0 +1,199 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import tempfile
+import traceback
+from datetime import date, timedelta
+from context.models import UserContext
+from utils.write_behind import get_writer
+from .backends import BACKENDS
+from .booking_repository import SeatUnavailableError, BatchBookingError
+from .db_manager import DatabaseManager
+
+# Shared checks that every storage backend must pass. Each check gets a new, empty
+# backend from StorageBackend.scratch and fails with an AssertionError (or whatever
+# the backend raised). Run them all with: python -m database.conformance [backend ...]
+
+# A show far enough ahead that it is never archived while the checks run
+SHOW_DATE = (date.today() + timedelta(days=30)).isoformat()
+
+# Fail the check with an AssertionError unless condition holds. Unlike assert, this
+# still runs under python -O.
+def check(condition):
+    if not condition:
+        raise AssertionError("conformance check failed")
+
+# A booking for the checks, on SHOW_DATE unless a date is given
+def make_booking(user_id, seats, movie_key='dune2', showtime='14:00', show_date=SHOW_DATE):
+    return {
+        'user_id': user_id,
+        'user_name': user_id.title(),
+        'movie_key': movie_key,
+        'movie_title': movie_key,
+        'time': showtime,
+        'show_date': show_date,
+        'tickets': len(seats),
+        'seats': [list(seat) for seat in seats],
+        'total': 12.5 * len(seats)
+    }
+
+# The catalogue starts with the defaults, can be edited and keeps the edits when reopened
+def check_catalog(backend):
+    movies = backend.movies()
+    check('dune2' in movies.get_all())
+    check(movies.get('dune2')['title'] == 'Dune: Part Two')
+    check(any(key == 'dune2' for key, _ in movies.search('villeneuve')))
+    
+    movie = dict(movies.get('dune2'), title='Conformance Test')
+    check(movies.add('conformance', movie))
+    check(movies.update('conformance', {'price': 9.0}))
+    check(not movies.update('missing', {'price': 9.0}))
+    check(movies.delete('joker2'))
+    check(not movies.delete('joker2'))
+    movies.save()
+    movies.close()
+    
+    movies = backend.movies()
+    check(movies.get('conformance')['price'] == 9.0)
+    check(movies.get('joker2') is None)
+    movies.close()
+
+# Bookings get unique IDs and references, can be found every way the bot looks them up,
+# never share a seat, and survive closing and reopening the store
+def check_bookings(backend):
+    repo = backend.bookings()
+    first = make_booking('alice', [('A', 1), ('A', 2)])
+    second = make_booking('bob', [('B', 5)])
+    ids = [repo.add(first), repo.add(second)]
+    check(ids[0] != ids[1])
+    check(first['reference'].startswith('BK') and first['reference'] != second['reference'])
+    check(repo.get_by_reference(first['reference'])['booking_id'] == ids[0])
+    check(repo.reference_exists(second['reference']))
+    check(not repo.reference_exists('BK0000000000'))
+    check([b['booking_id'] for b in repo.get_by_user('alice')] == [ids[0]])
+    
+    taken = repo.get_taken_seats('dune2', '14:00', SHOW_DATE)
+    check(taken.is_taken('A', 1) and not taken.is_taken('A', 3))
+    check(repo.showtime_stats('dune2', '14:00', SHOW_DATE)['sold'] == 3)
+    check(repo.movie_stats('dune2')['revenue'] == 37.5)
+    
+    try:
+        repo.add(make_booking('carol', [('A', 2)]))
+        raise AssertionError("a sold seat was sold again")
+    except SeatUnavailableError:
+        pass
+    
+    # A batch with one bad booking keeps none of them
+    batch = [make_booking('dave', [('C', 1)]), make_booking('dave', [('B', 5)])]
+    try:
+        repo.add_many(batch)
+        raise AssertionError("a batch with a sold seat was accepted")
+    except BatchBookingError as e:
+        check(list(e.failures) == [1])
+    check(not repo.get_by_user('dave'))
+    batch = [make_booking('dave', [('C', 1)]), make_booking('dave', [('C', 2)], showtime='17:30')]
+    check(len(set(repo.add_many(batch))) == 2)
+    
+    # A hold keeps the seats from everyone but its holder
+    token, _ = repo.hold_seats('dune2', '20:00', [['D', 1]], SHOW_DATE)
+    try:
+        repo.add(make_booking('erin', [('D', 1)], showtime='20:00'))
+        raise AssertionError("a held seat was sold to someone else")
+    except SeatUnavailableError:
+        pass
+    repo.add(make_booking('frank', [('D', 1)], showtime='20:00'), hold_token=token)
+    
+    cancelled = repo.cancel(second['reference'], refund=12.5)
+    check(cancelled['refund'] == 12.5)
+    check(repo.cancel(second['reference']) is None)
+    check(not repo.get_taken_seats('dune2', '14:00', SHOW_DATE).is_taken('B', 5))
+    check(repo.showtime_stats('dune2', '14:00', SHOW_DATE)['sold'] == 3)
+    check([c['reference'] for c in repo.get_cancellations()] == [second['reference']])
+    
+    check(len(list(repo.iter_bookings(SHOW_DATE, SHOW_DATE))) == 4)
+    check(len(list(repo.iter_bookings(movie_key='joker2'))) == 0)
+    repo.save()
+    repo.close()
+    
+    repo = backend.bookings()
+    check(len(repo.get_all()) == 4)
+    check(repo.get_by_reference(first['reference'])['seats'] == [['A', 1], ['A', 2]])
+    check(repo.get_by_reference(second['reference']) is None)
+    # The cancellation and its refund are kept after the booking is gone
+    check([(c['reference'], c['refund']) for c in repo.get_cancellations()] == [(second['reference'], 12.5)])
+    check(repo.get_taken_seats('dune2', '20:00', SHOW_DATE).is_taken('D', 1))
+    check(repo.add(make_booking('alice', [('E', 1)])) not in ids)
+    repo.close()
+
+# Saved contexts come back the same once they are no longer resident, and can be listed
+# and deleted
+def check_contexts(backend):
+    store = backend.contexts()
+    context = UserContext('conformance_user', name='Alice', preferences={'genre': 'sci-fi'})
+    context['favourite_snack'] = 'popcorn'
+    store.save_context('conformance_user', context)
+    get_writer().flush()
+    store.evict(reserve=store.max_resident)
+    
+    loaded = store.load_context('conformance_user')
+    check(loaded is not context)
+    check(loaded.name == 'Alice' and loaded.preferences == {'genre': 'sci-fi'})
+    check(loaded.get('favourite_snack') == 'popcorn')
+    check('conformance_user' in dict(store.iter_contexts()))
+    check('conformance_user' in store.get_all_contexts())
+    
+    store.delete_context('conformance_user')
+    check('conformance_user' not in store.get_all_contexts())
+    check(store.load_context('conformance_user').name is None)
+
+# DatabaseManager works on the backend, including handing cancelled seats to the waitlist
+def check_database_manager(backend):
+    db = DatabaseManager(backend, shared_seats=False)
+    check(db.backend == backend.name)
+    showtime = db.get_movie('dune2')['times'][0]
+    booking = make_booking('alice', [('A', 1)], showtime=showtime)
+    db.add_booking(booking)
+    check(db.join_waitlist('bob', 'dune2', showtime, 1, SHOW_DATE))
+    db.cancel_booking(booking['reference'])
+    offers = db.take_waitlist_offers('bob')
+    check([(o['movie_key'], o['time']) for o in offers] == [('dune2', showtime)])
+    check(db.count_free_seats('dune2', showtime, SHOW_DATE) == db.get_availability('dune2', SHOW_DATE)[showtime])
+    db.close()
+
+CHECKS = [check_catalog, check_bookings, check_contexts, check_database_manager]
+
+# Run every check against new scratch backends under directory, returning
+# {check name: error} for those that failed
+def run_checks(backend_class, directory):
+    failures = {}
+    for check in CHECKS:
+        check_dir = os.path.join(directory, check.__name__)
+        os.makedirs(check_dir, exist_ok=True)
+        try:
+            check(backend_class.scratch(check_dir))
+        except Exception as e:
+            failures[check.__name__] = e
+            traceback.print_exc()
+    return failures
+
+# Check the named backends (all registered ones by default); exits 1 if any check fails
+def main():
+    parser = argparse.ArgumentParser(description="Storage backend conformance checks")
+    parser.add_argument('backends', nargs='*', default=list(BACKENDS))
+    args = parser.parse_args()
+    
+    failed = False
+    for name in args.backends:
+        with tempfile.TemporaryDirectory() as tmp:
+            failures = run_checks(BACKENDS[name], tmp)
+            get_writer().flush()
+        for check in CHECKS:
+            error = failures.get(check.__name__)
+            print(f"{name:>10}  {check.__name__:<24}{'ok' if error is None else f'FAILED: {error!r}'}")
+        failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
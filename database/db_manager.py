@@ -2,22 +2,41 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from .movie_repository import MovieRepository
-from .booking_repository import BookingRepository
+from config import STORAGE_BACKEND, SHARED_SEATS
+from .backends import open_backend
 
 class DatabaseManager:
     
-    # Set up the movie and booking repositories and load their data
-    def __init__(self):
-        self.movie_repo = MovieRepository()
-        self.booking_repo = BookingRepository()
-        self.initialize()
+    # Open the movie and booking stores of a storage backend, given by name or as a
+    # StorageBackend, and load their data
+    def __init__(self, backend=STORAGE_BACKEND, shared_seats=SHARED_SEATS):
+        self.storage = open_backend(backend) if isinstance(backend, str) else backend
+        self.backend = self.storage.name
+        self.movie_repo = self.storage.movies()
+        self.booking_repo = self.storage.bookings(self.storage.seat_map(shared_seats))
+        # Seats freed by cancellations, made here or by another process, go to the waitlist
+        # first. Managers on one backend share its waitlist, which listens once per repository.
+        self.waitlist = self.storage.waitlist()
+        if self.waitlist.seats_released not in self.booking_repo.seat_listeners:
+            self.booking_repo.seat_listeners.append(self.waitlist.seats_released)
     
-    # Reload data from disk for both repositories
+    # Reload data from disk for both repositories (the constructors already load once)
     def initialize(self):
         self.movie_repo.load()
         self.booking_repo.load()
     
+    # Apply movie and booking changes made by other processes since we last looked.
+    # Reads already do this themselves; this is for callers that want it up front.
+    def refresh(self):
+        self.movie_repo.refresh()
+        self.booking_repo.refresh()
+    
+    # Compact the booking journal into a snapshot before the process exits
+    def close(self):
+        self.booking_repo.save()
+        self.booking_repo.close()
+        self.movie_repo.close()
+    
     # Get a single movie record by its key
     def get_movie(self, movie_key):
         return self.movie_repo.get(movie_key)
@@ -42,9 +61,43 @@ class DatabaseManager:
     def delete_movie(self, movie_key):
         return self.movie_repo.delete(movie_key)
     
-    # Add a new booking record via the repository
-    def add_booking(self, booking_data):
-        return self.booking_repo.add(booking_data)
+    # Add a new booking record via the repository; raises SeatUnavailableError if a seat
+    # was taken in the meantime. Seats held under hold_token are the caller's own.
+    def add_booking(self, booking_data, hold_token=0):
+        return self.booking_repo.add(booking_data, hold_token)
+    
+    # Add a batch of bookings atomically, returning their IDs; raises BatchBookingError
+    # with the reason for each booking that can't be made, and then saves none of them
+    def add_bookings(self, bookings):
+        return self.booking_repo.add_many(bookings)
+    
+    # Add bookings for shows before the archive cutoff straight into the archive, e.g. when
+    # importing history; all or none are kept, as with add_bookings
+    def import_archived_bookings(self, bookings):
+        return self.booking_repo.import_archived(bookings)
+    
+    # Hold seats while a user confirms; returns (token, expires_at) or None if a seat is gone
+    def hold_seats(self, movie_key, showtime, seats, show_date=None):
+        return self.booking_repo.hold_seats(movie_key, showtime, seats, show_date)
+    
+    # Release a hold before it expires
+    def release_hold(self, movie_key, showtime, seats, token, show_date=None):
+        self.booking_repo.release_hold(movie_key, showtime, seats, token, show_date)
+    
+    # Cancel a booking by reference and free its seats; returns the cancelled booking or None
+    def cancel_booking(self, reference, refund=0.0):
+        return self.booking_repo.cancel(reference, refund)
+    
+    # Put a user on the waiting list for a showtime; False if they are already on it
+    def join_waitlist(self, user_id, movie_key, showtime, tickets, show_date=None):
+        key = self.booking_repo.show_key(movie_key, showtime, show_date)
+        return self.waitlist.join(key, user_id, tickets)
+    
+    # Collect the seats offered to a user since they last spoke to the bot. Catching up
+    # with the bookings first turns cancellations made elsewhere into offers.
+    def take_waitlist_offers(self, user_id):
+        self.booking_repo.refresh()
+        return self.waitlist.take_offers(user_id)
     
     # Get all bookings made by a specific user
     def get_user_bookings(self, user_id):
@@ -54,13 +107,51 @@ class DatabaseManager:
     def get_booking_by_reference(self, reference):
         return self.booking_repo.get_by_reference(reference)
     
-    # Get all seats that are already taken for a show
-    def get_taken_seats(self, movie_key, showtime):
-        return self.booking_repo.get_taken_seats(movie_key, showtime)
+    # Whether any booking, archived ones included, has this reference
+    def reference_exists(self, reference):
+        return self.booking_repo.reference_exists(reference)
+    
+    # Get bookings for shows between two dates, both inclusive
+    def get_bookings_between(self, start_date, end_date):
+        return self.booking_repo.get_by_date_range(start_date, end_date)
+    
+    # Get the seats already taken or held by others for a show (today's unless a show date is given)
+    def get_taken_seats(self, movie_key, showtime, show_date=None, hold_token=0):
+        return self.booking_repo.get_taken_seats(movie_key, showtime, show_date, hold_token)
+    
+    # Check a single (row, seat) pair in O(1)
+    def is_seat_taken(self, movie_key, showtime, seat, show_date=None):
+        return self.booking_repo.get_taken_seats(movie_key, showtime, show_date).is_taken(*seat)
+    
+    # Check that every seat in a list is still free with one mask test
+    def are_seats_free(self, movie_key, showtime, seats, show_date=None):
+        return self.booking_repo.get_taken_seats(movie_key, showtime, show_date).are_free(seats)
+    
+    # Number of seats still free for a show
+    def count_free_seats(self, movie_key, showtime, show_date=None):
+        return self.booking_repo.get_taken_seats(movie_key, showtime, show_date).free_count()
+    
+    # Seats sold, seats left and revenue for a show, from the running counters
+    def get_showtime_stats(self, movie_key, showtime, show_date=None):
+        return self.booking_repo.showtime_stats(movie_key, showtime, show_date)
+    
+    # Seats sold and revenue for a movie across all its shows, past ones included
+    def get_movie_stats(self, movie_key):
+        return self.booking_repo.movie_stats(movie_key)
+    
+    # Seats left at each of a movie's showtimes (today's unless a date is given), for listings
+    def get_availability(self, movie_key, show_date=None):
+        movie = self.movie_repo.get(movie_key) or {}
+        return {time: self.booking_repo.showtime_stats(movie_key, time, show_date)['remaining']
+                for time in movie.get('times', [])}
+    
+    # Stream bookings for shows between two dates, optionally for one movie
+    def iter_bookings(self, start_date='', end_date='\uffff', movie_key=None):
+        return self.booking_repo.iter_bookings(start_date, end_date, movie_key)
     
-    def is_seat_taken(self, movie_key, showtime, seat):
-        taken = self.get_taken_seats(movie_key, showtime)
-        return seat in taken
+    # Every cancellation made, with the refund given, oldest first
+    def get_cancellations(self):
+        return self.booking_repo.get_cancellations()
     
     # Return a list of all bookings
     def get_all_bookings(self):
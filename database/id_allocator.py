@@ -0,0 +1,100 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import struct
+import threading
+from config import BOOKING_ID_BLOCK
+from utils.file_lock import FileLock
+
+# Highest ID reserved so far by any process
+COUNTER = struct.Struct('<Q')
+
+# IdAllocator hands out booking IDs that are unique across every process sharing a
+# store. Each process reserves a block of BOOKING_ID_BLOCK IDs at a time by moving a
+# counter in a small file under a file lock, then hands them out from memory, so only
+# one allocation in a block touches the file. IDs left in a block when a process stops
+# are never used, so IDs are unique and increase within a process but have gaps and
+# don't follow booking order across processes. With no path the counter lives in this
+# process only.
+class IdAllocator:
+    
+    # Open the counter file; no block is reserved until the first ID is needed
+    def __init__(self, path=None, block=BOOKING_ID_BLOCK):
+        self.path = path
+        self.block = block
+        self.lock = FileLock(path + '.lock') if path else None
+        self._counter = 0
+        self._next = 1
+        self._end = 0
+        self._lock = threading.Lock()
+    
+    # Read the counter file, or 0 if there isn't one yet
+    def _read(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read(COUNTER.size)
+        except FileNotFoundError:
+            return 0
+        return COUNTER.unpack(data)[0] if len(data) == COUNTER.size else 0
+    
+    # Replace the counter durably; a counter lost in a crash could hand out IDs again
+    def _write(self, value):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(COUNTER.pack(value))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+    
+    # Move the counter on by count and return the first ID of the range reserved
+    def _reserve(self, count):
+        if self.lock is None:
+            start = self._counter + 1
+            self._counter += count
+            return start
+        with self.lock:
+            start = self._read() + 1
+            self._write(start + count - 1)
+        return start
+    
+    # Make sure no ID up to high_water is handed out again, e.g. when the counter file is
+    # new or was lost but the bookings made with earlier IDs are still stored
+    def seed(self, high_water):
+        with self._lock:
+            if self.lock is None:
+                self._counter = max(self._counter, high_water)
+            else:
+                with self.lock:
+                    if self._read() < high_water:
+                        self._write(high_water)
+            if self._next <= high_water:
+                self._next, self._end = 1, 0
+    
+    # Next unused ID, reserving a fresh block when this process has used up its own
+    def next_id(self):
+        with self._lock:
+            if self._next > self._end:
+                self._next = self._reserve(self.block)
+                self._end = self._next + self.block - 1
+            booking_id = self._next
+            self._next += 1
+            return booking_id
+    
+    # count unused IDs in increasing order. A batch bigger than what is left of the block
+    # gets a range of its own, so its IDs still come from one reservation.
+    def next_ids(self, count):
+        with self._lock:
+            if self._end - self._next + 1 < count:
+                if count > self.block:
+                    start = self._reserve(count)
+                    return list(range(start, start + count))
+                self._next = self._reserve(self.block)
+                self._end = self._next + self.block - 1
+            ids = list(range(self._next, self._next + count))
+            self._next += count
+            return ids
+
+if __name__ == "__main__":
+    pass
+    # print("IdAllocator module loaded successfully!")
@@ -0,0 +1,108 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from .movie_repository import MovieRepository
+from .booking_repository import BookingRepository, cancel_record
+from .booking_partitions import summarize
+from .id_allocator import IdAllocator
+
+# MovieRepository kept in this process only, starting from the default catalogue.
+# Nothing is written anywhere and no other process can see the edits.
+class InMemoryMovieRepository(MovieRepository):
+    
+    def __init__(self):
+        self.movies = {}
+        self.change_lock = threading.Lock()
+        self.load()
+    
+    # Start from the default catalogue; a reload keeps the movies already here
+    def load(self):
+        if not self.movies:
+            self.movies = self.get_default_movies()
+    
+    # Nothing to save, close or catch up with
+    def save(self):
+        pass
+    
+    def close(self):
+        pass
+    
+    def refresh(self):
+        pass
+    
+    def _apply_changes(self):
+        pass
+    
+    def _commit(self, movie_key):
+        pass
+
+# BookingRepository kept in this process only. The indexes, seat inventory and counters
+# are the same as the file-backed repository's; only persistence is left out, so past
+# days stay resident rather than being archived. Imported history is kept by day.
+class InMemoryBookingRepository(BookingRepository):
+    
+    def __init__(self, seat_map=None):
+        self._init_state(seat_map, threading.Lock(), IdAllocator())
+        self._archive = {}
+        self._cancellations = []
+        self.load()
+    
+    # The bookings are whatever this repository already holds
+    def _load_bookings(self):
+        return dict(self.bookings)
+    
+    def _load_from_index(self):
+        return False
+    
+    # Catalog of the imported history, worked out again after each import
+    def _get_catalog(self):
+        if self._catalog is None:
+            self._catalog = {day: summarize(bookings) for day, bookings in self._archive.items()}
+        return self._catalog
+    
+    # Imported bookings for one older show date
+    def _read_archived(self, day):
+        return list(self._archive.get(day, []))
+    
+    def _persist_archived(self, by_day):
+        for day, bookings in by_day.items():
+            self._archive.setdefault(day, []).extend(bookings)
+    
+    # No other process can change the bookings
+    def _changed(self):
+        return False
+    
+    def _read_changes(self):
+        return []
+    
+    # Changes only have to reach the indexes, which add, add_many and cancel already update
+    def _persist_add(self, booking):
+        pass
+    
+    def _persist_batch(self, bookings):
+        pass
+    
+    # Cancellations are kept in a list, in the order they were made
+    def _persist_cancel(self, booking):
+        self._cancellations.append(cancel_record(booking))
+    
+    def get_cancellations(self):
+        return list(self._cancellations)
+    
+    def _maybe_compact(self):
+        pass
+    
+    def save(self):
+        pass
+    
+    def compact(self, durable=False):
+        pass
+    
+    def close(self):
+        self.seat_map.close()
+
+if __name__ == "__main__":
+    pass
+    # print("In-memory repositories module loaded successfully!")
@@ -2,25 +2,39 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import MOVIES_FILE
+from config import MOVIES_FILE, MOVIES_JOURNAL_FILE
 from utils.helpers import Helper
+from .booking_journal import BookingJournal
 
+# Every edit to the catalogue is also appended to a small change journal, so other
+# processes pick up just the movies that changed (see refresh) instead of reloading.
+# Once the catalogue is saved the records before the edit are trimmed, so the journal
+# only ever holds the latest edits; a process too far behind reloads the catalogue.
 class MovieRepository:
     # Set up the in-memory movie store and load data
-    def __init__(self):
+    def __init__(self, movies_file=MOVIES_FILE, journal_file=MOVIES_JOURNAL_FILE):
         self.movies = {}
-        self.load()
+        self.movies_file = movies_file
+        self.changes = BookingJournal(journal_file, sync=False)
+        self.change_lock = self.changes.lock
+        with self.change_lock:
+            self.changes.replay()
+            self.load()
     
     # Load movies from disk or populate with defaults
     def load(self):
-        self.movies = Helper.load_json(MOVIES_FILE, self.get_default_movies())
+        self.movies = Helper.load_json(self.movies_file, self.get_default_movies())
         if not self.movies:
             self.movies = self.get_default_movies()
             self.save()
     
     # Save the current movie dictionary back to disk
     def save(self):
-        Helper.save_json(MOVIES_FILE, self.movies)
+        Helper.save_json(self.movies_file, self.movies)
+    
+    # Release the change journal's file handles
+    def close(self):
+        self.changes.close()
     
     # Return a built‑in set of movies used as a fallback
     def get_default_movies(self):
@@ -64,16 +78,51 @@ class MovieRepository:
             }
         }
     
+    # Apply catalogue edits other processes have made since we last looked; when there
+    # are none this costs one read of the journal's generation
+    def refresh(self):
+        if self.changes.changed():
+            with self.change_lock:
+                self._apply_changes()
+    
+    # Apply new change records, with the journal lock held. Reloads the whole catalogue
+    # if the records needed were trimmed away first.
+    def _apply_changes(self):
+        records = self.changes.read_new()
+        if records is None:
+            self.changes.replay(start=self.changes.mark()[0])
+            self.load()
+            return
+        for record in records:
+            if record['op'] == 'put':
+                self.movies[record['movie_key']] = record['movie']
+            else:
+                self.movies.pop(record['movie_key'], None)
+    
+    # Save the catalogue, trim the journal records it now covers and record the edit for
+    # other processes, with the journal lock held
+    def _commit(self, movie_key):
+        offset, _ = self.changes.mark()
+        self.save()
+        self.changes.trim(offset)
+        if movie_key in self.movies:
+            self.changes.append({'op': 'put', 'movie_key': movie_key, 'movie': self.movies[movie_key]})
+        else:
+            self.changes.append({'op': 'delete', 'movie_key': movie_key})
+    
     # Get a single movie by its key
     def get(self, movie_key):
+        self.refresh()
         return self.movies.get(movie_key)
     
     # Return the full movie mapping
     def get_all(self):
+        self.refresh()
         return self.movies
     
     # Search movies by matching a query against several fields
     def search(self, query):
+        self.refresh()
         query_lower = query.lower()
         results = []
         
@@ -88,32 +137,40 @@ class MovieRepository:
     
     # Add a new movie entry and save
     def add(self, movie_key, movie_data):
-        self.movies[movie_key] = movie_data
-        self.save()
+        with self.change_lock:
+            self._apply_changes()
+            self.movies[movie_key] = movie_data
+            self._commit(movie_key)
         return True
     
     # Update an existing movie if it exists
     def update(self, movie_key, updates):
-        if movie_key in self.movies:
+        with self.change_lock:
+            self._apply_changes()
+            if movie_key not in self.movies:
+                return False
             self.movies[movie_key].update(updates)
-            self.save()
-            return True
-        return False
+            self._commit(movie_key)
+        return True
     
     # Delete a movie by key if present
     def delete(self, movie_key):
-        if movie_key in self.movies:
+        with self.change_lock:
+            self._apply_changes()
+            if movie_key not in self.movies:
+                return False
             del self.movies[movie_key]
-            self.save()
-            return True
-        return False
+            self._commit(movie_key)
+        return True
     
     # Return movies filtered by genre name
     def get_by_genre(self, genre):
+        self.refresh()
         return {k: v for k, v in self.movies.items() if v['genre'].lower() == genre.lower()}
     
     # Return movies filtered by age rating
     def get_by_rating(self, rating):
+        self.refresh()
         return {k: v for k, v in self.movies.items() if v['rating'] == rating}
 
 if __name__ == "__main__":
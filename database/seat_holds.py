@@ -0,0 +1,64 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import heapq
+import secrets
+import time
+from config import SEAT_HOLD_SECONDS
+
+# SeatHolds places time-limited holds on a seat map and clears them when they expire.
+# Holds this process placed sit in a min-heap ordered by expiry, so each check only
+# pops the holds that are due instead of looking at every hold. Held seats going back
+# on sale aren't reported to anyone: they were never sold, so no count of free seats
+# changes.
+class SeatHolds:
+    
+    # Work against a seat map; holds last ttl seconds
+    def __init__(self, seat_map, ttl=SEAT_HOLD_SECONDS):
+        self.seat_map = seat_map
+        self.ttl = ttl
+        self._heap = []
+        self._live = {}
+        self.stats = {'placed': 0, 'released': 0, 'expired': 0}
+    
+    # Hold seats for a showtime key. Returns (token, expires_at), or None if any seat is
+    # sold or held by someone else.
+    def place(self, key, seats, reuse_before=''):
+        self.expire_due()
+        token = secrets.randbits(32) or 1
+        expires_at = time.time() + self.ttl
+        if not self.seat_map.hold(key, seats, token, expires_at, reuse_before=reuse_before):
+            return None
+        self._live[token] = (key, [tuple(seat) for seat in seats])
+        heapq.heappush(self._heap, (expires_at, token))
+        self.stats['placed'] += 1
+        return token, expires_at
+    
+    # Let go of a hold before it expires, e.g. on cancel or going back
+    def release(self, key, seats, token):
+        self._live.pop(token, None)
+        self.seat_map.release_hold(key, seats, token)
+        self.stats['released'] += 1
+    
+    # Forget a hold whose seats were just sold; the sale already cleared it in the seat map
+    def consume(self, token):
+        self._live.pop(token, None)
+    
+    # Clear every hold that has expired. Heap entries for holds already released or
+    # consumed are dropped as they come up.
+    def expire_due(self, now=None):
+        now = time.time() if now is None else now
+        expired = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, token = heapq.heappop(self._heap)
+            entry = self._live.pop(token, None)
+            if entry is not None:
+                self.seat_map.release_hold(entry[0], entry[1], token)
+                expired += 1
+        self.stats['expired'] += expired
+        return expired
+
+if __name__ == "__main__":
+    pass
+    # print("SeatHolds module loaded successfully!")
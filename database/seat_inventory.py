@@ -0,0 +1,101 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ROWS, SEATS_PER_ROW
+
+ROW_INDEX = {row: i for i, row in enumerate(ROWS)}
+CAPACITY = len(ROWS) * SEATS_PER_ROW
+
+# Return the bit for a seat in the configured layout, or None if the seat doesn't exist
+def seat_bit(row, seat_num):
+    row_index = ROW_INDEX.get(row)
+    if row_index is None or not isinstance(seat_num, int) or not 1 <= seat_num <= SEATS_PER_ROW:
+        return None
+    return 1 << (row_index * SEATS_PER_ROW + seat_num - 1)
+
+# Combine seats into one bitmask; seats outside the layout are ignored unless strict is set
+def seats_mask(seats, strict=False):
+    mask = 0
+    for row, seat_num in seats:
+        bit = seat_bit(row, seat_num)
+        if bit is None:
+            if strict:
+                raise ValueError(f"{row}{seat_num} is not a seat")
+            continue
+        mask |= bit
+    return mask
+
+# SeatSnapshot is a read-only view of which seats are taken at one showtime,
+# stored as a single integer with one bit per seat. Seats someone is holding while
+# they confirm a booking are kept in a second mask.
+class SeatSnapshot:
+    __slots__ = ('bits', 'held')
+    
+    def __init__(self, bits=0, held=0):
+        self.bits = bits
+        self.held = held
+    
+    # Check one seat in O(1)
+    def is_taken(self, row, seat_num):
+        bit = seat_bit(row, seat_num)
+        return bit is not None and bool(self.bits & bit)
+    
+    # Check whether someone else is holding a seat for a booking in progress
+    def is_held(self, row, seat_num):
+        bit = seat_bit(row, seat_num)
+        return bit is not None and bool(self.held & bit)
+    
+    # Check that none of the given seats are taken or held, with a single mask test
+    def are_free(self, seats):
+        return not (self.bits | self.held) & seats_mask(seats)
+    
+    # Number of seats taken and still free
+    def taken_count(self):
+        return bin(self.bits).count('1')
+    
+    def free_count(self):
+        return CAPACITY - self.taken_count()
+    
+    # Taken seats as (row, seat) tuples in layout order
+    def taken_seats(self):
+        return [(row, seat_num) for row in ROWS for seat_num in range(1, SEATS_PER_ROW + 1)
+                if self.bits & seat_bit(row, seat_num)]
+    
+    # Allow `(row, seat) in taken` and iteration, like the old list of tuples
+    def __contains__(self, seat):
+        return self.is_taken(*seat)
+    
+    def __iter__(self):
+        return iter(self.taken_seats())
+    
+    def __len__(self):
+        return self.taken_count()
+
+# SeatInventory is the live, mutable seat map for one showtime, along with the revenue
+# taken for it. Both are updated as bookings come and go, so how full a showtime is and
+# what it has earned never needs a pass over the bookings.
+class SeatInventory(SeatSnapshot):
+    __slots__ = ('revenue',)
+    
+    def __init__(self, bits=0, revenue=0.0):
+        super().__init__(bits)
+        self.revenue = revenue
+    
+    # Mark seats as taken, adding what was paid for them
+    def take(self, seats, amount=0.0):
+        self.bits |= seats_mask(seats)
+        self.revenue += amount
+    
+    # Mark seats as free again, taking off what was paid for them
+    def release(self, seats, amount=0.0):
+        self.bits &= ~seats_mask(seats)
+        self.revenue -= amount
+    
+    # Cheap read-only copy for rendering; later changes don't affect it
+    def snapshot(self):
+        return SeatSnapshot(self.bits)
+
+if __name__ == "__main__":
+    pass
+    # print("SeatInventory module loaded successfully!")
@@ -0,0 +1,335 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import struct
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory, resource_tracker
+from config import DATA_DIR, ROWS, SEATS_PER_ROW, SEAT_LOCK_FILE, SEAT_MEMORY_SLOTS
+from utils.file_lock import FileLock
+from .seat_inventory import CAPACITY, SeatSnapshot, seats_mask
+
+MAGIC = b'SVS3'
+# Magic, rows, seats per row, number of slots, tag of the booking store it mirrors
+HEADER = struct.Struct('<4sHHII')
+# Who holds a seat and until when (epoch seconds)
+HOLD = struct.Struct('<Id')
+KEY_BYTES = 64
+MASK_BYTES = (CAPACITY + 7) // 8
+SLOT_BYTES = KEY_BYTES + 2 * MASK_BYTES + CAPACITY * HOLD.size
+FULL_MASK = (1 << CAPACITY) - 1
+
+# Name of the shared segment for a data directory (or a database file in it), so
+# separate installs and stores don't share seats
+def default_name(data_dir=DATA_DIR):
+    return 'savoy_seats_%08x' % zlib.crc32(os.path.abspath(data_dir).encode('utf-8'))
+
+# Tag of a booking store in a segment header, from the path of its journal or database
+def store_tag(store):
+    return zlib.crc32(os.path.abspath(store).encode('utf-8')) or 1
+
+# Split a mask into (bit, seat index) pairs
+def _bits_of(mask):
+    while mask:
+        bit = mask & -mask
+        yield bit, bit.bit_length() - 1
+        mask ^= bit
+
+# SeatMap is the live seat map for every showtime: which seats are sold, and which are
+# held for a few minutes by someone part-way through booking. A hold belongs to a token
+# and lapses at its expiry time even if nobody clears it, so a hold left by a crashed
+# process never blocks a seat for long. Subclasses decide where the slots are stored;
+# shared is True when every process sees the same map.
+class SeatMap:
+    shared = False
+    
+    # Seats in mask held by anyone other than token whose hold hasn't lapsed yet
+    def _live_holds(self, slot, mask, token, now):
+        blocked = 0
+        for bit, index in _bits_of(self._get_held(slot) & mask):
+            owner, expires_at = self._get_hold(slot, index)
+            if owner != token and expires_at > now:
+                blocked |= bit
+        return blocked
+    
+    # Tie the map to the one booking store whose bookings it mirrors. Nothing to check for
+    # a map held in this process.
+    def claim(self, store):
+        pass
+    
+    # Read-only view of the seats sold and held (by others than token) for a showtime right now
+    def snapshot(self, key, token=0):
+        with self.lock:
+            slot = self._find(key)
+            if slot is None:
+                return SeatSnapshot()
+            return SeatSnapshot(self._get_bits(slot), self._live_holds(slot, FULL_MASK, token, time.time()))
+    
+    # Hold free seats for token until expires_at; returns False and changes nothing if any
+    # of them is sold or held by someone else
+    def hold(self, key, seats, token, expires_at, reuse_before=''):
+        mask = seats_mask(seats)
+        with self.lock:
+            slot = self._find(key, create=True, reuse_before=reuse_before)
+            if self._get_bits(slot) & mask or self._live_holds(slot, mask, token, time.time()):
+                return False
+            for _, index in _bits_of(mask):
+                self._set_hold(slot, index, token, expires_at)
+            self._set_held(slot, self._get_held(slot) | mask)
+            return True
+    
+    # Drop token's hold on seats; seats held by someone else are left alone
+    def release_hold(self, key, seats, token):
+        with self.lock:
+            slot = self._find(key)
+            if slot is None:
+                return
+            held = self._get_held(slot)
+            for bit, index in _bits_of(held & seats_mask(seats)):
+                if self._get_hold(slot, index)[0] == token:
+                    self._set_hold(slot, index, 0, 0.0)
+                    held &= ~bit
+            self._set_held(slot, held)
+    
+    # Sell the seats only if every one of them is free or held by token; returns False and
+    # changes nothing otherwise
+    def reserve(self, key, seats, token=0, reuse_before=''):
+        return not self.reserve_many([(key, seats)], token, reuse_before)
+    
+    # Sell the seats for a list of (key, seats) requests in one go. Every request is
+    # checked first, against the map and against the requests before it; if any of them
+    # can't be met nothing is sold and the indexes of the failed requests are returned.
+    def reserve_many(self, requests, token=0, reuse_before=''):
+        with self.lock:
+            now = time.time()
+            claimed = {}
+            failed = []
+            for i, (key, seats) in enumerate(requests):
+                mask = seats_mask(seats)
+                if key not in claimed:
+                    claimed[key] = [self._find(key, create=True, reuse_before=reuse_before), 0]
+                slot, batch_mask = claimed[key]
+                if (self._get_bits(slot) | batch_mask) & mask or self._live_holds(slot, mask, token, now):
+                    failed.append(i)
+                claimed[key][1] |= mask
+            if failed:
+                return failed
+            
+            for slot, mask in claimed.values():
+                self._set_bits(slot, self._get_bits(slot) | mask)
+                # Any hold left on these seats is ours or has lapsed
+                for _, index in _bits_of(self._get_held(slot) & mask):
+                    self._set_hold(slot, index, 0, 0.0)
+                self._set_held(slot, self._get_held(slot) & ~mask)
+            return []
+    
+    # Free sold seats again, e.g. when the booking that reserved them couldn't be saved
+    def release(self, key, seats):
+        mask = seats_mask(seats)
+        with self.lock:
+            slot = self._find(key)
+            if slot is not None:
+                self._set_bits(slot, self._get_bits(slot) & ~mask)
+    
+    # Add seats this process loaded from disk; bookings on disk always hold their seats
+    def merge(self, inventories, reuse_before=''):
+        with self.lock:
+            for key, inventory in inventories.items():
+                if inventory.bits and key[0] >= reuse_before:
+                    slot = self._find(key, create=True, reuse_before=reuse_before)
+                    self._set_bits(slot, self._get_bits(slot) | inventory.bits)
+    
+    # Make the sold seats of every showtime from reuse_before on match the bookings stored,
+    # dropping seats sold with no booking behind them: a process that crashed between
+    # reserving seats and saving its booking leaves those, and so does resetting the data
+    # directory. Holds are left alone. Call with the store's change lock held and after
+    # catching up, so no booking is part-way through being saved. Returns the number of
+    # seats that were sold in the map but not in the store.
+    def reconcile(self, inventories, reuse_before=''):
+        dropped = 0
+        with self.lock:
+            for key, slot in self._all_slots():
+                if key[0] >= reuse_before:
+                    inventory = inventories.get(key)
+                    bits = inventory.bits if inventory is not None else 0
+                    dropped += bin(self._get_bits(slot) & ~bits).count('1')
+                    self._set_bits(slot, bits)
+            for key, inventory in inventories.items():
+                if inventory.bits and key[0] >= reuse_before and self._find(key) is None:
+                    self._set_bits(self._find(key, create=True, reuse_before=reuse_before), inventory.bits)
+        return dropped
+    
+    # Detach from the map's storage; nothing to do for a map held in this process
+    def close(self):
+        pass
+
+# LocalSeatMap keeps the seat map in this process only, for single-process use
+class LocalSeatMap(SeatMap):
+    
+    # Start with an empty map; a thread lock is enough within one process
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._slots = {}
+    
+    # Forget every sale and hold, before the map is filled again from storage
+    def clear(self):
+        with self.lock:
+            self._slots = {}
+    
+    # A slot is [sold bits, held bits, {seat index: (token, expires_at)}]
+    def _find(self, key, create=False, reuse_before=''):
+        slot = self._slots.get(key)
+        if slot is None and create:
+            slot = self._slots[key] = [0, 0, {}]
+        return slot
+    
+    # Every (key, slot) in the map
+    def _all_slots(self):
+        return list(self._slots.items())
+    
+    # Slot accessors used by SeatMap
+    def _get_bits(self, slot):
+        return slot[0]
+    
+    def _set_bits(self, slot, bits):
+        slot[0] = bits
+    
+    def _get_held(self, slot):
+        return slot[1]
+    
+    def _set_held(self, slot, held):
+        slot[1] = held
+    
+    def _get_hold(self, slot, index):
+        return slot[2].get(index, (0, 0.0))
+    
+    def _set_hold(self, slot, index, token, expires_at):
+        if token:
+            slot[2][index] = (token, expires_at)
+        else:
+            slot[2].pop(index, None)
+
+# SharedSeatMap keeps the seat map in a shared memory segment that all bot processes on
+# the machine attach to. It is an open-addressing hash table of fixed-size slots, each
+# holding a "show_date|movie_key|time" key, the sold and held bitmasks, and the holder and
+# expiry of each seat. Every read and update happens under a file lock, so reserving or
+# holding seats is atomic across processes. The segment outlives the processes using it,
+# so the booking store reconciles it with the bookings on disk whenever a repository
+# loads or compacts; unlink() drops it so the next process rebuilds it from scratch.
+class SharedSeatMap(SeatMap):
+    shared = True
+    
+    # Attach to the segment, creating it if this is the first process
+    def __init__(self, name=None, lock_path=SEAT_LOCK_FILE, slots=SEAT_MEMORY_SLOTS):
+        self.name = name or default_name()
+        self.lock = FileLock(lock_path)
+        with self.lock:
+            try:
+                self.shm = shared_memory.SharedMemory(self.name, create=True, size=HEADER.size + slots * SLOT_BYTES)
+                HEADER.pack_into(self.shm.buf, 0, MAGIC, len(ROWS), SEATS_PER_ROW, slots, 0)
+            except FileExistsError:
+                self.shm = shared_memory.SharedMemory(self.name)
+        # Python would unlink the segment when this process exits, pulling it from under the others
+        resource_tracker.unregister(self.shm._name, 'shared_memory')
+        
+        magic, rows, seats_per_row, self.slots, _ = HEADER.unpack_from(self.shm.buf, 0)
+        if (magic, rows, seats_per_row) != (MAGIC, len(ROWS), SEATS_PER_ROW):
+            self.shm.close()
+            raise RuntimeError(f"Shared seat map {self.name} was made with a different layout; unlink it and restart")
+    
+    # The first store to claim the segment owns it. reconcile() sets the sold seats to
+    # what the owner has stored, which would wipe out another store's sales, so a second
+    # store is turned away. A store reset in the same place keeps its tag.
+    def claim(self, store):
+        tag = store_tag(store)
+        with self.lock:
+            owner = HEADER.unpack_from(self.shm.buf, 0)[4]
+            if owner == 0:
+                HEADER.pack_into(self.shm.buf, 0, MAGIC, len(ROWS), SEATS_PER_ROW, self.slots, tag)
+            elif owner != tag:
+                raise RuntimeError(f"Shared seat map {self.name} already mirrors another booking store; "
+                                   "give each store its own map")
+    
+    # Encode a (show_date, movie_key, time) key as a fixed-width slot key
+    @staticmethod
+    def _encode_key(key):
+        raw = '|'.join(key).encode('utf-8')
+        if len(raw) > KEY_BYTES:
+            raise ValueError(f"Showtime key too long for the shared seat map: {key}")
+        return raw.ljust(KEY_BYTES, b'\0')
+    
+    # Find the slot offset for a key. With create=True a missing key gets a slot, reusing
+    # one left by a show date before reuse_before if the table has no empty slot on the way.
+    def _find(self, key, create=False, reuse_before=''):
+        raw = self._encode_key(key)
+        buf = self.shm.buf
+        start = zlib.crc32(raw) % self.slots
+        empty = reusable = None
+        for i in range(self.slots):
+            offset = HEADER.size + (start + i) % self.slots * SLOT_BYTES
+            stored = bytes(buf[offset:offset + KEY_BYTES])
+            if stored == raw:
+                return offset
+            if stored[0] == 0:
+                empty = offset
+                break
+            if reusable is None and stored.split(b'|', 1)[0].decode('utf-8') < reuse_before:
+                reusable = offset
+        if not create:
+            return None
+        
+        offset = reusable if reusable is not None else empty
+        if offset is None:
+            raise RuntimeError(f"Shared seat map {self.name} is full; raise SEAT_MEMORY_SLOTS")
+        buf[offset:offset + SLOT_BYTES] = bytes(SLOT_BYTES)
+        buf[offset:offset + KEY_BYTES] = raw
+        return offset
+    
+    # Every (key, slot offset) in use in the segment
+    def _all_slots(self):
+        buf = self.shm.buf
+        for i in range(self.slots):
+            offset = HEADER.size + i * SLOT_BYTES
+            stored = bytes(buf[offset:offset + KEY_BYTES])
+            if stored[0] != 0:
+                yield tuple(stored.rstrip(b'\0').decode('utf-8').split('|', 2)), offset
+    
+    # Read and write the sold and held bitmasks stored in a slot
+    def _get_bits(self, offset):
+        start = offset + KEY_BYTES
+        return int.from_bytes(self.shm.buf[start:start + MASK_BYTES], 'little')
+    
+    def _set_bits(self, offset, bits):
+        start = offset + KEY_BYTES
+        self.shm.buf[start:start + MASK_BYTES] = bits.to_bytes(MASK_BYTES, 'little')
+    
+    def _get_held(self, offset):
+        start = offset + KEY_BYTES + MASK_BYTES
+        return int.from_bytes(self.shm.buf[start:start + MASK_BYTES], 'little')
+    
+    def _set_held(self, offset, held):
+        start = offset + KEY_BYTES + MASK_BYTES
+        self.shm.buf[start:start + MASK_BYTES] = held.to_bytes(MASK_BYTES, 'little')
+    
+    # Read and write the holder and expiry of one seat
+    def _get_hold(self, offset, index):
+        return HOLD.unpack_from(self.shm.buf, offset + KEY_BYTES + 2 * MASK_BYTES + index * HOLD.size)
+    
+    def _set_hold(self, offset, index, token, expires_at):
+        HOLD.pack_into(self.shm.buf, offset + KEY_BYTES + 2 * MASK_BYTES + index * HOLD.size, token, expires_at)
+    
+    # Detach this process from the segment
+    def close(self):
+        self.shm.close()
+    
+    # Remove the segment for every process; it is recreated and reseeded on next use
+    def unlink(self):
+        # unlink() tells the tracker to forget the segment, so it has to know about it again first
+        resource_tracker.register(self.shm._name, 'shared_memory')
+        self.shm.unlink()
+
+if __name__ == "__main__":
+    pass
+    # print("SharedSeatMap module loaded successfully!")
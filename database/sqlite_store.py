@@ -0,0 +1,356 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import sqlite3
+import threading
+from config import SQLITE_FILE, MOVIES_FILE, MOVIES_JOURNAL_FILE, BOOKING_WRITE_POLICY, BOOKING_COMPACT_EVERY
+from utils.file_lock import FileLock
+from utils.helpers import Helper
+from .movie_repository import MovieRepository
+from .booking_repository import BookingRepository, SeatUnavailableError, BatchBookingError, cancel_record, archive_cutoff
+from .booking_partitions import show_date
+from .id_allocator import IdAllocator
+
+BOOKED_SEATS_TABLE = '''
+CREATE TABLE IF NOT EXISTS booked_seats (
+    show_date TEXT NOT NULL,
+    movie_key TEXT NOT NULL,
+    time TEXT NOT NULL,
+    seat_row TEXT NOT NULL,
+    seat_num INTEGER NOT NULL,
+    booking_id INTEGER NOT NULL REFERENCES bookings(booking_id) ON DELETE CASCADE,
+    UNIQUE (show_date, movie_key, time, seat_row, seat_num)
+);
+'''
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS movies (
+    movie_key TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS showtimes (
+    movie_key TEXT NOT NULL REFERENCES movies(movie_key) ON DELETE CASCADE,
+    time TEXT NOT NULL,
+    PRIMARY KEY (movie_key, time)
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    booking_id INTEGER PRIMARY KEY,
+    reference TEXT,
+    user_id TEXT,
+    movie_key TEXT NOT NULL,
+    time TEXT NOT NULL,
+    tickets INTEGER NOT NULL,
+    total REAL NOT NULL,
+    timestamp TEXT NOT NULL,
+    data TEXT NOT NULL,
+    show_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings(user_id);
+CREATE INDEX IF NOT EXISTS idx_bookings_reference ON bookings(reference);
+CREATE INDEX IF NOT EXISTS idx_bookings_show ON bookings(movie_key, time);
+CREATE INDEX IF NOT EXISTS idx_bookings_show_date ON bookings(show_date);
+CREATE TABLE IF NOT EXISTS cancellations (
+    booking_id INTEGER PRIMARY KEY,
+    reference TEXT,
+    refund REAL NOT NULL,
+    cancelled_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS booking_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL
+);
+''' + BOOKED_SEATS_TABLE + '''
+CREATE INDEX IF NOT EXISTS idx_booked_seats_booking ON booked_seats(booking_id);
+'''
+
+# Databases made before bookings had a show date: add the column, and rebuild the seat
+# table so a seat is only unique per show date. Older bookings were for same-day shows.
+ADD_SHOW_DATES = '''
+BEGIN;
+ALTER TABLE bookings ADD COLUMN show_date TEXT;
+UPDATE bookings SET show_date = substr(timestamp, 1, 10);
+DROP INDEX IF EXISTS idx_booked_seats_booking;
+ALTER TABLE booked_seats RENAME TO booked_seats_old;
+''' + BOOKED_SEATS_TABLE + '''
+INSERT INTO booked_seats (show_date, movie_key, time, seat_row, seat_num, booking_id)
+    SELECT b.show_date, s.movie_key, s.time, s.seat_row, s.seat_num, s.booking_id
+    FROM booked_seats_old s JOIN bookings b USING (booking_id);
+DROP TABLE booked_seats_old;
+COMMIT;
+'''
+
+# Open a connection in WAL mode so readers in other processes aren't blocked by a writer
+def connect(db_path=SQLITE_FILE):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    # FULL makes every commit durable, matching the 'sync' booking write policy
+    conn.execute(f"PRAGMA synchronous={'FULL' if BOOKING_WRITE_POLICY == 'sync' else 'NORMAL'}")
+    seat_columns = {row[1] for row in conn.execute('PRAGMA table_info(booked_seats)')}
+    if seat_columns and 'show_date' not in seat_columns:
+        conn.executescript(ADD_SHOW_DATES)
+    conn.executescript(SCHEMA)
+    return conn
+
+# Insert a booking row and its seat rows; the seat unique constraint rejects double sales
+def insert_booking(conn, booking, skip_taken_seats=False):
+    day = show_date(booking)
+    conn.execute(
+        'INSERT INTO bookings (booking_id, reference, user_id, movie_key, time, tickets, total, timestamp, data, show_date) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (booking['booking_id'], booking.get('reference'), booking.get('user_id'), booking['movie_key'],
+         booking['time'], booking['tickets'], booking['total'], booking['timestamp'], json.dumps(booking), day)
+    )
+    verb = 'INSERT OR IGNORE' if skip_taken_seats else 'INSERT'
+    cursor = conn.executemany(
+        f'{verb} INTO booked_seats (show_date, movie_key, time, seat_row, seat_num, booking_id) VALUES (?, ?, ?, ?, ?, ?)',
+        [(day, booking['movie_key'], booking['time'], row, num, booking['booking_id']) for row, num in booking['seats']]
+    )
+    return len(booking['seats']) - cursor.rowcount
+
+# Record a cancellation; one already recorded is left as it is
+def insert_cancellation(conn, record):
+    conn.execute('INSERT OR IGNORE INTO cancellations (booking_id, reference, refund, cancelled_at, data) '
+                 'VALUES (?, ?, ?, ?, ?)',
+                 (record['booking_id'], record.get('reference'), record['refund'], record['cancelled_at'],
+                  json.dumps(record)))
+
+# Write a movie and its showtimes, replacing any earlier version
+def upsert_movie(conn, movie_key, movie):
+    conn.execute('INSERT OR REPLACE INTO movies (movie_key, data) VALUES (?, ?)', (movie_key, json.dumps(movie)))
+    conn.execute('DELETE FROM showtimes WHERE movie_key = ?', (movie_key,))
+    conn.executemany('INSERT INTO showtimes (movie_key, time) VALUES (?, ?)',
+                     [(movie_key, time) for time in movie.get('times', [])])
+
+# Copy movies.json and the JSON booking store (archived days included) into a SQLite
+# database. Bookings already imported are skipped, so it is safe to run again. Seats sold
+# twice in the JSON history are kept on the booking record but only the first sale holds
+# the seat row. Cancellations and their refunds come across too.
+def import_json(db_path=SQLITE_FILE, movies_file=MOVIES_FILE, bookings=None, cancellations=()):
+    if bookings is None:
+        json_repo = BookingRepository()
+        bookings = json_repo.get_all()
+        cancellations = json_repo.get_cancellations()
+        json_repo.close()
+    conn = connect(db_path)
+    movies = Helper.load_json(movies_file, {})
+    imported = 0
+    seat_conflicts = 0
+    with conn:
+        for movie_key, movie in movies.items():
+            upsert_movie(conn, movie_key, movie)
+        existing = {row[0] for row in conn.execute('SELECT booking_id FROM bookings')}
+        for booking in bookings:
+            if booking['booking_id'] in existing:
+                continue
+            seat_conflicts += insert_booking(conn, booking, skip_taken_seats=True)
+            imported += 1
+        for record in cancellations:
+            insert_cancellation(conn, record)
+    conn.close()
+    return {'movies': len(movies), 'bookings': imported, 'seat_conflicts': seat_conflicts}
+
+# MovieRepository stored in the movies and showtimes tables
+class SqliteMovieRepository(MovieRepository):
+    
+    def __init__(self, conn, journal_file=MOVIES_JOURNAL_FILE):
+        self.conn = conn
+        super().__init__(journal_file=journal_file)
+    
+    # Load movies from the database, seeding the default catalogue if it is empty
+    def load(self):
+        rows = self.conn.execute('SELECT movie_key, data FROM movies ORDER BY rowid').fetchall()
+        self.movies = {key: json.loads(data) for key, data in rows}
+        if not self.movies:
+            self.movies = self.get_default_movies()
+            self.save()
+    
+    # Write the whole catalogue in one transaction
+    def save(self):
+        with self.conn:
+            for movie_key, movie in self.movies.items():
+                upsert_movie(self.conn, movie_key, movie)
+            stored = {row[0] for row in self.conn.execute('SELECT movie_key FROM movies')}
+            for movie_key in stored - set(self.movies):
+                self.conn.execute('DELETE FROM movies WHERE movie_key = ?', (movie_key,))
+    
+    def close(self):
+        super().close()
+        self.conn.close()
+
+# BookingRepository stored in the bookings and booked_seats tables. The in-memory
+# indexes and seat inventory are shared with the JSON repository; only persistence differs.
+# Every day stays in the bookings table; only shows from the archive cutoff on are loaded,
+# and history lookups query the table by show date instead of opening archives.
+# Each change also goes into booking_changes in the same transaction, in the journal's
+# record format. SQLite's data_version tells us cheaply when another connection has
+# committed, and the rows after the last one we read are the changes to apply.
+class SqliteBookingRepository(BookingRepository):
+    
+    def __init__(self, conn, seat_map=None):
+        self.conn = conn
+        db_file = conn.execute('PRAGMA database_list').fetchone()[2]
+        self._init_state(seat_map, FileLock(db_file + '.lock') if db_file else threading.Lock(),
+                         IdAllocator(db_file + '.ids' if db_file else None), db_file)
+        self.load()
+    
+    # Read the bookings for current and upcoming shows in ID order, keyed by ID
+    def _load_bookings(self):
+        self._data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        self._change_seq = self.conn.execute('SELECT COALESCE(MAX(seq), 0) FROM booking_changes').fetchone()[0]
+        rows = self.conn.execute('SELECT booking_id, data FROM bookings WHERE show_date >= ? ORDER BY booking_id',
+                                 (self._cutoff,)).fetchall()
+        return {booking_id: json.loads(data) for booking_id, data in rows}
+    
+    # Whether another connection has committed since we last looked
+    def _changed(self):
+        return self.conn.execute('PRAGMA data_version').fetchone()[0] != self._data_version
+    
+    # Change records committed by others since the last one we read, or None if older
+    # rows we hadn't read yet have been pruned
+    def _read_changes(self):
+        self._data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        rows = self.conn.execute('SELECT seq, data FROM booking_changes WHERE seq > ? ORDER BY seq',
+                                 (self._change_seq,)).fetchall()
+        if rows and rows[0][0] != self._change_seq + 1:
+            return None
+        if rows:
+            self._change_seq = rows[-1][0]
+        return [json.loads(data) for _, data in rows]
+    
+    # Add a change record inside the caller's transaction
+    def _log_change(self, record):
+        self._change_seq = self.conn.execute('INSERT INTO booking_changes (data) VALUES (?)',
+                                             (json.dumps(record),)).lastrowid
+    
+    # Highest booking ID in the table, older days included
+    def _high_water(self):
+        return self.conn.execute('SELECT MAX(booking_id) FROM bookings').fetchone()[0] or 0
+    
+    # Older bookings whose field has the given value; field is one of the indexed columns
+    def _history_by(self, field, value):
+        rows = self.conn.execute(f'SELECT data FROM bookings WHERE {field} = ? AND show_date < ? '
+                                 'ORDER BY show_date, booking_id', (value, self._cutoff)).fetchall()
+        return [json.loads(data) for (data,) in rows]
+    
+    # Show date of the older booking with a reference, found through the reference index
+    def _archived_reference_day(self, reference):
+        row = self.conn.execute('SELECT show_date FROM bookings WHERE reference = ? AND show_date < ?',
+                                (reference, self._cutoff)).fetchone()
+        return row[0] if row else None
+    
+    # Bookings for one older show date
+    def _read_archived(self, day):
+        rows = self.conn.execute('SELECT data FROM bookings WHERE show_date = ? ORDER BY booking_id', (day,)).fetchall()
+        return [json.loads(data) for (data,) in rows]
+    
+    # Older bookings for show dates between two dates (or date prefixes), both inclusive
+    def _history_between(self, start_date, end_date):
+        rows = self.conn.execute('SELECT data FROM bookings WHERE show_date >= ? AND show_date <= ? AND show_date < ? '
+                                 'ORDER BY show_date, booking_id', (start_date, end_date + '\uffff', self._cutoff)).fetchall()
+        return [json.loads(data) for (data,) in rows]
+    
+    # Stream older bookings straight from a cursor, one row at a time
+    def _iter_history(self, start_date, end_date, movie_key):
+        query = 'SELECT data FROM bookings WHERE show_date >= ? AND show_date <= ? AND show_date < ?'
+        params = [start_date, end_date + '\uffff', self._cutoff]
+        if movie_key is not None:
+            query += ' AND movie_key = ?'
+            params.append(movie_key)
+        for (data,) in self.conn.execute(query + ' ORDER BY show_date, booking_id', params):
+            yield json.loads(data)
+    
+    # Seats sold and revenue for a movie on older days, totalled by the database. Seats are
+    # counted from each booking's seat list, as the JSON catalog counts them.
+    def _archived_movie_sales(self, movie_key):
+        return self.conn.execute("SELECT COALESCE(SUM(json_array_length(data, '$.seats')), 0), "
+                                 'COALESCE(SUM(total), 0.0) FROM bookings '
+                                 'WHERE movie_key = ? AND show_date < ?', (movie_key, self._cutoff)).fetchone()
+    
+    # The database is the index here, so there is no separate seat snapshot to read
+    def _load_from_index(self):
+        return False
+    
+    # Insert the booking in its own transaction; a seat clash rolls it back
+    def _persist_add(self, booking):
+        try:
+            with self.conn:
+                insert_booking(self.conn, booking)
+                self._log_change({'op': 'add', 'booking': booking})
+        except sqlite3.IntegrityError as e:
+            raise SeatUnavailableError(f"Seats already booked for {booking['movie_key']} at {booking['time']}") from e
+    
+    # Insert the whole batch in one transaction; a seat clash rolls all of it back
+    def _persist_batch(self, bookings):
+        current = 0
+        try:
+            with self.conn:
+                for current, booking in enumerate(bookings):
+                    insert_booking(self.conn, booking)
+                self._log_change({'op': 'add_batch', 'bookings': bookings})
+        except sqlite3.IntegrityError as e:
+            booking = bookings[current]
+            raise BatchBookingError({current: f"Seats already booked for {booking['movie_key']} at {booking['time']}"}) from e
+    
+    # Insert imported older bookings in one transaction. The change record tells other
+    # connections to drop what they worked out from the older days.
+    def _persist_archived(self, by_day):
+        with self.conn:
+            for bookings in by_day.values():
+                for booking in bookings:
+                    insert_booking(self.conn, booking)
+            self._log_change({'op': 'archived', 'days': sorted(by_day)})
+    
+    # Record the cancellation and delete the booking in one transaction; its seat rows go
+    # with it through the foreign key
+    def _persist_cancel(self, booking):
+        record = cancel_record(booking)
+        with self.conn:
+            insert_cancellation(self.conn, record)
+            self.conn.execute('DELETE FROM bookings WHERE booking_id = ?', (booking['booking_id'],))
+            self._log_change(record)
+    
+    # Every cancellation made, with its refund, in the order they were made
+    def get_cancellations(self):
+        rows = self.conn.execute('SELECT data FROM cancellations ORDER BY cancelled_at, booking_id').fetchall()
+        return [json.loads(data) for (data,) in rows]
+    
+    # Every booking is committed as it is added, so compacting only has to move the
+    # archive cutoff on once a day is over
+    def _maybe_compact(self):
+        if archive_cutoff() != self._cutoff:
+            self.compact()
+    
+    # Move the archive cutoff on: bookings for days now over drop out of memory and are
+    # looked up in the table like any other older show
+    def compact(self, durable=False):
+        self._ensure_loaded()
+        with self.change_lock:
+            self._apply_changes()
+            self._cutoff = archive_cutoff()
+            self._forget_catalog()
+            self._drop_archived()
+            # Nobody is between reserving seats and saving a booking now, so clear any
+            # seats a crashed process reserved without saving
+            self.seat_map.reconcile(self.seat_inventory, reuse_before=self._cutoff)
+    
+    # Move the archive cutoff on and prune old change records; other connections are
+    # expected to have read them by now
+    def save(self):
+        self.compact()
+        with self.conn:
+            self.conn.execute('DELETE FROM booking_changes WHERE seq <= ?', (self._change_seq - BOOKING_COMPACT_EVERY,))
+    
+    def close(self):
+        self.conn.close()
+        self.seat_map.close()
+
+# Run with: python -m database.sqlite_store
+if __name__ == "__main__":
+    result = import_json()
+    print(f"Imported {result['movies']} movies and {result['bookings']} bookings into {SQLITE_FILE}")
+    if result['seat_conflicts']:
+        print(f"{result['seat_conflicts']} seat(s) were sold twice in the JSON history and kept only on the first booking")
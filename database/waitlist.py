@@ -0,0 +1,222 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import threading
+from collections import deque
+from datetime import date, datetime
+from config import WAITLIST_FILE, WAITLIST_COMPACT_EVERY, BOOKING_WRITE_POLICY
+from utils.helpers import Helper
+from .booking_journal import BookingJournal
+
+# Waitlist keeps a first-come, first-served queue of users per showtime. The booking
+# repositories tell it whenever a cancellation frees seats, whichever process made it,
+# and it turns the users at the head of the queue into offers that wait until those
+# users next talk to the bot. Every process using the same file shares one waitlist:
+# each join, offer and claimed offer is appended to "<file>.journal" under its lock,
+# after catching up with the records other processes appended, so a change costs one
+# record however long the queues are. Every so often the whole waitlist is written to
+# the file as a snapshot and the journal it covers is trimmed. Each cancellation is
+# offered once, however many repositories report it. With no path the waitlist is
+# kept in memory only.
+class Waitlist:
+    
+    # Load the queues and unclaimed offers saved by the last run
+    def __init__(self, path=WAITLIST_FILE):
+        self.path = path
+        self.journal = BookingJournal(path + '.journal', sync=BOOKING_WRITE_POLICY == 'sync') if path else None
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._waiting = set()
+        self._offers = {}
+        self._released = {}
+        self._compacted_through = 0
+        self.stats = {'joined': 0, 'offered': 0}
+        self.load()
+    
+    # Read the saved waitlist; queues for shows that have already happened are dropped
+    def load(self):
+        if not self.path:
+            return
+        with self._lock, self.journal.lock:
+            self._read_store()
+    
+    # Read the snapshot and replay the journal written after it, with both locks held
+    def _read_store(self):
+        snapshot = Helper.load_json(self.path, {})
+        self._read(snapshot)
+        for record in self.journal.replay(start=snapshot.get('offset', 0)):
+            self._apply(record)
+        self._compacted_through = 0
+    
+    # Take over the on-disk form of the waitlist, leaving out shows that are over
+    def _read(self, data):
+        today = date.today().isoformat()
+        self._queues = {}
+        self._waiting = set()
+        for show_date, movie_key, showtime, entries in data.get('queues', []):
+            if show_date < today or not entries:
+                continue
+            key = (show_date, movie_key, showtime)
+            self._queues[key] = deque(entries)
+            self._waiting.update((key, entry['user_id']) for entry in entries)
+        self._offers = data.get('offers', {})
+        # Cancellations already offered, by booking ID, kept until their show is over
+        self._released = {booking_id: day for booking_id, day in data.get('released', []) if day >= today}
+    
+    # Snapshot of the waitlist in its on-disk form, leaving out shows that are over
+    def to_dict(self):
+        with self._lock:
+            return self._to_dict()
+    
+    def _to_dict(self):
+        today = date.today().isoformat()
+        return {
+            'queues': [[*key, list(entries)] for key, entries in self._queues.items() if entries and key[0] >= today],
+            'offers': {user_id: [offer for offer in offers if offer['show_date'] >= today]
+                       for user_id, offers in self._offers.items()},
+            'released': [[booking_id, day] for booking_id, day in self._released.items() if day >= today]
+        }
+    
+    # Apply one journal record to the queues and offers
+    def _apply(self, record):
+        if record['op'] == 'join':
+            key = tuple(record['key'])
+            entry = record['entry']
+            if (key, entry['user_id']) not in self._waiting:
+                self._waiting.add((key, entry['user_id']))
+                self._queues.setdefault(key, deque()).append(entry)
+        elif record['op'] == 'offer':
+            key = tuple(record['key'])
+            if record['booking_id'] is not None:
+                self._released[record['booking_id']] = key[0]
+            offered = set(record['users'])
+            entries = self._queues.get(key)
+            while entries and entries[0]['user_id'] in offered:
+                entries.popleft()
+            if entries is not None and not entries:
+                del self._queues[key]
+            for user_id in record['users']:
+                self._waiting.discard((key, user_id))
+                self._offers.setdefault(user_id, []).append({
+                    'show_date': key[0],
+                    'movie_key': key[1],
+                    'time': key[2],
+                    'seats': record['seats'],
+                    'offered_at': record['offered_at']
+                })
+        elif record['op'] == 'take':
+            self._offers.pop(record['user_id'], None)
+    
+    # Apply the records other processes have appended, with both locks held. Falls back to
+    # reading the snapshot again if the records needed were trimmed away first.
+    def _apply_changes(self):
+        records = self.journal.read_new()
+        if records is None:
+            self._read_store()
+            return
+        for record in records:
+            self._apply(record)
+    
+    # Catch up with other processes, with _lock held. Costs one read of the journal's
+    # generation when nobody has changed anything.
+    def _catch_up(self):
+        if self.path and self.journal.changed():
+            with self.journal.lock:
+                self._apply_changes()
+    
+    # Work out a change on the latest waitlist and make it durable before anyone else can
+    # change it. make_record() returns the journal record, or None if nothing changes.
+    def _change(self, make_record):
+        with self._lock:
+            if not self.path:
+                record = make_record()
+                if record is not None:
+                    self._apply(record)
+                return record
+            with self.journal.lock:
+                self._apply_changes()
+                record = make_record()
+                if record is not None:
+                    self.journal.append(record)
+                    self._apply(record)
+        if self.journal.total_records - self._compacted_through >= WAITLIST_COMPACT_EVERY:
+            self.compact()
+        return record
+    
+    # Write the whole waitlist as the snapshot and trim the journal records it covers
+    def compact(self):
+        if not self.path:
+            return
+        with self._lock, self.journal.lock:
+            self._apply_changes()
+            offset, count = self.journal.mark()
+            data = dict(self._to_dict(), offset=offset)
+            Helper.save_json(self.path, data)
+            self.journal.trim(offset)
+            self._read(data)
+            self._compacted_through = count
+    
+    # Add a user to the back of a showtime's queue. Returns False if they are already in it.
+    def join(self, key, user_id, tickets):
+        def make_record():
+            if (key, user_id) in self._waiting:
+                return None
+            entry = {'user_id': user_id, 'tickets': tickets, 'joined_at': datetime.now().isoformat()}
+            return {'op': 'join', 'key': list(key), 'entry': entry}
+        joined = self._change(make_record) is not None
+        if joined:
+            self.stats['joined'] += 1
+        return joined
+    
+    # Listener for seats freed at a showtime by cancelling a booking: offer them to users
+    # from the head of the queue until the freed seats are spoken for. A cancellation
+    # already offered, e.g. by another process that saw it first, is ignored.
+    def seats_released(self, key, seats, booking_id=None):
+        if booking_id is not None and booking_id in self._released:
+            return
+        
+        def make_record():
+            if booking_id is not None and booking_id in self._released:
+                return None
+            users = []
+            remaining = len(seats)
+            for entry in self._queues.get(key, ()):
+                if remaining <= 0:
+                    break
+                users.append(entry['user_id'])
+                remaining -= entry['tickets']
+            if not users:
+                return None
+            return {'op': 'offer', 'key': list(key), 'booking_id': booking_id, 'users': users,
+                    'seats': len(seats), 'offered_at': datetime.now().isoformat()}
+        record = self._change(make_record)
+        if record is not None:
+            self.stats['offered'] += len(record['users'])
+    
+    # Hand over and forget a user's offers, leaving out shows that have already happened
+    def take_offers(self, user_id):
+        with self._lock:
+            self._catch_up()
+            if user_id not in self._offers:
+                return []
+        
+        taken = []
+        
+        def make_record():
+            if user_id not in self._offers:
+                return None
+            taken.extend(self._offers[user_id])
+            return {'op': 'take', 'user_id': user_id}
+        self._change(make_record)
+        today = date.today().isoformat()
+        return [offer for offer in taken if offer['show_date'] >= today]
+    
+    # Release the journal's file handles
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+if __name__ == "__main__":
+    pass
+    # print("Waitlist module loaded successfully!")
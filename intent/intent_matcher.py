@@ -4,6 +4,20 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from .intent_classifier import IntentClassifier
 
+REFUND_WORDS = ['cancel', 'refund']
+BOOKING_WORDS = ['booking', 'ticket', 'reservation']
+
+# Is this about cancelling a booking already made? "cancel" or "refund" next to a booking
+# reference, or next to a word for a booking ("cancel my booking", "refund my tickets").
+# Questions about the refund policy are left to the QA intents.
+def is_refund_request(text, reference=None):
+    text_lower = text.lower()
+    if not any(word in text_lower for word in REFUND_WORDS):
+        return False
+    if reference:
+        return True
+    return any(word in text_lower for word in BOOKING_WORDS) and 'policy' not in text_lower
+
 class IntentMatcher:
     
     # Create a matcher that wraps the ML classifier
@@ -38,6 +52,11 @@ class IntentMatcher:
             if text_lower in ['back', 'go back', 'previous', 'undo']:
                 return 'go_back', 1.0
         
+        # The saved intent model was trained before the refund examples, so these are
+        # picked out by keyword
+        if is_refund_request(text, self.classifier.text_processor.extract_reference(text)):
+            return 'refund_booking', 1.0
+        
         return intent, confidence
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 from core import MovieBot
+from utils.write_behind import shutdown_writer
 
 # Print the decorative banner at the start of the program
 def print_banner():
@@ -25,32 +26,41 @@ def main():
     print("\n" + "─" * 60 + "\n")
     
     # Main conversation loop
-    while True:
-        try:
-            user_input = input("You: ").strip()
+    try:
+        while True:
+            try:
+                user_input = input("You: ").strip()
             
-            if not user_input:
-                continue
+                if not user_input:
+                    continue
             
-            response = bot.respond(user_input)
+                response = bot.respond(user_input)
             
-            if response is None:
-                print("\nSavoyBot:", bot.nlg.generator.goodbye())
-                print("\n" + "─" * 60)
-                print("Thank you for using SavoyBot!")
-                print("─" * 60 + "\n")
-                break
+                if response is None:
+                    print("\nSavoyBot:", bot.nlg.generator.goodbye())
+                    print("\n" + "─" * 60)
+                    print("Thank you for using SavoyBot!")
+                    print("─" * 60 + "\n")
+                    break
             
-            print(f"\nSavoyBot: {response}")
-            print("\n" + "─" * 60 + "\n")
+                print(f"\nSavoyBot: {response}")
+                print("\n" + "─" * 60 + "\n")
         
-        except KeyboardInterrupt:
-            print("\n\nSavoyBot:", bot.nlg.generator.goodbye())
-            break
+            except KeyboardInterrupt:
+                print("\n\nSavoyBot:", bot.nlg.generator.goodbye())
+                break
         
-        except Exception as e:
-            print(f"\nSavoyBot: Sorry, an error occurred: {str(e)}")
-            print("Please try again or type 'help' for assistance.\n")
+            except Exception as e:
+                print(f"\nSavoyBot: Sorry, an error occurred: {str(e)}")
+                print("Please try again or type 'help' for assistance.\n")
+    
+    finally:
+        # Drain buffered writes on every exit path, including Ctrl+C. A failed save is
+        # raised rather than lost, but the other buffered writes still go out first.
+        try:
+            bot.close()
+        finally:
+            shutdown_writer()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
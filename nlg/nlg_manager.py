@@ -3,6 +3,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from datetime import datetime
+from config import ALMOST_SOLD_OUT_SEATS
 from .response_generator import ResponseGenerator
 from utils.helpers import Helper
 from utils.ticket_generator import generate_ticket
@@ -27,11 +28,33 @@ class NLGManager:
             ask_name = self.generator.ask_name()
             return f"{welcome}\n{ask_name}"
     
-    # Return a readable list of movies and their key details
-    def movie_list_response(self, movies):
+    # Short note for a showtime with few or no seats left, or '' if plenty remain
+    def availability_badge(self, remaining):
+        if remaining == 0:
+            return "sold out"
+        if remaining <= ALMOST_SOLD_OUT_SEATS:
+            return f"only {remaining} left"
+        return ""
+    
+    # Note for a movie from its showtimes' seats left: sold out only if every showing is
+    # full, almost sold out if any showing is nearly full
+    def movie_badge(self, remaining_by_time):
+        if not remaining_by_time:
+            return ""
+        if not any(remaining_by_time.values()):
+            return "Sold out today"
+        if min(remaining_by_time.values()) <= ALMOST_SOLD_OUT_SEATS:
+            return "Almost sold out"
+        return ""
+    
+    # Return a readable list of movies and their key details. availability maps movie
+    # keys to {time: seats left} and adds a badge to movies that are filling up.
+    def movie_list_response(self, movies, availability=None):
         output = "Currently showing:\n\n"
         for i, (key, movie) in enumerate(movies.items(), 1):
-            output += f"{i}. {movie['title']} ({movie['rating']})\n"
+            badge = self.movie_badge((availability or {}).get(key))
+            output += f"{i}. {movie['title']} ({movie['rating']})"
+            output += f" [{badge}]\n" if badge else "\n"
             output += f"   Genre: {movie['genre'].capitalize()}, Duration: {movie['duration']}\n"
             output += f"   Price: £{movie['price']:.2f}\n"
         output += "\nWhat would you like to know more about?"
@@ -55,13 +78,19 @@ class NLGManager:
         
         return details
     
-    # Intro text when starting a booking flow for a movie
-    def booking_start_response(self, movie):
+    # Intro text when starting a booking flow for a movie. availability maps each time to
+    # the seats left, and marks showings that are nearly or completely full.
+    def booking_start_response(self, movie, availability=None):
         start_msg = self.generator.booking_start(movie['title'])
         ask_time = self.generator.ask_time()
         
+        times = []
+        for time in movie['times']:
+            badge = self.availability_badge(availability[time]) if availability and time in availability else ""
+            times.append(f"{time} ({badge})" if badge else time)
+        
         output = f"{start_msg}\n\n"
-        output += f"Available times: {', '.join(movie['times'])}\n\n"
+        output += f"Available times: {', '.join(times)}\n\n"
         output += ask_time
         
         return output
@@ -128,6 +157,37 @@ class NLGManager:
         how_help = self.generator.how_can_help()
         return f"{cancel_msg}\n\n{how_help}"
     
+    # Tell the user a showtime can't seat their party and offer the waiting list
+    def sold_out_response(self, time, free, num):
+        if free:
+            output = f"Sorry, only {free} seat(s) are left for the {time} showing, and you asked for {num}.\n\n"
+        else:
+            output = f"Sorry, the {time} showing is sold out.\n\n"
+        output += "Would you like to join the waiting list? I'll let you know as soon as seats come free. (yes/no)\n"
+        return output + "Type 'back' to choose a different number of tickets."
+    
+    # Confirm the user is on the waiting list
+    def waitlist_joined_response(self, movie, time, joined):
+        if not joined:
+            return f"You're already on the waiting list for {movie['title']} at {time}. I'll let you know when seats come free."
+        return f"You're on the waiting list for {movie['title']} at {time}. I'll let you know as soon as seats come free."
+    
+    # Tell the user about seats that came free for showtimes they were waiting for
+    def waitlist_offer_message(self, offers):
+        lines = ["Good news from the waiting list!"]
+        for offer in offers:
+            lines.append(f"- {offer['seats']} seat(s) just came free for {offer['title']} at {offer['time']}. "
+                         f"Say 'book {offer['title']}' to grab them.")
+        return "\n".join(lines)
+    
+    # Confirm a stored booking has been cancelled and say what is refunded
+    def refund_message(self, booking):
+        seats_str = Helper.format_seat_list([tuple(s) for s in booking['seats']])
+        output = f"Booking {booking['reference']} for {booking['movie_title']} at {booking['time']} "
+        output += f"(seats {seats_str}) has been cancelled.\n"
+        output += f"£{booking['refund']:.2f} will be refunded to your original payment method.\n\n"
+        return output + self.generator.how_can_help()
+    
     # Explain what the user can do, tailored to booking stage if needed
     def help_message(self, in_booking=False, stage=None):
         if in_booking and stage:
@@ -149,6 +209,7 @@ class NLGManager:
 'book [movie]' - Book tickets
 'what is my name' - I'll tell you your name
 'my bookings' - View booking history
+'cancel BK7QX2M00041' - Cancel a booking and get a refund
 'help' - Show this message
 'quit' - Exit
 
@@ -0,0 +1,88 @@
+import os
+from datetime import date, timedelta
+from database.booking_journal import BookingJournal
+from database.booking_repository import BookingRepository
+
+SHOW_DATE = (date.today() + timedelta(days=30)).isoformat()
+
+# A repository on its own files under tmp_path
+def open_repo(tmp_path):
+    return BookingRepository(str(tmp_path / 'bookings'), str(tmp_path / 'bookings.journal'),
+                             str(tmp_path / 'bookings.index'), str(tmp_path / 'bookings.json'))
+
+def make_booking(user_id, seat):
+    return {'user_id': user_id, 'user_name': user_id, 'movie_key': 'dune2', 'movie_title': 'Dune',
+            'time': '13:00', 'show_date': SHOW_DATE, 'tickets': 1, 'seats': [list(seat)], 'total': 12.5}
+
+# Half a record, as a process that crashed mid-append leaves it
+def tear(path):
+    with open(path, 'ab') as f:
+        f.write(b'0badf00d {"op":"add","boo')
+
+def test_replay_cuts_off_torn_tail(tmp_path):
+    path = str(tmp_path / 'j')
+    journal = BookingJournal(path)
+    journal.append({'n': 1})
+    journal.close()
+    tear(path)
+    
+    journal = BookingJournal(path)
+    assert journal.replay() == [{'n': 1}]
+    assert journal.torn_records == 1
+    journal.close()
+
+def test_append_after_torn_record_survives_replay(tmp_path):
+    path = str(tmp_path / 'j')
+    writer = BookingJournal(path)
+    writer.replay()
+    writer.append({'n': 1})
+    tear(path)
+    # Another process appends after the crash; its record must not land behind the torn bytes
+    other = BookingJournal(path)
+    other.append({'n': 2})
+    writer.append({'n': 3})
+    writer.close()
+    other.close()
+    
+    journal = BookingJournal(path)
+    assert journal.replay() == [{'n': 1}, {'n': 2}, {'n': 3}]
+    journal.close()
+
+def test_booking_after_torn_record_is_kept(tmp_path):
+    repo = open_repo(tmp_path)
+    repo.add(make_booking('u1', ('A', 1)))
+    tear(str(tmp_path / 'bookings.journal'))
+    repo.add(make_booking('u2', ('A', 2)))
+    repo.close()
+    
+    fresh = open_repo(tmp_path)
+    assert sorted(b['user_id'] for b in fresh.get_all()) == ['u1', 'u2']
+    taken = fresh.get_taken_seats('dune2', '13:00', SHOW_DATE)
+    assert taken.is_taken('A', 1) and taken.is_taken('A', 2)
+    fresh.close()
+
+def test_cancellation_outlives_the_journal_trim(tmp_path):
+    repo = open_repo(tmp_path)
+    booking = make_booking('u1', ('A', 1))
+    repo.add(booking)
+    repo.cancel(booking['reference'], refund=10.0)
+    repo.save()
+    repo.close()
+    assert BookingJournal(str(tmp_path / 'bookings.journal')).read_until() == []
+    
+    fresh = open_repo(tmp_path)
+    assert [(c['reference'], c['refund']) for c in fresh.get_cancellations()] == [(booking['reference'], 10.0)]
+    fresh.close()
+
+def test_date_lookups_follow_adds_and_cancels(tmp_path):
+    repo = open_repo(tmp_path)
+    later = (date.today() + timedelta(days=31)).isoformat()
+    first = make_booking('u1', ('A', 1))
+    repo.add(first)
+    repo.add(dict(make_booking('u2', ('A', 2)), show_date=later))
+    assert [b['user_id'] for b in repo.get_by_date_range(SHOW_DATE, later)] == ['u1', 'u2']
+    
+    repo.cancel(first['reference'])
+    assert repo.get_by_date(SHOW_DATE) == []
+    assert [b['user_id'] for b in repo.get_by_date(later[:7])] == ['u2']
+    repo.close()
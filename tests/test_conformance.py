@@ -0,0 +1,13 @@
+import pytest
+from database.backends import BACKENDS
+from database.conformance import CHECKS
+from utils.write_behind import get_writer
+
+# Every conformance check against a new scratch store of every registered backend
+@pytest.mark.parametrize('check', CHECKS, ids=lambda check: check.__name__)
+@pytest.mark.parametrize('backend_name', list(BACKENDS))
+def test_backend_conformance(backend_name, check, tmp_path):
+    try:
+        check(BACKENDS[backend_name].scratch(str(tmp_path)))
+    finally:
+        get_writer().flush()
@@ -0,0 +1,39 @@
+import pytest
+from intent.intent_matcher import IntentMatcher, is_refund_request
+
+# Messages about cancelling a booking already made, with or without its reference
+@pytest.mark.parametrize('text, reference', [
+    ('cancel BK7QX2M00041', 'BK7QX2M00041'),
+    ('refund BK12345 please', 'BK12345'),
+    ('cancel my booking', None),
+    ('refund my tickets', None),
+    ('I want to cancel my reservation', None),
+])
+def test_refund_requests_are_recognised(text, reference):
+    assert is_refund_request(text, reference)
+
+# Policy questions go to QA and anything else to the intent model
+@pytest.mark.parametrize('text', [
+    'what is your refund policy',
+    'can i get a refund',
+    "what's the refund policy for tickets",
+    'show my bookings',
+    'book tickets for dune',
+])
+def test_other_messages_are_left_alone(text):
+    assert not is_refund_request(text)
+
+# The full matcher, where the NLTK data the classifier needs is installed
+@pytest.fixture(scope='module')
+def matcher():
+    try:
+        return IntentMatcher()
+    except LookupError:
+        pytest.skip("NLTK data isn't installed")
+
+def test_cancel_without_reference_routes_to_refund(matcher):
+    assert matcher.get_intent_with_context('cancel my booking', {})[0] == 'refund_booking'
+    assert matcher.get_intent_with_context('refund my tickets', {})[0] == 'refund_booking'
+    # Cancelling the booking being made is still the booking flow's own cancel
+    context = {'booking_state': {'stage': 'seats'}}
+    assert matcher.get_intent_with_context('cancel', context)[0] == 'cancel_booking'
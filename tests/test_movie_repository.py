@@ -0,0 +1,26 @@
+import pytest
+from database.backends import BACKENDS
+
+@pytest.fixture(params=[name for name in BACKENDS if name != 'memory'])
+def backend(request, tmp_path):
+    return BACKENDS[request.param].scratch(str(tmp_path))
+
+def test_journal_keeps_only_the_latest_edits(backend, tmp_path):
+    movies = backend.movies()
+    for price in range(20):
+        movies.update('dune2', {'price': float(price)})
+    journal = str(tmp_path / 'movies.journal')
+    with open(journal, encoding='utf-8') as f:
+        assert len(f.readlines()) == 1
+    movies.close()
+
+def test_reader_behind_the_trim_reloads(backend):
+    reader = backend.movies()
+    writer = backend.movies()
+    writer.update('dune2', {'price': 1.0})
+    writer.delete('joker2')
+    writer.update('dune2', {'price': 2.0})
+    assert reader.get('dune2')['price'] == 2.0
+    assert reader.get('joker2') is None
+    writer.close()
+    reader.close()
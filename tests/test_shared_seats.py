@@ -0,0 +1,75 @@
+import os
+import shutil
+import pytest
+from datetime import date, timedelta
+from database.booking_repository import BookingRepository, SeatUnavailableError
+from database.shared_seats import SharedSeatMap
+
+SHOW_DATE = (date.today() + timedelta(days=30)).isoformat()
+KEY = (SHOW_DATE, 'dune2', '13:00')
+
+@pytest.fixture
+def seat_map_name(tmp_path):
+    name = 'savoy_seats_test_%d' % os.getpid()
+    yield name
+    seat_map = SharedSeatMap(name, lock_path=str(tmp_path / 'seats.lock'))
+    seat_map.unlink()
+    seat_map.close()
+
+# A repository on files under data_dir (tmp_path by default), attached to the shared segment
+def open_repo(tmp_path, name, data_dir=None):
+    data_dir = data_dir or tmp_path
+    seat_map = SharedSeatMap(name, lock_path=str(tmp_path / 'seats.lock'))
+    return BookingRepository(str(data_dir / 'bookings'), str(data_dir / 'bookings.journal'),
+                             str(data_dir / 'bookings.index'), str(data_dir / 'bookings.json'), seat_map=seat_map)
+
+def make_booking(seat):
+    return {'user_id': 'u', 'user_name': 'u', 'movie_key': 'dune2', 'movie_title': 'Dune', 'time': '13:00',
+            'show_date': SHOW_DATE, 'tickets': 1, 'seats': [list(seat)], 'total': 12.5}
+
+def test_seat_reserved_by_crashed_process_is_freed_on_load(tmp_path, seat_map_name):
+    repo = open_repo(tmp_path, seat_map_name)
+    repo.add(make_booking(('A', 1)))
+    # A process that crashed after reserving a seat but before saving its booking
+    assert repo.seat_map.reserve(KEY, [['A', 2]])
+    repo.close()
+    
+    repo = open_repo(tmp_path, seat_map_name)
+    taken = repo.get_taken_seats('dune2', '13:00', SHOW_DATE)
+    assert taken.is_taken('A', 1) and not taken.is_taken('A', 2)
+    repo.add(make_booking(('A', 2)))
+    repo.close()
+
+def test_compaction_frees_seats_without_bookings(tmp_path, seat_map_name):
+    repo = open_repo(tmp_path, seat_map_name)
+    repo.add(make_booking(('A', 1)))
+    assert repo.seat_map.reserve(KEY, [['A', 2]])
+    with pytest.raises(SeatUnavailableError):
+        repo.add(make_booking(('A', 2)))
+    repo.save()
+    repo.add(make_booking(('A', 2)))
+    assert repo.seat_map.reconcile(repo.seat_inventory) == 0
+    repo.close()
+
+def test_reset_data_directory_starts_with_free_seats(tmp_path, seat_map_name):
+    os.makedirs(tmp_path / 'data')
+    repo = open_repo(tmp_path, seat_map_name, tmp_path / 'data')
+    repo.add(make_booking(('A', 1)))
+    repo.close()
+    
+    # Same segment and store, but the bookings it was filled from are gone
+    shutil.rmtree(tmp_path / 'data')
+    os.makedirs(tmp_path / 'data')
+    fresh = open_repo(tmp_path, seat_map_name, tmp_path / 'data')
+    assert not fresh.get_taken_seats('dune2', '13:00', SHOW_DATE).is_taken('A', 1)
+    fresh.close()
+
+def test_second_store_cannot_share_the_map(tmp_path, seat_map_name):
+    os.makedirs(tmp_path / 'other')
+    repo = open_repo(tmp_path, seat_map_name)
+    repo.add(make_booking(('A', 1)))
+    # Reconciling with the other store's bookings would free A1
+    with pytest.raises(RuntimeError):
+        open_repo(tmp_path, seat_map_name, tmp_path / 'other')
+    assert repo.get_taken_seats('dune2', '13:00', SHOW_DATE).is_taken('A', 1)
+    repo.close()
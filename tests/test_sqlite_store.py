@@ -0,0 +1,25 @@
+from datetime import date, timedelta
+from database import sqlite_store
+from database.backends import SqliteBackend
+
+SHOW_DATE = (date.today() + timedelta(days=30)).isoformat()
+
+# Two seats on a booking that records one ticket, as some older imported bookings do
+def make_booking(user_id):
+    return {'user_id': user_id, 'user_name': user_id, 'movie_key': 'dune2', 'movie_title': 'Dune',
+            'time': '13:00', 'show_date': SHOW_DATE, 'tickets': 1, 'seats': [['A', 1], ['A', 2]], 'total': 25.0}
+
+def test_compaction_moves_the_archive_cutoff(tmp_path, monkeypatch):
+    repo = SqliteBackend.scratch(str(tmp_path)).bookings()
+    booking = make_booking('alice')
+    repo.add(booking)
+    before = repo.movie_stats('dune2')
+    
+    # Once the show is over it drops out of memory and is found in the table instead
+    day_after = (date.fromisoformat(SHOW_DATE) + timedelta(days=1)).isoformat()
+    monkeypatch.setattr(sqlite_store, 'archive_cutoff', lambda: day_after)
+    repo.compact()
+    assert repo._cutoff == day_after and not repo.bookings
+    assert [b['booking_id'] for b in repo.get_by_user('alice')] == [booking['booking_id']]
+    assert repo.movie_stats('dune2') == before == {'sold': 2, 'revenue': 25.0}
+    repo.close()
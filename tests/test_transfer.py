@@ -0,0 +1,66 @@
+import os
+import csv
+import json
+import pytest
+from datetime import date, timedelta
+from database import DatabaseManager
+from database.backends import BACKENDS
+from transfer import BOOKING_COLUMNS, import_bookings
+
+PAST_DATE = (date.today() - timedelta(days=60)).isoformat()
+SHOW_DATE = (date.today() + timedelta(days=30)).isoformat()
+
+def make_row(user_name, show_date, seats):
+    return {'user_id': 'alice', 'user_name': user_name, 'movie_key': 'dune2', 'movie_title': 'Dune',
+            'show_date': show_date, 'time': '13:00', 'tickets': len(seats.split()), 'seats': seats, 'total': 12.5}
+
+# A CSV with a past booking whose name has a newline in it, an upcoming booking and a
+# row that has neither a show date nor a timestamp
+def write_csv(path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=BOOKING_COLUMNS)
+        writer.writeheader()
+        writer.writerow(make_row('Alice\nSmith', PAST_DATE, 'A1 A2'))
+        writer.writerow(make_row('Alice', SHOW_DATE, 'B1'))
+        writer.writerow(make_row('Alice', '', 'C1'))
+
+@pytest.fixture(params=list(BACKENDS))
+def db(request, tmp_path):
+    db = DatabaseManager(BACKENDS[request.param].scratch(str(tmp_path)), shared_seats=False)
+    yield db
+    db.close()
+
+# Import the whole file as CSV in chunks of ten
+def run_import(db, path, restart=False):
+    return import_bookings(db, path, 'csv', 10, '', '\uffff', None, restart)
+
+def test_past_bookings_go_to_the_archive(db, tmp_path):
+    path = str(tmp_path / 'in.csv')
+    write_csv(path)
+    result = run_import(db, path)
+    assert (result['imported'], result['rejected']) == (2, 1)
+    
+    past = list(db.iter_bookings(PAST_DATE, PAST_DATE))
+    assert [(b['user_name'], b['seats']) for b in past] == [('Alice\nSmith', [['A', 1], ['A', 2]])]
+    with open(path + '.rejects.jsonl', encoding='utf-8') as f:
+        assert json.loads(f.readline())['booking']['seats'] == 'C1'
+
+def test_import_run_again_adds_nothing(db, tmp_path):
+    path = str(tmp_path / 'in.csv')
+    write_csv(path)
+    run_import(db, path)
+    result = run_import(db, path, restart=True)
+    assert (result['imported'], result['duplicates']) == (0, 2)
+    assert len(list(db.iter_bookings())) == 2
+
+def test_corrupt_jsonl_line_is_rejected(db, tmp_path):
+    path = str(tmp_path / 'in.jsonl')
+    good = dict(make_row('Alice', SHOW_DATE, 'B1'), seats=[['B', 1]])
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"user_id": "bob", "movie_key": \n')
+        f.write(json.dumps(good) + '\n')
+    result = import_bookings(db, path, 'jsonl', 10, '', '\uffff', None, False)
+    assert (result['imported'], result['rejected']) == (1, 1)
+    assert not os.path.exists(path + '.progress')
+    with open(path + '.rejects.jsonl', encoding='utf-8') as f:
+        assert json.loads(f.readline())['booking'] == '{"user_id": "bob", "movie_key": '
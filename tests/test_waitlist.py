@@ -0,0 +1,91 @@
+import os
+from datetime import date, timedelta
+from database import DatabaseManager
+from database.backends import JsonBackend
+from database import waitlist as waitlist_module
+from database.waitlist import Waitlist
+
+SHOW_DATE = (date.today() + timedelta(days=30)).isoformat()
+KEY = (SHOW_DATE, 'dune2', '13:00')
+
+def make_booking(user_id, seat):
+    return {'user_id': user_id, 'user_name': user_id, 'movie_key': 'dune2', 'movie_title': 'Dune',
+            'time': '13:00', 'show_date': SHOW_DATE, 'tickets': 1, 'seats': [list(seat)], 'total': 12.5}
+
+# A manager with its own backend, as a separate bot process would have
+def open_manager(tmp_path):
+    return DatabaseManager(JsonBackend(str(tmp_path)), shared_seats=False)
+
+def test_offer_reaches_user_waiting_in_another_process(tmp_path):
+    waiting, cancelling = open_manager(tmp_path), open_manager(tmp_path)
+    booking = make_booking('alice', ('A', 1))
+    cancelling.add_booking(booking)
+    assert waiting.join_waitlist('bob', 'dune2', '13:00', 1, SHOW_DATE)
+    cancelling.cancel_booking(booking['reference'])
+    
+    assert [o['movie_key'] for o in waiting.take_waitlist_offers('bob')] == ['dune2']
+    assert cancelling.take_waitlist_offers('bob') == []
+    waiting.close()
+    cancelling.close()
+
+def test_cancel_without_waitlist_is_offered_once(tmp_path):
+    first, second = open_manager(tmp_path), open_manager(tmp_path)
+    first.join_waitlist('bob', 'dune2', '13:00', 1, SHOW_DATE)
+    first.join_waitlist('carol', 'dune2', '13:00', 1, SHOW_DATE)
+    # A repository nobody listens to, as an admin script would use
+    repo = JsonBackend(str(tmp_path)).bookings()
+    booking = make_booking('alice', ('A', 1))
+    repo.add(booking)
+    repo.cancel(booking['reference'])
+    repo.close()
+    
+    # Both managers see the cancellation, but only one seat came free
+    second.refresh()
+    assert len(first.take_waitlist_offers('bob')) == 1
+    assert second.take_waitlist_offers('carol') == []
+    first.close()
+    second.close()
+
+def test_concurrent_joins_are_merged(tmp_path):
+    path = str(tmp_path / 'waitlist.json')
+    one, two = Waitlist(path), Waitlist(path)
+    assert one.join(KEY, 'bob', 1)
+    assert two.join(KEY, 'carol', 2)
+    assert not one.join(KEY, 'carol', 2)
+    assert [entry['user_id'] for entry in Waitlist(path).to_dict()['queues'][0][3]] == ['bob', 'carol']
+
+def test_releasing_a_hold_makes_no_offer(tmp_path):
+    db = open_manager(tmp_path)
+    token, _ = db.hold_seats('dune2', '13:00', [['A', 1]], SHOW_DATE)
+    db.join_waitlist('bob', 'dune2', '13:00', 1, SHOW_DATE)
+    db.release_hold('dune2', '13:00', [['A', 1]], token, SHOW_DATE)
+    assert db.take_waitlist_offers('bob') == []
+    db.close()
+
+def test_changes_are_journaled_and_compacted(tmp_path, monkeypatch):
+    path = str(tmp_path / 'waitlist.json')
+    waitlist = Waitlist(path)
+    assert waitlist.join(KEY, 'bob', 1)
+    # A join is one journal record; the file holding the whole waitlist isn't rewritten
+    assert not os.path.exists(path)
+    waitlist.seats_released(KEY, [['A', 1]], booking_id=7)
+    assert Waitlist(path).to_dict()['offers']['bob'][0]['movie_key'] == 'dune2'
+    
+    monkeypatch.setattr(waitlist_module, 'WAITLIST_COMPACT_EVERY', 2)
+    waitlist.join(KEY, 'carol', 1)
+    assert waitlist.journal.read_until() == []
+    reopened = Waitlist(path)
+    assert [entry['user_id'] for entry in reopened.to_dict()['queues'][0][3]] == ['carol']
+    assert [offer['time'] for offer in reopened.take_offers('bob')] == ['13:00']
+    # The same cancellation reported again isn't offered to carol
+    reopened.seats_released(KEY, [['A', 1]], booking_id=7)
+    assert reopened.take_offers('carol') == []
+    waitlist.close()
+    reopened.close()
+
+def test_cancellation_with_nobody_waiting_writes_nothing(tmp_path):
+    waitlist = Waitlist(str(tmp_path / 'waitlist.json'))
+    waitlist.seats_released(KEY, [['A', 1]], booking_id=1)
+    assert waitlist.journal.read_until() == []
+    assert waitlist.to_dict()['released'] == []
+    waitlist.close()
@@ -0,0 +1,37 @@
+import threading
+import pytest
+from utils.write_behind import WriteBehindWriter
+
+def failing_write(key, data):
+    raise OSError("disk full")
+
+def test_durable_write_failure_is_raised():
+    writer = WriteBehindWriter(flush_interval_ms=10_000)
+    with pytest.raises(OSError):
+        writer.submit('key', {'n': 1}, durable=True, write=failing_write)
+    assert writer.stats['errors'] == 1
+    writer.close()
+
+def test_flush_failure_is_raised_after_other_writes():
+    written = []
+    writer = WriteBehindWriter(flush_interval_ms=10_000)
+    writer.submit('bad', {'n': 1}, write=failing_write)
+    writer.submit('good', {'n': 2}, write=lambda key, data: written.append(key))
+    with pytest.raises(OSError):
+        writer.flush()
+    assert written == ['good']
+    writer.close()
+
+def test_data_stays_visible_while_being_written():
+    started, finish = threading.Event(), threading.Event()
+    
+    def slow_write(key, data):
+        started.set()
+        finish.wait(5)
+    writer = WriteBehindWriter(flush_interval_ms=0)
+    writer.submit('key', {'n': 1}, write=slow_write)
+    assert started.wait(5)
+    assert writer.get_pending('key') == {'n': 1}
+    finish.set()
+    writer.close()
+    assert writer.get_pending('key') is None
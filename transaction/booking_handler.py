@@ -2,10 +2,12 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from config import SEATS_PER_ROW, ROWS, MAX_TICKETS, MIN_TICKETS
+from datetime import datetime, timedelta
+from config import SEATS_PER_ROW, ROWS, MAX_TICKETS, MIN_TICKETS, REFUND_CUTOFF_HOURS
 from utils.text_processor import TextProcessor
 from utils.validators import Validator
-from utils.helpers import Helper
+from database.booking_repository import SeatUnavailableError, BatchBookingError
+from database.booking_partitions import show_date
 
 class BookingHandler:
     # Set up helpers for working with bookings and user input
@@ -41,7 +43,7 @@ class BookingHandler:
         
         return num, None
     
-    # Build a simple ASCII seating chart showing taken and free seats
+    # Build a simple ASCII seating chart showing taken, held and free seats
     def show_seat_map(self, movie_key, showtime):
         taken = self.db.get_taken_seats(movie_key, showtime)
         
@@ -51,16 +53,18 @@ class BookingHandler:
         for row in ROWS:
             output += f"{row}  "
             for seat_num in range(1, SEATS_PER_ROW + 1):
-                if (row, seat_num) in taken:
+                if taken.is_taken(row, seat_num):
                     output += " X "
+                elif taken.is_held(row, seat_num):
+                    output += " H "
                 else:
                     output += " O "
             output += "\n"
         
-        output += "\nO = Available  X = Taken"
+        output += "\nO = Available  X = Taken  H = Held by another customer"
         return output
     
-    # Validate each selected seat against rules and taken seats
+    # Validate each selected seat against rules and the seats taken right now (in any bot process)
     def validate_seats(self, seat_input, movie_key, showtime, num_tickets):
         seats = self.text_processor.parse_seats(seat_input)
         
@@ -78,10 +82,14 @@ class BookingHandler:
                 errors.append(f"{row}{seat_num} ({error})")
                 continue
             
-            if (row, seat_num) in taken:
+            if taken.is_taken(row, seat_num):
                 errors.append(f"{row}{seat_num} (taken)")
                 continue
             
+            if taken.is_held(row, seat_num):
+                errors.append(f"{row}{seat_num} (held by another customer)")
+                continue
+            
             if (row, seat_num) in selected:
                 errors.append(f"{row}{seat_num} (duplicate)")
                 continue
@@ -99,12 +107,24 @@ class BookingHandler:
         
         return selected, None
     
-    # Create and store a booking record, returning its reference
-    def confirm(self, user_id, user_name, movie_key, time, tickets, seats, total):
-        ref = Helper.generate_reference()
-        
+    # Hold validated seats while the user confirms, returning (hold, error). The hold is a
+    # [token, expires_at] pair to keep in the booking state.
+    def hold_seats(self, movie_key, showtime, seats):
+        hold = self.db.hold_seats(movie_key, showtime, seats)
+        if hold is None:
+            return None, "Sorry, someone else has just picked one of those seats. Please choose again."
+        return list(hold), None
+    
+    # Release the user's hold on their seats, if they have one
+    def release_hold(self, movie_key, showtime, seats, hold):
+        if hold:
+            self.db.release_hold(movie_key, showtime, seats, hold[0])
+    
+    # Create and store a booking record, returning the reference the store gave it. The
+    # seats are reserved atomically as the booking is saved, so if someone else took one
+    # since validate_seats (say the hold ran out) this returns an error instead.
+    def confirm(self, user_id, user_name, movie_key, time, tickets, seats, total, hold=None):
         booking_data = {
-            'reference': ref,
             'user_id': user_id,
             'user_name': user_name,
             'movie_key': movie_key,
@@ -115,9 +135,85 @@ class BookingHandler:
             'total': total
         }
         
-        self.db.add_booking(booking_data)
+        try:
+            self.db.add_booking(booking_data, hold[0] if hold else 0)
+        except SeatUnavailableError:
+            return None, "Sorry, someone else has just booked one of those seats. Please choose again."
+        
+        return booking_data['reference'], None
+    
+    # Create and store a batch of bookings (e.g. a group or box-office sale) all at once.
+    # Each order has user_id, user_name, movie_key, time, seats as (row, number) pairs and
+    # total, plus an optional show_date. Returns (references, None), or (None, failures)
+    # mapping the index of each order that can't be booked to the reason; in that case
+    # none of the orders are booked.
+    def confirm_many(self, orders):
+        failures = {}
+        bookings = []
+        for i, order in enumerate(orders):
+            movie = self.db.get_movie(order['movie_key'])
+            seats = [(row, seat_num) for row, seat_num in order['seats']]
+            if not movie:
+                failures[i] = "Sorry, that movie isn't available."
+            elif order['time'] not in movie['times']:
+                failures[i] = f"That time isn't available. Choose from: {', '.join(movie['times'])}"
+            elif not seats:
+                failures[i] = "No seats given."
+            else:
+                problems = []
+                for row, seat_num in seats:
+                    is_valid, error = self.validator.validate_seat(row, seat_num)
+                    if not is_valid:
+                        problems.append(f"{row}{seat_num} ({error})")
+                if len(set(seats)) != len(seats):
+                    problems.append("the same seat is listed twice")
+                if problems:
+                    failures[i] = f"Problems: {', '.join(problems)}"
+            if i in failures:
+                continue
+            
+            booking = {
+                'user_id': order['user_id'],
+                'user_name': order['user_name'],
+                'movie_key': order['movie_key'],
+                'movie_title': movie['title'],
+                'time': order['time'],
+                'tickets': len(seats),
+                'seats': [[row, seat_num] for row, seat_num in seats],
+                'total': order['total']
+            }
+            if order.get('show_date'):
+                booking['show_date'] = order['show_date']
+            bookings.append(booking)
+        
+        if failures:
+            return None, failures
+        
+        try:
+            self.db.add_bookings(bookings)
+        except BatchBookingError as e:
+            return None, {i: "Sorry, one or more of those seats is already booked." for i in e.failures}
+        
+        return [booking['reference'] for booking in bookings], None
+    
+    # Cancel one of the user's bookings by reference with a full refund, as long as the
+    # show is more than REFUND_CUTOFF_HOURS away. Returns (cancelled booking, error).
+    def cancel(self, user_id, reference):
+        booking = self.db.get_booking_by_reference(reference)
+        if not booking or booking.get('user_id') != user_id:
+            return None, f"I couldn't find a booking with reference {reference} for you. Type 'my bookings' to see them."
+        
+        starts_at = datetime.fromisoformat(f"{show_date(booking)}T{booking['time']}")
+        if starts_at - datetime.now() < timedelta(hours=REFUND_CUTOFF_HOURS):
+            return None, f"Sorry, bookings can only be cancelled up to {REFUND_CUTOFF_HOURS} hours before the showing."
         
-        return ref
+        try:
+            cancelled = self.db.cancel_booking(reference, refund=booking['total'])
+        except ValueError:
+            cancelled = None
+        if cancelled is None:
+            return None, f"Booking {reference} has already been cancelled."
+        return cancelled, None
 
 if __name__ == "__main__":
     print("BookingHandler module loaded successfully!")
\ No newline at end of file
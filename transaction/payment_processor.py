@@ -8,6 +8,10 @@ class PaymentProcessor:
     def process(self, amount, payment_method='card'):
         return True, f"Payment of £{amount:.2f} processed successfully via {payment_method}"
     
+    # Simulate refunding an amount to the original payment method
+    def refund(self, amount, payment_method='card'):
+        return True, f"Refund of £{amount:.2f} issued to your {payment_method}"
+    
     # Check that the chosen payment method is allowed
     def validate_payment_method(self, method):
         valid_methods = ['card', 'cash', 'mobile']
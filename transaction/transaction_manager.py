@@ -32,13 +32,44 @@ class TransactionManager:
     def validate_seats(self, seat_input, movie_key, showtime, num_tickets):
         return self.booking_handler.validate_seats(seat_input, movie_key, showtime, num_tickets)
     
+    # Hold validated seats while the user confirms
+    def hold_seats(self, movie_key, showtime, seats):
+        return self.booking_handler.hold_seats(movie_key, showtime, seats)
+    
+    # Let go of held seats on cancel or going back
+    def release_hold(self, movie_key, showtime, seats, hold):
+        return self.booking_handler.release_hold(movie_key, showtime, seats, hold)
+    
+    # Put the user on the waiting list for a full showtime
+    def join_waitlist(self, user_id, movie_key, showtime, tickets):
+        return self.db.join_waitlist(user_id, movie_key, showtime, tickets)
+    
     # Work out the total cost for the booking
     def calculate_total(self, movie, num_tickets):
         return self.payment_processor.calculate_total(movie, num_tickets)
     
-    # Confirm and store a booking in the database
-    def confirm_booking(self, user_id, user_name, movie_key, time, tickets, seats, total):
-        return self.booking_handler.confirm(user_id, user_name, movie_key, time, tickets, seats, total)
+    # Confirm and store a booking in the database, returning (reference, error)
+    def confirm_booking(self, user_id, user_name, movie_key, time, tickets, seats, total, hold=None):
+        return self.booking_handler.confirm(user_id, user_name, movie_key, time, tickets, seats, total, hold)
+    
+    # Confirm a batch of bookings together, pricing any order that has no total yet.
+    # Returns (references, None) or (None, {order index: error}) with nothing booked.
+    def confirm_bookings(self, orders):
+        priced = []
+        for order in orders:
+            if 'total' not in order:
+                movie = self.db.get_movie(order['movie_key'])
+                order = dict(order, total=self.calculate_total(movie, len(order['seats'])) if movie else 0.0)
+            priced.append(order)
+        return self.booking_handler.confirm_many(priced)
+    
+    # Cancel a stored booking and refund it, returning (cancelled booking, error)
+    def cancel_booking(self, user_id, reference):
+        booking, error = self.booking_handler.cancel(user_id, reference)
+        if error:
+            return None, error
+        self.payment_processor.refund(booking['refund'])
+        return booking, None
     
     # Run the payment step using the payment processor
     def process_payment(self, amount, payment_method='card'):
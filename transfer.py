@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# Stream bookings and user contexts to and from JSONL or CSV files.
+#
+#   python transfer.py export bookings out.csv --from 2025-12-01 --to 2025-12-31 --movie superman
+#   python transfer.py import bookings in.jsonl
+#   python transfer.py export contexts contexts.jsonl
+#
+# Records flow through generators one at a time, so memory use doesn't grow with the
+# file. Imports commit in chunks and save their position after each one in
+# "<file>.progress"; running the same import again carries on from there. Bookings for
+# shows before the archive cutoff go straight into the archive. Bookings that can't be
+# read, or whose seats are already taken, are written to "<file>.rejects.jsonl" with the
+# reason. A booking already in the store, found by its reference or, without one, by its
+# show, seats and user, is counted as a duplicate, so a chunk imported again after a
+# crash isn't added twice.
+
+import os
+import re
+import csv
+import json
+import argparse
+from itertools import islice
+
+from database import DatabaseManager, BatchBookingError, open_backend
+from database.booking_partitions import show_date
+from database.booking_repository import archive_cutoff
+from context.models import UserContext
+from utils.helpers import Helper
+from utils.write_behind import shutdown_writer
+
+BOOKING_COLUMNS = ['booking_id', 'reference', 'user_id', 'user_name', 'movie_key', 'movie_title',
+                   'show_date', 'time', 'tickets', 'seats', 'total', 'timestamp']
+# Fields an imported booking can't do without (as well as a show date or timestamp)
+REQUIRED_BOOKING_FIELDS = ['movie_key', 'time', 'tickets', 'seats', 'total']
+# Nested context fields are written to CSV as JSON; anything outside these columns
+# only survives a JSONL export
+CONTEXT_COLUMNS = ['user_id', 'name', 'last_mentioned_movie', 'awaiting_confirmation',
+                   'session_start', 'last_active', 'preferences', 'booking_state']
+CONTEXT_JSON_COLUMNS = {'preferences', 'booking_state', 'awaiting_confirmation'}
+SEAT_PATTERN = re.compile(r'([A-Z])(\d+)')
+
+# Work out the file format from an explicit choice or the file extension
+def file_format(path, chosen=None):
+    if chosen:
+        return chosen
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+# Flatten a booking into a CSV row; seats become "A1 A2"
+def booking_to_row(booking):
+    row = {column: booking.get(column, '') for column in BOOKING_COLUMNS}
+    row['show_date'] = show_date(booking)
+    row['seats'] = ' '.join(f"{seat_row}{seat_num}" for seat_row, seat_num in booking['seats'])
+    return row
+
+# Turn a CSV row back into a booking
+def row_to_booking(row):
+    booking = {column: value for column, value in row.items() if column is not None and value not in ('', None)}
+    booking['tickets'] = int(booking['tickets'])
+    booking['total'] = float(booking['total'])
+    booking['seats'] = [[seat_row, int(seat_num)] for seat_row, seat_num in SEAT_PATTERN.findall(row['seats'])]
+    if 'booking_id' in booking:
+        booking['booking_id'] = int(booking['booking_id'])
+    return booking
+
+# Flatten a context into a CSV row
+def context_to_row(context):
+    data = context.to_dict()
+    return {column: json.dumps(data.get(column)) if column in CONTEXT_JSON_COLUMNS else data.get(column) or ''
+            for column in CONTEXT_COLUMNS}
+
+# Turn a CSV row back into a context dictionary
+def row_to_context(row):
+    return {column: json.loads(value) if column in CONTEXT_JSON_COLUMNS else value or None
+            for column, value in row.items()}
+
+# Write records to a file as they arrive, replacing it only once every record is written.
+# Returns the number of records written.
+def write_records(path, records, fmt, to_row):
+    temp_path = path + '.tmp'
+    count = 0
+    with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            columns = BOOKING_COLUMNS if to_row is booking_to_row else CONTEXT_COLUMNS
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for record in records:
+                writer.writerow(to_row(record))
+                count += 1
+        else:
+            for record in records:
+                f.write(json.dumps(record if to_row is booking_to_row else record.to_dict(),
+                                   separators=(',', ':'), ensure_ascii=False) + '\n')
+                count += 1
+    os.replace(temp_path, path)
+    return count
+
+# A JSONL line that isn't valid JSON, handed on so the import can reject it and carry on
+class UnreadableRecord:
+
+    # Keep the line as it was read and why it couldn't be parsed
+    def __init__(self, text, error):
+        self.text = text
+        self.error = error
+
+# Read records from a file starting at a byte offset, yielding (offset after the record,
+# record). CSV rows come back as dicts of the strings in the file; a quoted field may run
+# over several lines. A JSONL line that can't be parsed comes back as an UnreadableRecord.
+# Lines are read as bytes so the offset can be saved and resumed from exactly.
+def read_records(path, fmt, offset=0):
+    with open(path, 'rb') as f:
+        header = None
+        if fmt == 'csv':
+            header_line = f.readline()
+            header = next(csv.reader([header_line.decode('utf-8')]))
+            offset = max(offset, len(header_line))
+        f.seek(offset)
+
+        # The lines after the offset, counting the bytes handed out
+        def lines():
+            nonlocal offset
+            for line in f:
+                offset += len(line)
+                yield line.decode('utf-8')
+
+        if fmt == 'csv':
+            for row in csv.DictReader(lines(), fieldnames=header):
+                yield offset, row
+        else:
+            for text in lines():
+                if not text.strip():
+                    continue
+                try:
+                    yield offset, json.loads(text)
+                except ValueError as e:
+                    yield offset, UnreadableRecord(text.rstrip('\n'), e)
+
+# Turn an imported record into a booking with its show date filled in. Older bookings
+# have no show date and are for the day they were made. Raises KeyError, ValueError or
+# TypeError for a record that isn't a usable booking.
+def parse_booking(record, fmt):
+    if isinstance(record, UnreadableRecord):
+        raise record.error
+    booking = row_to_booking(record) if fmt == 'csv' else dict(record)
+    missing = [field for field in REQUIRED_BOOKING_FIELDS if field not in booking]
+    if missing:
+        raise KeyError(', '.join(missing))
+    booking['show_date'] = show_date(booking)
+    if not isinstance(booking['show_date'], str):
+        raise TypeError(f"show date {booking['show_date']!r} isn't a date")
+    return booking
+
+# Does the booking's show date and movie match the filters?
+def booking_matches(booking, start_date, end_date, movie_key):
+    return start_date <= booking['show_date'] <= end_date + '\uffff' and movie_key in (None, booking['movie_key'])
+
+# Group records into lists of up to size
+def chunked(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+# Load the saved position of an interrupted import, or start from the top
+def load_progress(path, restart):
+    progress_file = path + '.progress'
+    if restart and os.path.exists(progress_file):
+        os.remove(progress_file)
+    return Helper.load_json(progress_file, {'offset': 0, 'imported': 0, 'duplicates': 0, 'rejected': 0})
+
+# Is this booking already in the store? Returns (True, None) for one imported before,
+# (False, reason) for a clashing reference, and (False, None) for a new booking.
+def check_reference(db, booking):
+    reference = booking.get('reference')
+    existing = db.get_booking_by_reference(reference) if reference else None
+    if existing is None:
+        return False, None
+    same = ((show_date(existing), existing['movie_key'], existing['time'], existing['seats'])
+            == (show_date(booking), booking['movie_key'], booking['time'], booking['seats']))
+    return (True, None) if same else (False, f"Reference {reference} is already used by another booking")
+
+# Is a booking for the same show, seats and user already in the store? A booking imported
+# without a reference gets a new one, so this is how it is recognised the second time.
+def already_imported(db, booking):
+    day = booking['show_date']
+    wanted = (day, booking['time'], booking['seats'], booking.get('user_id'))
+    return any((show_date(existing), existing['time'], existing['seats'], existing.get('user_id')) == wanted
+               for existing in db.iter_bookings(day, day, booking['movie_key']))
+
+# Import bookings in chunks. Each chunk is committed with one batch write, older shows
+# going into the archive and the rest added as new bookings: bookings already imported
+# are skipped, and bookings that can't be read or whose seats are taken (in the store or
+# earlier in the chunk) are rejected, the rest of the chunk going ahead without them.
+def import_bookings(db, path, fmt, chunk_size, start_date, end_date, movie_key, restart):
+    progress = load_progress(path, restart)
+    records = read_records(path, fmt, progress['offset'])
+    with open(path + '.rejects.jsonl', 'a', encoding='utf-8') as rejects:
+
+        # Write a booking that won't be imported to the rejects file with the reason
+        def reject(reason, booking):
+            rejects.write(json.dumps({'reason': reason, 'booking': booking}) + '\n')
+            progress['rejected'] += 1
+
+        for chunk in chunked(records, chunk_size):
+            cutoff = archive_cutoff()
+            archived, current = [], []
+            for _, record in chunk:
+                try:
+                    booking = parse_booking(record, fmt)
+                except (KeyError, ValueError, TypeError) as e:
+                    reject(f"Can't read booking: {e!r}", record.text if isinstance(record, UnreadableRecord) else record)
+                    continue
+                if not booking_matches(booking, start_date, end_date, movie_key):
+                    continue
+                duplicate, reason = check_reference(db, booking)
+                if duplicate:
+                    progress['duplicates'] += 1
+                elif reason:
+                    reject(reason, booking)
+                else:
+                    booking.pop('booking_id', None)
+                    (archived if booking['show_date'] < cutoff else current).append(booking)
+
+            # Drop the bookings the seat check turns down and commit the rest. A clash with
+            # the same booking imported before counts as a duplicate.
+            for batch, add in ((archived, db.import_archived_bookings), (current, db.add_bookings)):
+                while batch:
+                    try:
+                        add(batch)
+                        progress['imported'] += len(batch)
+                        break
+                    except BatchBookingError as e:
+                        for i in sorted(e.failures, reverse=True):
+                            booking = batch.pop(i)
+                            if already_imported(db, booking):
+                                progress['duplicates'] += 1
+                            else:
+                                reject(e.failures[i], booking)
+
+            rejects.flush()
+            progress['offset'] = chunk[-1][0]
+            Helper.save_json(path + '.progress', progress)
+
+    os.remove(path + '.progress')
+    return progress
+
+# Import contexts in chunks, saving the position after each chunk is written. Lines that
+# can't be parsed are counted and skipped.
+def import_contexts(store, path, fmt, chunk_size, restart):
+    progress = load_progress(path, restart)
+    records = read_records(path, fmt, progress['offset'])
+    for chunk in chunked(records, chunk_size):
+        for _, data in chunk:
+            if isinstance(data, UnreadableRecord):
+                progress['rejected'] += 1
+                continue
+            if fmt == 'csv':
+                data = row_to_context(data)
+            store.save_context(data['user_id'], UserContext.from_dict(data))
+            progress['imported'] += 1
+        store.writer.flush()
+        progress['offset'] = chunk[-1][0]
+        Helper.save_json(path + '.progress', progress)
+
+    os.remove(path + '.progress')
+    return progress
+
+# Parse the command line and run one export or import
+def main():
+    parser = argparse.ArgumentParser(description="Export or import SavoyBot bookings and contexts")
+    parser.add_argument('action', choices=['export', 'import'])
+    parser.add_argument('kind', choices=['bookings', 'contexts'])
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="default: from the file extension")
+    parser.add_argument('--from', dest='start_date', default='', help="first show date (YYYY-MM-DD or a prefix)")
+    parser.add_argument('--to', dest='end_date', default='\uffff', help="last show date (YYYY-MM-DD or a prefix)")
+    parser.add_argument('--movie', help="only this movie key")
+    parser.add_argument('--chunk', type=int, default=500, help="records committed per import step")
+    parser.add_argument('--restart', action='store_true', help="ignore saved progress and import from the top")
+    args = parser.parse_args()
+    fmt = file_format(args.path, args.format)
+
+    if args.kind == 'bookings':
+        db = DatabaseManager()
+        if args.action == 'export':
+            bookings = db.iter_bookings(args.start_date, args.end_date, args.movie)
+            print(f"Exported {write_records(args.path, bookings, fmt, booking_to_row)} bookings to {args.path}")
+        else:
+            result = import_bookings(db, args.path, fmt, args.chunk, args.start_date, args.end_date,
+                                     args.movie, args.restart)
+            print(f"Imported {result['imported']} bookings, skipped {result['duplicates']} already imported, "
+                  f"rejected {result['rejected']} (see {args.path}.rejects.jsonl)")
+        db.close()
+    else:
+        store = open_backend().contexts()
+        if args.action == 'export':
+            contexts = (context for _, context in store.iter_contexts())
+            print(f"Exported {write_records(args.path, contexts, fmt, context_to_row)} contexts to {args.path}")
+        else:
+            result = import_contexts(store, args.path, fmt, args.chunk, args.restart)
+            print(f"Imported {result['imported']} contexts, skipped {result['rejected']} unreadable lines")
+    shutdown_writer()
+
+if __name__ == "__main__":
+    main()
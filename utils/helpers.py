@@ -1,25 +1,121 @@
 import json
+import gzip
+import tempfile
 from datetime import datetime
-import random
+import secrets
 import sys
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import STORAGE_FORMAT
+
+# Crockford's base 32: digits and capitals without I, L, O and U, so references read aloud
+# or typed back aren't misread
+REFERENCE_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+REFERENCE_RANDOM_CHARS = 5
+REFERENCE_ID_CHARS = 5
+
+# Plain JSON encoding; indent=None gives the compact form with no whitespace
+class JsonSerializer:
+    magic = None
+    
+    def __init__(self, indent=None):
+        self.indent = indent
+        self.separators = None if indent else (',', ':')
+    
+    # Encode data to bytes
+    def dumps(self, data):
+        return json.dumps(data, indent=self.indent, separators=self.separators).encode('utf-8')
+    
+    # Decode bytes back to data
+    def loads(self, raw):
+        return json.loads(raw.decode('utf-8'))
+
+# Compact JSON compressed with gzip, recognised on load by the gzip header
+class GzipJsonSerializer(JsonSerializer):
+    magic = b'\x1f\x8b'
+    
+    def __init__(self, level=6):
+        super().__init__()
+        self.level = level
+    
+    def dumps(self, data):
+        return gzip.compress(super().dumps(data), compresslevel=self.level, mtime=0)
+    
+    def loads(self, raw):
+        return super().loads(gzip.decompress(raw))
+
+# Registered snapshot formats; STORAGE_FORMAT in config picks the one used for saving
+SERIALIZERS = {
+    'pretty': JsonSerializer(indent=2),
+    'compact': JsonSerializer(),
+    'gzip': GzipJsonSerializer(),
+}
+
 class Helper:
     
-    # Load JSON from a file path, falling back to a default on error
+    # Add a serializer under a name so it can be chosen for saving and detected on load
+    @staticmethod
+    def register_serializer(name, serializer):
+        SERIALIZERS[name] = serializer
+    
+    # Pick the serializer for a name, defaulting to the configured format
+    @staticmethod
+    def get_serializer(name=None):
+        return SERIALIZERS[name or STORAGE_FORMAT]
+    
+    # Work out which serializer wrote some bytes from their leading magic, falling back to JSON
+    @staticmethod
+    def detect_serializer(raw):
+        for serializer in SERIALIZERS.values():
+            if serializer.magic and raw.startswith(serializer.magic):
+                return serializer
+        return SERIALIZERS['compact']
+    
+    # Load a snapshot from a file path in whatever format it was saved, falling back to a default on error
     @staticmethod
     def load_json(filepath, default=None):
         try:
-            with open(filepath, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            with open(filepath, 'rb') as f:
+                raw = f.read()
+            return Helper.detect_serializer(raw).loads(raw)
+        except (FileNotFoundError, ValueError, EOFError, OSError):
             return default if default is not None else {}
     
-    # Save a Python object as pretty‑printed JSON
+    # Save a snapshot atomically: write a temp file, fsync it, then rename it over the target
     @staticmethod
-    def save_json(filepath, data):
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+    def save_json(filepath, data, fsync=True, serializer=None):
+        raw = (serializer or Helper.get_serializer()).dumps(data)
+        directory = os.path.dirname(os.path.abspath(filepath))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(filepath)}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(raw)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, filepath)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if fsync:
+            Helper._fsync_directory(directory)
+    
+    # Make a rename durable by syncing the directory entry (not supported on every platform)
+    @staticmethod
+    def _fsync_directory(directory):
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
     
     # Return a time‑of‑day greeting based on the current hour
     @staticmethod
@@ -48,10 +144,18 @@ class Helper:
         dt = datetime.fromisoformat(dt_string)
         return dt.strftime('%A, %B %d, %Y at %H:%M')
     
-    # Generate a simple random-looking booking reference
+    # Make the reference for a booking ID: BK, five random characters, then the ID in base
+    # 32 (five characters until it passes 33 million). The ID makes it unique without
+    # checking what is stored, and the random part makes it hard to guess from a
+    # neighbouring booking's reference.
     @staticmethod
-    def generate_reference():
-        return f"BK{random.randint(10000, 99999)}"
+    def generate_reference(booking_id):
+        encoded = ''
+        while booking_id:
+            booking_id, digit = divmod(booking_id, 32)
+            encoded = REFERENCE_ALPHABET[digit] + encoded
+        random_part = ''.join(secrets.choice(REFERENCE_ALPHABET) for _ in range(REFERENCE_RANDOM_CHARS))
+        return f"BK{random_part}{encoded.rjust(REFERENCE_ID_CHARS, '0')}"
 
 if __name__ == "__main__":
     print("Helper module loaded successfully!")
\ No newline at end of file
@@ -109,6 +109,12 @@ class TextProcessor:
         pattern = r'([A-E])(\d+)'
         matches = re.findall(pattern, text.upper())
         return [(row, int(num)) for row, num in matches]
+    
+    # Find a booking reference like BK7QX2M00041 (or an older one like BK12345) in text,
+    # returned in upper case
+    def extract_reference(self, text):
+        match = re.search(r'\bBK(?:\d{5}|[0-9A-HJKMNP-TV-Z]{10,})\b', text.upper())
+        return match.group(0) if match else None
 
 if __name__ == "__main__":
     print("TextProcessor module loaded successfully!")
\ No newline at end of file
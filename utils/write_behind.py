@@ -0,0 +1,172 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from config import WRITE_FLUSH_INTERVAL_MS, WRITE_QUEUE_SIZE
+from utils.helpers import Helper
+
+logger = logging.getLogger(__name__)
+
+# Default write function: save the data as an atomic snapshot at the path named by the key
+def write_json(key, data):
+    Helper.save_json(key, data)
+
+# WriteBehindWriter moves file writes off the request path onto a background thread.
+# Data stays visible through get_pending from the moment it is submitted until its write
+# has landed. A deferred write that fails is logged and counted; a durable submit or a
+# flush raises the error to its caller instead, so a failed save is never silent.
+class WriteBehindWriter:
+    
+    # Start the writer thread with a bounded queue of keys waiting to be written
+    def __init__(self, flush_interval_ms=WRITE_FLUSH_INTERVAL_MS, max_queue=WRITE_QUEUE_SIZE):
+        self.flush_interval = flush_interval_ms / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = {}
+        self._writing = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._wake = threading.Event()
+        self.stats = {'submitted': 0, 'coalesced': 0, 'written': 0, 'sync_writes': 0, 'errors': 0}
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+    
+    # Queue data to be written under a key, or write it now if durable is set.
+    # combine(old, new) merges data still waiting with newer data; by default the newer data wins.
+    def submit(self, key, data, durable=False, write=write_json, combine=None):
+        if durable or self._closed:
+            with self._write_lock:
+                with self._lock:
+                    entry = self._pending.pop(key, None)
+                    if entry is not None and combine:
+                        data = combine(entry[1], data)
+                    self._writing[key] = data
+                    self.stats['submitted'] += 1
+                    self.stats['sync_writes'] += 1
+                self._write(key, data, write, raise_errors=True)
+            return
+        
+        with self._lock:
+            self.stats['submitted'] += 1
+            if key in self._pending:
+                # Already waiting to be written, so only the newest data needs to go out
+                due, old_data, _ = self._pending[key]
+                self._pending[key] = (due, combine(old_data, data) if combine else data, write)
+                self.stats['coalesced'] += 1
+                return
+            self._pending[key] = (time.monotonic() + self.flush_interval, data, write)
+        
+        # Blocks when the queue is full, which pushes back on callers instead of growing without limit
+        self._queue.put(key)
+    
+    # Return the data still waiting to be written for a key, or being written now, if any
+    def get_pending(self, key):
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is not None:
+                return entry[1]
+            return self._writing.get(key)
+    
+    # Drop any pending write for a key, e.g. because the file is being deleted
+    def discard(self, key):
+        with self._write_lock:
+            with self._lock:
+                self._pending.pop(key, None)
+    
+    # Write every pending key right now from the calling thread. Every key is tried; the
+    # first failure is raised once they all have been.
+    def flush(self):
+        error = None
+        with self._write_lock:
+            with self._lock:
+                pending = self._pending
+                self._pending = {}
+                self._writing.update((key, entry[1]) for key, entry in pending.items())
+            for key, (_, data, write) in pending.items():
+                try:
+                    self._write(key, data, write, raise_errors=True)
+                except Exception as e:
+                    error = error or e
+        if error is not None:
+            raise error
+    
+    # Stop accepting deferred writes, drain everything and stop the thread
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+    
+    # Background loop: wait until each key is due, then write its latest data
+    def _run(self):
+        while True:
+            try:
+                key = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            
+            with self._lock:
+                entry = self._pending.get(key)
+            if entry is None:
+                continue
+            
+            delay = entry[0] - time.monotonic()
+            if delay > 0 and not self._closed:
+                self._wake.wait(delay)
+            
+            with self._write_lock:
+                with self._lock:
+                    entry = self._pending.pop(key, None)
+                    if entry is not None:
+                        self._writing[key] = entry[1]
+                if entry is not None:
+                    self._write(key, entry[1], entry[2])
+    
+    # Perform one write marked as in flight, then stop showing it as pending. Failures are
+    # logged and counted, and raised only if asked, so the background thread keeps going.
+    def _write(self, key, data, write, raise_errors=False):
+        try:
+            write(key, data)
+            self.stats['written'] += 1
+        except Exception:
+            self.stats['errors'] += 1
+            logger.exception("Write-behind error for %s", key)
+            if raise_errors:
+                raise
+        finally:
+            with self._lock:
+                self._writing.pop(key, None)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+# Return the process-wide writer, starting it on first use
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteBehindWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+# Drain and stop the process-wide writer, if one was started
+def shutdown_writer():
+    global _writer
+    with _writer_lock:
+        writer = _writer
+        _writer = None
+    if writer is not None:
+        writer.close()
+
+if __name__ == "__main__":
+    pass
+    # print("WriteBehind module loaded successfully!")